@@ -1,7 +1,12 @@
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Callable, List, Optional
 import os
+import re
+import threading
 
 # Get the absolute path to the database file
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -15,21 +20,114 @@ logger.info(f"Using database at: {DATABASE_URL}")
 # SQLite Database configuration
 SQLALCHEMY_DATABASE_URL = f"sqlite:///{DATABASE_URL}"
 
-# Create SQLAlchemy engine with better error handling
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={
-        "check_same_thread": False,  # Needed for SQLite
-        "timeout": 30  # Increase timeout
-    },
-    echo=True  # Enable SQL query logging
+# Tenant databases: one SQLite file per tenant by default. The URL template may point
+# tenants at other servers, e.g. postgresql://db-2/hrms_{tenant}
+TENANT_DB_DIR = os.getenv("HRMS_TENANT_DB_DIR", os.path.join(BASE_DIR, "tenants"))
+TENANT_DATABASE_URL = os.getenv("HRMS_TENANT_DATABASE_URL", f"sqlite:///{TENANT_DB_DIR}/{{tenant}}.db")
+# Tenant engines kept open at once; the least recently used one is disposed first
+MAX_OPEN_TENANT_ENGINES = int(os.getenv("HRMS_MAX_OPEN_TENANT_ENGINES", "32"))
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+# Tenants this deployment serves, comma-separated; no other tenant database is ever opened
+TENANTS = frozenset(
+    tenant for tenant in (value.strip().lower() for value in os.getenv("HRMS_TENANTS", "").split(","))
+    if TENANT_ID_PATTERN.match(tenant)
 )
 
+# Tenant of the current request or job; None is the default database
+current_tenant: ContextVar[Optional[str]] = ContextVar("current_tenant", default=None)
+
+# Seconds a statement waits for a lock held by another connection
+SQLITE_BUSY_TIMEOUT = 30
+
+def _create_engine(url: str):
+    # Create SQLAlchemy engine with better error handling
+    connect_args = {}
+    if url.startswith("sqlite"):
+        connect_args = {
+            "check_same_thread": False,  # Needed for SQLite
+            "timeout": SQLITE_BUSY_TIMEOUT  # Increase timeout
+        }
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        echo=True  # Enable SQL query logging
+    )
+
+engine = _create_engine(SQLALCHEMY_DATABASE_URL)
+
+class UnknownTenant(LookupError):
+    pass
+
+class TenantEngines:
+    """Bounded LRU of tenant engines, opened lazily on first use."""
+
+    def __init__(self, max_open: int = MAX_OPEN_TENANT_ENGINES, tenants=TENANTS):
+        self.max_open = max_open
+        self.tenants = tenants
+        # Called with a newly opened engine to create or migrate its schema
+        self.initializer: Optional[Callable] = None
+        self._engines = OrderedDict()
+        self._initialized = set()
+        self._init_locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, tenant: Optional[str]):
+        if tenant is None:
+            return engine
+        if tenant not in self.tenants:
+            raise UnknownTenant(tenant)
+        with self._lock:
+            tenant_engine = self._engines.get(tenant)
+            if tenant_engine is not None:
+                self._engines.move_to_end(tenant)
+            else:
+                if TENANT_DATABASE_URL.startswith("sqlite"):
+                    os.makedirs(TENANT_DB_DIR, exist_ok=True)
+                tenant_engine = self._engines[tenant] = _create_engine(TENANT_DATABASE_URL.format(tenant=tenant))
+                logger.info(f"Opened database of tenant {tenant}")
+                if len(self._engines) > self.max_open:
+                    evicted, evicted_engine = self._engines.popitem(last=False)
+                    # Checked-out connections finish normally; idle ones are closed now
+                    evicted_engine.dispose()
+                    logger.info(f"Closed database of tenant {evicted}")
+            if tenant in self._initialized or self.initializer is None:
+                return tenant_engine
+            init_lock = self._init_locks.setdefault(tenant, threading.Lock())
+
+        # Other tenants are served while this one's schema is created or migrated
+        with init_lock:
+            if tenant not in self._initialized:
+                self.initializer(tenant_engine)
+                self._initialized.add(tenant)
+        return tenant_engine
+
+    def known_tenants(self) -> List[Optional[str]]:
+        """The default database plus every tenant this deployment serves."""
+        return [None] + sorted(self.tenants)
+
+    def dispose_all(self):
+        with self._lock:
+            for tenant_engine in self._engines.values():
+                tenant_engine.dispose()
+            self._engines.clear()
+
+tenant_engines = TenantEngines()
+
+def get_engine():
+    """Engine of the current tenant."""
+    return tenant_engines.get(current_tenant.get())
+
+class TenantSessionmaker(sessionmaker):
+    """Session factory binding each new session to the current tenant's engine."""
+
+    def __call__(self, **local_kw):
+        local_kw.setdefault("bind", get_engine())
+        return super().__call__(**local_kw)
+
 # Create SessionLocal class
-SessionLocal = sessionmaker(
+SessionLocal = TenantSessionmaker(
     autocommit=False,
     autoflush=False,
-    bind=engine,
     expire_on_commit=False  # Prevent expired object issues
 )
 
@@ -42,4 +140,4 @@ def get_db():
     try:
         yield db
     finally:
-        db.close() 
\ No newline at end of file
+        db.close()
@@ -0,0 +1,35 @@
+"""Process-local counters and gauges exposed on ``/api/metrics``.
+
+Series are keyed Prometheus-style as ``name{label="value",...}``. Every worker keeps its
+own registry, so a multi-worker deployment reports per-worker numbers.
+"""
+from collections import defaultdict
+from typing import Dict
+import threading
+
+def _series(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{key}="{value}"' for key, value in sorted(labels.items())) + "}"
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._gauges = {}
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        series = _series(name, labels)
+        with self._lock:
+            self._counters[series] += amount
+
+    def set_gauge(self, name: str, value: float, **labels):
+        series = _series(name, labels)
+        with self._lock:
+            self._gauges[series] = value
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges)}
+
+metrics = Metrics()
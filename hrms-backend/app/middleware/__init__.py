@@ -0,0 +1,14 @@
+# This file makes the middleware directory a Python package
+
+from .admission import AdmissionMiddleware
+from .idempotency import IdempotencyMiddleware, purge_expired_idempotency_keys
+from .profiling import ProfilingMiddleware
+from .tenant import TenantMiddleware
+
+__all__ = [
+    "AdmissionMiddleware",
+    "IdempotencyMiddleware",
+    "purge_expired_idempotency_keys",
+    "ProfilingMiddleware",
+    "TenantMiddleware",
+]
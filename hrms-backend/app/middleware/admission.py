@@ -0,0 +1,200 @@
+"""Admission control for API requests.
+
+Two checks run before a request reaches its handler:
+
+* a token bucket per caller and route class, which answers 429 with ``Retry-After`` once
+  a caller exceeds its rate (callers are identified by their ``Authorization`` header, or
+  by client address for anonymous requests). Logins are limited per client address and
+  submitted username, with a much larger allowance per address so that an office behind
+  one NAT address can log in at shift start;
+* a global cap on concurrently executing requests that use the database, with a short
+  bounded queue in front of it, which answers 503 with ``Retry-After`` when the queue is
+  full or a request waited too long, instead of letting requests pile up on the SQLite
+  write lock.
+
+State is per worker. Outcomes are counted in :mod:`app.metrics`.
+"""
+from collections import OrderedDict
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+import asyncio
+import hashlib
+import math
+import os
+import re
+import time
+
+from starlette.responses import JSONResponse
+
+from ..metrics import metrics
+
+# Sustained requests per second and burst size per caller, by route class
+ROUTE_CLASS_LIMITS = {
+    "login": (0.5, 10),
+    # All logins from one client address, whatever the username
+    "login_address": (20.0, 500),
+    "attendance": (1.0, 5),
+    "write": (5.0, 20),
+    "read": (20.0, 60),
+}
+
+MAX_CONCURRENT_REQUESTS = int(os.getenv("HRMS_MAX_CONCURRENT_REQUESTS", "8"))
+MAX_QUEUED_REQUESTS = int(os.getenv("HRMS_MAX_QUEUED_REQUESTS", "64"))
+# Longest a request waits for a free slot before it is shed
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("HRMS_QUEUE_TIMEOUT_SECONDS", "2"))
+OVERLOAD_RETRY_AFTER_SECONDS = 1
+
+# Buckets kept in memory; the least recently used callers are forgotten first
+MAX_TRACKED_CALLERS = 100_000
+
+EXEMPT_PATHS = ("/api/metrics",)
+
+# Routes served from memory or files, matched on the whole path; rate limited but not
+# held to the concurrency cap
+DATABASE_FREE_ROUTES = (
+    ("GET", re.compile(r"/api/profiles/")),
+    ("GET", re.compile(r"/api/profiles/[0-9]{8}T[0-9]{6}-[0-9a-f]{8}")),
+    ("GET", re.compile(r"/api/jobs/")),
+)
+
+# Largest login form read to find the username; the rest of the body is passed on unread
+MAX_LOGIN_FORM_BYTES = 16 * 1024
+
+def route_class(method: str, path: str) -> str:
+    if path == "/api/token":
+        return "login"
+    if path.startswith("/api/attendance/check-"):
+        return "attendance"
+    if method in ("GET", "HEAD"):
+        return "read"
+    return "write"
+
+def uses_database(method: str, path: str) -> bool:
+    return not any(method == route_method and pattern.fullmatch(path) for route_method, pattern in DATABASE_FREE_ROUTES)
+
+async def read_login_username(receive) -> Tuple[str, object]:
+    """Username of an urlencoded login form, and a ``receive`` that replays the body read."""
+    messages, body = [], b""
+    while len(body) <= MAX_LOGIN_FORM_BYTES:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body", False):
+            break
+    values = parse_qs(body.decode("latin-1")).get("username") if len(body) <= MAX_LOGIN_FORM_BYTES else None
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+    return (values[0].strip().lower() if values else ""), replay
+
+class TokenBuckets:
+    def __init__(self, max_tracked: int = MAX_TRACKED_CALLERS):
+        self.max_tracked = max_tracked
+        self._buckets: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+
+    def take(self, key: Tuple[str, str], rate: float, burst: float, now: float) -> float:
+        """Take one token; returns 0 if admitted, otherwise seconds until a token is available."""
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = [burst, now]
+            if len(self._buckets) > self.max_tracked:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return 0.0
+        return (1 - bucket[0]) / rate
+
+class AdmissionMiddleware:
+    def __init__(
+        self,
+        app,
+        max_concurrent: int = MAX_CONCURRENT_REQUESTS,
+        max_queued: int = MAX_QUEUED_REQUESTS,
+        queue_timeout: float = QUEUE_TIMEOUT_SECONDS
+    ):
+        self.app = app
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.buckets = TokenBuckets()
+        self.in_flight = 0
+        self.queued = 0
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    def _caller(self, scope, headers, request_class: str) -> str:
+        authorization = headers.get(b"authorization")
+        if authorization and request_class != "login":
+            return hashlib.sha256(authorization).hexdigest()[:32]
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] == "OPTIONS"
+            or not scope["path"].startswith("/api/")
+            or scope["path"].startswith(EXEMPT_PATHS)
+        ):
+            return await self.app(scope, receive, send)
+
+        request_class = route_class(scope["method"], scope["path"])
+        caller = self._caller(scope, dict(scope["headers"]), request_class)
+        now = time.monotonic()
+        if request_class == "login":
+            wait = self.buckets.take((caller, "login_address"), *ROUTE_CLASS_LIMITS["login_address"], now)
+            if not wait:
+                username, receive = await read_login_username(receive)
+                caller = f"{caller}:{hashlib.sha256(username.encode()).hexdigest()[:32]}"
+                wait = self.buckets.take((caller, request_class), *ROUTE_CLASS_LIMITS[request_class], now)
+        else:
+            wait = self.buckets.take((caller, request_class), *ROUTE_CLASS_LIMITS[request_class], now)
+        if wait:
+            return await self._reject(scope, receive, send, request_class, "rate_limited", 429, wait)
+
+        if not uses_database(scope["method"], scope["path"]):
+            metrics.increment("admission_requests_total", route_class=request_class, outcome="admitted")
+            return await self.app(scope, receive, send)
+
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        if self._slots.locked() and self.queued >= self.max_queued:
+            return await self._reject(scope, receive, send, request_class, "queue_full", 503)
+
+        self.queued += 1
+        metrics.set_gauge("admission_queued", self.queued)
+        queued_at = time.monotonic()
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            return await self._reject(scope, receive, send, request_class, "queue_timeout", 503)
+        finally:
+            self.queued -= 1
+            metrics.set_gauge("admission_queued", self.queued)
+            metrics.increment("admission_queue_wait_seconds_total", time.monotonic() - queued_at)
+
+        self.in_flight += 1
+        metrics.set_gauge("admission_in_flight", self.in_flight)
+        metrics.increment("admission_requests_total", route_class=request_class, outcome="admitted")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
+            metrics.set_gauge("admission_in_flight", self.in_flight)
+            self._slots.release()
+
+    async def _reject(self, scope, receive, send, request_class: str, outcome: str, status_code: int,
+                      retry_after: float = OVERLOAD_RETRY_AFTER_SECONDS):
+        metrics.increment("admission_requests_total", route_class=request_class, outcome=outcome)
+        detail = "Too many requests" if status_code == 429 else "Server is busy, please retry shortly"
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+        )
+        await response(scope, receive, send)
@@ -0,0 +1,216 @@
+"""Replay of write requests retried with the same ``Idempotency-Key`` header.
+
+The first request with a key claims it by inserting a row into ``idempotency_keys``; the
+primary key makes the claim atomic across workers. Once the handler has answered, the
+status, headers and compressed body are stored on the row and later retries get that
+response back without the handler running again. A retry that arrives while the first
+request is still running gets 409, and reusing a key for a different request gets 422.
+
+Keys are scoped to the authenticated principal (tenant and user of a valid bearer token),
+so two users can never see each other's responses and a client that refreshed its token
+before retrying still gets its replay; anonymous requests are scoped to the client
+address. Server errors release the key so the request can be retried for real.
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+import hashlib
+import json
+import logging
+import zlib
+
+from sqlalchemy import delete, insert, update
+from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response
+
+from .. import models
+from ..database import SessionLocal
+from .tenant import token_claims
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_HEADER = "idempotency-key"
+IDEMPOTENT_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+MAX_KEY_LENGTH = 255
+
+# How long a stored response is replayed
+IDEMPOTENCY_TTL = timedelta(hours=24)
+# A claim whose request never finished (e.g. the worker died) can be taken over after this
+IN_PROGRESS_TIMEOUT = timedelta(minutes=5)
+# Larger responses are not stored; a retry then runs the handler again
+MAX_STORED_RESPONSE_BYTES = 1024 * 1024
+
+def _sha256(*parts: bytes) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+def key_scope(scope, headers) -> bytes:
+    """Whose keys a request's key is looked up among."""
+    claims = token_claims(headers.get(b"authorization"))
+    if claims.get("sub"):
+        return f"user:{claims.get('tenant') or ''}:{claims['sub']}".encode()
+    client = scope.get("client")
+    return f"address:{client[0] if client else 'unknown'}".encode()
+
+def purge_expired_idempotency_keys(db) -> int:
+    """Scheduled job: drop keys whose replay window or claim has expired."""
+    result = db.execute(delete(models.IdempotencyKey).where(models.IdempotencyKey.expires_at < datetime.utcnow()))
+    db.commit()
+    return result.rowcount
+
+class IdempotencyMiddleware:
+    def __init__(self, app, session_factory=SessionLocal):
+        self.app = app
+        self.session_factory = session_factory
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in IDEMPOTENT_METHODS:
+            return await self.app(scope, receive, send)
+        headers = dict(scope["headers"])
+        key = headers.get(IDEMPOTENCY_HEADER.encode())
+        if key is None:
+            return await self.app(scope, receive, send)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse(
+                {"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"}, status_code=400
+            )
+            return await response(scope, receive, send)
+
+        # Buffer the body so it can be hashed and then handed to the application
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body", False):
+                break
+        body = b"".join(chunks)
+
+        key_hash = _sha256(key_scope(scope, headers), key)
+        request_hash = _sha256(
+            scope["method"].encode(), scope["path"].encode(), scope.get("query_string", b""), body
+        )
+        stored = await run_in_threadpool(self._claim, key_hash, request_hash)
+        if stored is not None:
+            return await stored(scope, receive, send)
+
+        body_sent = False
+
+        async def replay_receive():
+            nonlocal body_sent
+            if not body_sent:
+                body_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            return await receive()
+
+        start, captured, size = None, [], 0
+
+        async def capture_send(message):
+            nonlocal start, size
+            if message["type"] == "http.response.start":
+                start = message
+            elif message["type"] == "http.response.body" and size <= MAX_STORED_RESPONSE_BYTES:
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                captured.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except Exception:
+            await run_in_threadpool(self._release, key_hash)
+            raise
+
+        if start is None or start["status"] >= 500 or size > MAX_STORED_RESPONSE_BYTES:
+            await run_in_threadpool(self._release, key_hash)
+        else:
+            await run_in_threadpool(self._store, key_hash, start, b"".join(captured))
+
+    def _claim(self, key_hash: str, request_hash: str) -> Optional[Response]:
+        """Claim the key for this request, or return the response a retry should get."""
+        now = datetime.utcnow()
+        db = self.session_factory()
+        try:
+            for _ in range(2):
+                try:
+                    db.execute(insert(models.IdempotencyKey).values(
+                        key_hash=key_hash,
+                        request_hash=request_hash,
+                        expires_at=now + IN_PROGRESS_TIMEOUT
+                    ))
+                    db.commit()
+                    return None
+                except IntegrityError:
+                    db.rollback()
+
+                existing = db.get(models.IdempotencyKey, key_hash)
+                if existing is None:
+                    continue
+                if existing.expires_at < now:
+                    # Expired reply or abandoned claim: drop it and race for a fresh claim
+                    db.execute(delete(models.IdempotencyKey).where(
+                        models.IdempotencyKey.key_hash == key_hash,
+                        models.IdempotencyKey.expires_at < now
+                    ))
+                    db.commit()
+                    db.expunge_all()
+                    continue
+                if existing.request_hash != request_hash:
+                    return JSONResponse(
+                        {"detail": "Idempotency-Key was already used with a different request"}, status_code=422
+                    )
+                if existing.status_code is None:
+                    return JSONResponse(
+                        {"detail": "A request with this Idempotency-Key is still in progress"},
+                        status_code=409,
+                        headers={"Retry-After": "1"}
+                    )
+                response = Response(
+                    content=zlib.decompress(existing.response_body),
+                    status_code=existing.status_code
+                )
+                response.raw_headers = [
+                    (name.encode("latin-1"), value.encode("latin-1"))
+                    for name, value in json.loads(existing.response_headers)
+                ] + [(b"idempotent-replayed", b"true")]
+                return response
+            return JSONResponse(
+                {"detail": "A request with this Idempotency-Key is still in progress"},
+                status_code=409,
+                headers={"Retry-After": "1"}
+            )
+        finally:
+            db.close()
+
+    def _store(self, key_hash: str, start, body: bytes):
+        db = self.session_factory()
+        try:
+            db.execute(update(models.IdempotencyKey).where(models.IdempotencyKey.key_hash == key_hash).values(
+                status_code=start["status"],
+                response_headers=json.dumps([
+                    [name.decode("latin-1"), value.decode("latin-1")] for name, value in start.get("headers", [])
+                ]),
+                response_body=zlib.compress(body),
+                expires_at=datetime.utcnow() + IDEMPOTENCY_TTL
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Failed to store idempotent response: {str(e)}", exc_info=True)
+        finally:
+            db.close()
+
+    def _release(self, key_hash: str):
+        db = self.session_factory()
+        try:
+            db.execute(delete(models.IdempotencyKey).where(
+                models.IdempotencyKey.key_hash == key_hash,
+                models.IdempotencyKey.status_code.is_(None)
+            ))
+            db.commit()
+        finally:
+            db.close()
@@ -0,0 +1,59 @@
+"""Opt-in statistical profiling of requests.
+
+A request is profiled when an HR user sends ``X-Profile: 1``, or at random for a fraction
+``HRMS_PROFILE_SAMPLE_RATE`` of all requests (0 by default). The response of a profiled
+request carries ``X-Profile-Id``; the profile is listed and downloaded through
+``/api/profiles``. Requests that are not profiled only pay for a scan of their headers.
+"""
+import asyncio
+import os
+import random
+
+from ..database import current_tenant
+from ..services.profiler import current_profile, save_profile, start_profile
+from .tenant import token_claims
+
+PROFILE_SAMPLE_RATE = float(os.getenv("HRMS_PROFILE_SAMPLE_RATE", "0"))
+
+PROFILE_HEADER = b"x-profile"
+
+def profile_requested(headers) -> bool:
+    requested, authorization = False, None
+    for name, value in headers:
+        if name == PROFILE_HEADER:
+            requested = value == b"1"
+        elif name == b"authorization":
+            authorization = value
+    return requested and token_claims(authorization).get("role") == "hr"
+
+class ProfilingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        sampled = PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+        if not sampled and not profile_requested(scope["headers"]):
+            return await self.app(scope, receive, send)
+
+        profile = start_profile(scope["method"], scope["path"], current_tenant.get())
+        if profile is None:
+            return await self.app(scope, receive, send)
+
+        status_code = None
+
+        async def send_with_profile_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message = {**message, "headers": [*message.get("headers", []), (b"x-profile-id", profile.id.encode())]}
+            await send(message)
+
+        token = current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            current_profile.reset(token)
+            profile.stop(status_code)
+            await asyncio.get_running_loop().run_in_executor(None, save_profile, profile)
@@ -0,0 +1,74 @@
+"""Per-request tenant routing.
+
+The tenant comes from the ``tenant`` claim of the bearer token or, for requests without
+one such as logins, from the subdomain of ``HRMS_TENANT_DOMAIN`` in the Host header. It is
+stored in :data:`app.database.current_tenant` for the rest of the request, including
+background tasks, so every ``SessionLocal()`` opens the tenant's own database. Requests
+without a tenant use the default database.
+
+Only tenants listed in ``HRMS_TENANTS`` are served, and a token is only accepted on a
+tenant's host if it was issued for that tenant.
+"""
+from typing import Optional
+import os
+
+from jose import JWTError, jwt
+from starlette.responses import JSONResponse
+
+from ..database import TENANT_ID_PATTERN, current_tenant, tenant_engines
+from ..routers.users import SECRET_KEY, ALGORITHM
+
+# e.g. "hrms.example.com" routes "acme.hrms.example.com" to tenant "acme"
+TENANT_DOMAIN = os.getenv("HRMS_TENANT_DOMAIN", "").lower()
+
+def tenant_from_host(host: Optional[bytes]) -> Optional[str]:
+    if not TENANT_DOMAIN or not host:
+        return None
+    hostname = host.decode("latin-1").split(":")[0].lower()
+    suffix = "." + TENANT_DOMAIN
+    if hostname.endswith(suffix):
+        return hostname[:-len(suffix)]
+    return None
+
+def token_claims(authorization: Optional[bytes]) -> dict:
+    """Claims of a valid bearer token; empty for missing or invalid tokens."""
+    if not authorization:
+        return {}
+    scheme, _, token = authorization.decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return {}
+    try:
+        return jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        # Invalid tokens are rejected by the route's authentication
+        return {}
+
+class TenantMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        headers = dict(scope["headers"])
+        host_tenant = tenant_from_host(headers.get(b"host"))
+        claims = token_claims(headers.get(b"authorization"))
+        token_tenant = claims.get("tenant")
+        if host_tenant and claims and host_tenant != token_tenant:
+            # Includes tokens of the default database, whose users are only matched by email
+            response = JSONResponse({"detail": "Token was issued for a different tenant"}, status_code=403)
+            return await response(scope, receive, send)
+        tenant = token_tenant or host_tenant
+        if tenant is not None and not TENANT_ID_PATTERN.match(tenant):
+            response = JSONResponse({"detail": "Invalid tenant"}, status_code=400)
+            return await response(scope, receive, send)
+        if tenant is not None and tenant not in tenant_engines.tenants:
+            response = JSONResponse({"detail": "Unknown tenant"}, status_code=404)
+            return await response(scope, receive, send)
+
+        token = current_tenant.set(tenant)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_tenant.reset(token)
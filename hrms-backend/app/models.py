@@ -1,12 +1,47 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Date, Time, DateTime, Float, Text, Enum
+from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, Date, Time, DateTime, Float, Text, Enum, Index, UniqueConstraint, LargeBinary
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from .database import Base
 from datetime import datetime
 from pydantic import BaseModel
-from datetime import date, time
+from datetime import date, time, timedelta
 import enum
 
+EPOCH = date(1970, 1, 1)
+
+class DayNumber(TypeDecorator):
+    """A ``date`` stored as an integer number of days since 1970-01-01."""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, datetime):
+            value = value.date()
+        elif isinstance(value, str):
+            value = date.fromisoformat(value)
+        return (value - EPOCH).days
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else EPOCH + timedelta(days=value)
+
+class MinuteOfDay(TypeDecorator):
+    """A ``time`` stored as an integer minute of the day; seconds are dropped."""
+    impl = Integer
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, str):
+            value = time.fromisoformat(value)
+        return value.hour * 60 + value.minute
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else time(value // 60, value % 60)
+
 class UserRole(str, enum.Enum):
     HR = "hr"
     EMPLOYEE = "employee"
@@ -27,17 +62,22 @@ class User(Base):
     first_name = Column(String)
     last_name = Column(String)
     phone = Column(String)
-    department = Column(String)
+    department = Column(String, index=True)
     position = Column(String)
+    location = Column(String)
     hire_date = Column(Date)
+    # Set when the user is offboarded in archive mode; archived users cannot sign in
+    archived_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
 
     # Relationships
-    attendance_records = relationship("Attendance", back_populates="employee", cascade="all, delete-orphan")
-    leave_requests = relationship("LeaveRequest", back_populates="employee", cascade="all, delete-orphan")
-    leave_balance = relationship("LeaveBalance", back_populates="employee", uselist=False, cascade="all, delete-orphan")
-    policies = relationship("Policy", back_populates="creator", cascade="all, delete-orphan")
+    # passive_deletes: deleting a user never loads its history; dependent rows are removed
+    # with set-based statements (see services.offboarding) or by the database cascade
+    attendance_records = relationship("Attendance", back_populates="employee", cascade="all, delete-orphan", passive_deletes=True)
+    leave_requests = relationship("LeaveRequest", back_populates="employee", cascade="all, delete-orphan", passive_deletes=True)
+    leave_balance = relationship("LeaveBalance", back_populates="employee", uselist=False, cascade="all, delete-orphan", passive_deletes=True)
+    policies = relationship("Policy", back_populates="creator", cascade="all, delete-orphan", passive_deletes=True)
 
     def __repr__(self):
         return f"<User {self.email}>"
@@ -54,7 +94,9 @@ class User(Base):
             "phone": self.phone,
             "department": self.department,
             "position": self.position,
+            "location": self.location,
             "hire_date": self.hire_date.isoformat() if self.hire_date else None,
+            "archived_at": self.archived_at.isoformat() if self.archived_at else None,
             "created_at": self.created_at.isoformat() if self.created_at else None,
             "updated_at": self.updated_at.isoformat() if self.updated_at else None
         }
@@ -66,23 +108,42 @@ class AttendanceCheckOut(BaseModel):
     early_exit: bool
 class Attendance(Base):
     __tablename__ = "attendance"
+    __table_args__ = (
+        # One record per employee and day; check-in and check-out upsert against it
+        Index("uq_attendance_employee_date", "employee_id", "date", unique=True),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    date = Column(Date)
-    check_in = Column(Time)
-    check_out = Column(Time)
+    # Integer-encoded so range filters and hour arithmetic work on plain integers
+    date = Column(DayNumber)
+    check_in = Column(MinuteOfDay)
+    check_out = Column(MinuteOfDay)
     status = Column(String(50))  # 'present', 'absent', 'late', 'early_exit'
     late_entry = Column(Boolean, default=False)
     early_exit = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # Indexed for the incremental refresh of the analytics snapshot
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
 
     # Relationships
     employee = relationship("User", back_populates="attendance_records") 
 
+class AttendanceArchive(Base):
+    __tablename__ = "attendance_archives"
+
+    # One archive table per closed year, e.g. attendance_archive_2023
+    year = Column(Integer, primary_key=True)
+    table_name = Column(String)
+    row_count = Column(Integer, default=0)
+    archived_at = Column(DateTime, default=datetime.utcnow)
+
 class LeaveRequest(Base):
     __tablename__ = "leave_requests"
+    __table_args__ = (
+        # Serves overlap checks and interval range scans per employee
+        Index("ix_leave_requests_employee_dates", "employee_id", "start_date", "end_date"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     employee_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
@@ -105,24 +166,80 @@ class LeaveBalance(Base):
     annual_leave = Column(Float, default=0)
     sick_leave = Column(Float, default=0)
     casual_leave = Column(Float, default=0)
+    # Last year accrued into this balance; new balances already hold the current year's grant
+    accrual_year = Column(Integer, index=True, default=lambda: date.today().year)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     employee = relationship("User", back_populates="leave_balance") 
 
+class PayrollPeriod(Base):
+    __tablename__ = "payroll_periods"
+    __table_args__ = (
+        UniqueConstraint("start_date", "end_date", name="uq_payroll_periods_range"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    start_date = Column(Date)
+    end_date = Column(Date)
+    standard_hours = Column(Float)
+    employee_count = Column(Integer, default=0)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    metrics = relationship("PayrollPeriodMetric", back_populates="period", cascade="all, delete-orphan")
+
+class PayrollPeriodMetric(Base):
+    __tablename__ = "payroll_period_metrics"
+    __table_args__ = (
+        UniqueConstraint("period_id", "employee_id", name="uq_payroll_period_metrics_employee"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    period_id = Column(Integer, ForeignKey("payroll_periods.id", ondelete="CASCADE"))
+    employee_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
+    worked_hours = Column(Float, default=0)
+    overtime_hours = Column(Float, default=0)
+    days_present = Column(Integer, default=0)
+    expected_days = Column(Integer, default=0)
+    absent_days = Column(Integer, default=0)
+    late_entries = Column(Integer, default=0)
+    early_exits = Column(Integer, default=0)
+
+    # Relationships
+    period = relationship("PayrollPeriod", back_populates="metrics")
+
+class Holiday(Base):
+    __tablename__ = "holidays"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String)
+    date = Column(Date, index=True)
+    # Scope of the holiday; NULL applies to every location / department
+    location = Column(String, nullable=True)
+    department = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
 class Asset(Base):
     __tablename__ = "assets"
+    __table_args__ = (
+        # Category filters, and a covering scan for the search facet counts
+        Index("ix_assets_category_department_condition", "category", "department", "condition"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     asset_name = Column(String, index=True)
     category = Column(String)
-    department = Column(String)
-    condition = Column(String)
-    purchase_date = Column(Date)
-    warranty_expiry = Column(Date)
-    maintenance_schedule = Column(Date)
+    department = Column(String, index=True)
+    condition = Column(String, index=True)
+    purchase_date = Column(Date, index=True)
+    warranty_expiry = Column(Date, index=True)
+    maintenance_schedule = Column(Date, index=True)
     notes = Column(Text)
-    assigned_to = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=False)
+    # Set by the nightly scan once the corresponding date has passed
+    warranty_expired = Column(Boolean, default=False)
+    maintenance_overdue = Column(Boolean, default=False)
+    assigned_to = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
@@ -146,4 +263,76 @@ class Policy(Base):
     created_by = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
 
     # Relationships
-    creator = relationship("User", back_populates="policies") 
\ No newline at end of file
+    creator = relationship("User", back_populates="policies") 
+
+class JobLease(Base):
+    __tablename__ = "job_leases"
+
+    # Only the worker holding an unexpired lease runs scheduled jobs
+    name = Column(String, primary_key=True)
+    owner = Column(String)
+    expires_at = Column(DateTime)
+
+class JobSchedule(Base):
+    __tablename__ = "job_schedules"
+
+    # Next due run of each scheduled job, shared by every worker that may take the lease
+    name = Column(String, primary_key=True)
+    next_run = Column(DateTime)  # local time, like ScheduledJob.run_at
+    last_run_at = Column(DateTime, nullable=True)
+
+class JobRun(Base):
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_name = Column(String, index=True)
+    started_at = Column(DateTime, default=datetime.utcnow)
+    duration_ms = Column(Float)
+    rows_touched = Column(Integer, default=0)
+    status = Column(String)  # success, failed
+    error = Column(Text, nullable=True)
+
+class BackgroundJob(Base):
+    __tablename__ = "background_jobs"
+
+    id = Column(String, primary_key=True)  # uuid4 hex, returned to the client for polling
+    kind = Column(String, index=True)
+    status = Column(String, default="queued")  # queued, running, completed, failed
+    total = Column(Integer, default=0)
+    processed = Column(Integer, default=0)
+    result = Column(Text, nullable=True)  # JSON document
+    error = Column(Text, nullable=True)
+    # Reports: sha256 of the parameters and the data version, so finished reports are reused
+    params_hash = Column(String(64), index=True, nullable=True)
+    created_by = Column(Integer, ForeignKey("users.id", ondelete="SET NULL"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    # sha256 of the caller's credentials and the Idempotency-Key header
+    key_hash = Column(String(64), primary_key=True)
+    # sha256 of the method, path, query and body the key was first used with
+    request_hash = Column(String(64))
+    # NULL while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    response_headers = Column(Text, nullable=True)
+    response_body = Column(LargeBinary, nullable=True)  # zlib-compressed
+    expires_at = Column(DateTime, index=True)
+
+class ChangeLog(Base):
+    __tablename__ = "change_log"
+    __table_args__ = (
+        # Latest change of a table, and sync reads filtered by table
+        Index("ix_change_log_table_id", "table_name", "id"),
+        # Purged ids must never be handed out again, or sync cursors would go backwards
+        {"sqlite_autoincrement": True},
+    )
+
+    # Monotonic cursor handed to sync consumers
+    id = Column(Integer, primary_key=True)
+    table_name = Column(String(64))
+    row_id = Column(Integer)
+    operation = Column(String(16))  # insert, update, delete
+    changed_at = Column(DateTime, default=datetime.utcnow, index=True)
@@ -4,10 +4,24 @@ from .users import router as users_router
 from .attendance import router as attendance_router
 from .leave import router as leave_router
 from .policies import router as policies_router
+from .holidays import router as holidays_router
+from .payroll import router as payroll_router
+from .jobs import router as jobs_router
+from .metrics import router as metrics_router
+from .sync import router as sync_router
+from .analytics import router as analytics_router
+from .profiles import router as profiles_router
 
 __all__ = [
     "users_router",
     "attendance_router",
     "leave_router",
     "policies_router",
+    "holidays_router",
+    "payroll_router",
+    "jobs_router",
+    "metrics_router",
+    "sync_router",
+    "analytics_router",
+    "profiles_router",
 ]
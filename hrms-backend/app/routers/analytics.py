@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException
+from .. import models, schemas
+from ..services.attendance_analytics import get_snapshot
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
+from .users import get_current_hr_user
+import logging
+import time
+
+router = APIRouter(
+    prefix="/analytics",
+    tags=["analytics"]
+)
+logger = logging.getLogger(__name__)
+
+def _sort_key(value):
+    # Groups without a value (e.g. no department) sort last
+    return (value is None, value)
+
+@router.post("/attendance", response_model=schemas.AttendanceAnalyticsResult, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def query_attendance_analytics(
+    query: schemas.AttendanceAnalyticsQuery,
+    current_user: models.User = Depends(get_current_hr_user)
+):
+    """Group-by / filter aggregation over attendance history, served from memory.
+
+    e.g. absence rate by department and week, late entries by position, or the
+    distribution of worked hours with ``group_by: ["hours_bucket"]``. Results reflect the
+    database as of ``refreshed_at``, at most a refresh interval behind.
+    """
+    if query.start_date and query.end_date and query.end_date < query.start_date:
+        raise HTTPException(status_code=400, detail="End date cannot be before start date")
+    if query.order_by is not None and query.order_by not in query.group_by and query.order_by not in query.metrics:
+        raise HTTPException(status_code=400, detail="order_by must be one of the requested dimensions or metrics")
+
+    try:
+        started = time.perf_counter()
+        snapshot = get_snapshot()
+        rows = snapshot.query(
+            query.group_by,
+            query.metrics,
+            start_date=query.start_date,
+            end_date=query.end_date,
+            departments=query.departments,
+            positions=query.positions,
+            locations=query.locations,
+            statuses=query.statuses,
+            employee_ids=query.employee_ids
+        )
+        if query.order_by is not None:
+            rows.sort(key=lambda row: _sort_key(row[query.order_by]), reverse=query.descending)
+        else:
+            rows.sort(key=lambda row: [_sort_key(row[name]) for name in query.group_by], reverse=query.descending)
+        return {
+            "rows": rows[:query.limit],
+            "total_groups": len(rows),
+            "snapshot_rows": len(snapshot.attendance["id"]),
+            "refreshed_at": snapshot.refreshed_at,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3)
+        }
+    except Exception as e:
+        logger.error(f"Error querying attendance analytics: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
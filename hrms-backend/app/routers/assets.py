@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, UploadFile, File
+from sqlalchemy import func, insert, or_
 from sqlalchemy.orm import Session
-from typing import List
+from pydantic import ValidationError
+from typing import List, Optional
+from itertools import groupby
 from ..database import get_db
 from .. import schemas, models
 from .users import get_current_user
-from datetime import date, datetime
+from ..services.uploads import iter_upload_rows, upload_format, validation_message
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
+from datetime import date, datetime, timedelta
 import logging
 
 router = APIRouter(
@@ -14,6 +19,12 @@ router = APIRouter(
 
 logger = logging.getLogger(__name__)
 
+def _refresh_due_flags(asset: models.Asset):
+    """Recompute the flags set by the nightly asset scan after the asset's dates changed."""
+    today = date.today()
+    asset.warranty_expired = bool(asset.warranty_expiry and asset.warranty_expiry < today)
+    asset.maintenance_overdue = bool(asset.maintenance_schedule and asset.maintenance_schedule < today)
+
 @router.post("/", response_model=schemas.Asset)
 async def create_asset(
     asset: schemas.AssetCreate,
@@ -32,6 +43,7 @@ async def create_asset(
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
+        _refresh_due_flags(db_asset)
         db.add(db_asset)
         db.commit()
         db.refresh(db_asset)
@@ -41,6 +53,116 @@ async def create_asset(
         logger.error(f"Error creating asset: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Rows validated and inserted together during a bulk import
+IMPORT_BATCH_SIZE = 2000
+
+# Row errors listed in an import response; the rest are only counted
+MAX_REPORTED_IMPORT_ERRORS = 1000
+
+def _insert_import_batch(db: Session, batch, created_by: int, report_error) -> int:
+    """Resolve ``assigned_to`` for a batch with one user lookup and insert the valid rows.
+
+    ``batch`` holds ``(row_number, asset, assigned_to, error)`` in file order; rows that
+    already failed validation stay in it so every error is reported in row order.
+    ``assigned_to`` may be a user id or a business employee id such as "EMP001".
+    """
+    refs = [ref for _, _, ref, error in batch if error is None]
+    user_ids = {int(ref) for ref in refs if ref.isdigit()}
+    employee_codes = {ref for ref in refs if not ref.isdigit()}
+    users = db.query(models.User.id, models.User.employee_id).filter(
+        or_(models.User.id.in_(user_ids), models.User.employee_id.in_(employee_codes))
+    ).all() if refs else []
+    known_ids = {user.id for user in users}
+    ids_by_code = {user.employee_id: user.id for user in users if user.employee_id}
+
+    today = date.today()
+    now = datetime.utcnow()
+    values = []
+    for row_number, asset, ref, error in batch:
+        if error is None:
+            assigned_to = int(ref) if ref.isdigit() and int(ref) in known_ids else ids_by_code.get(ref)
+            if assigned_to is None:
+                error = f"assigned_to: unknown user '{ref}'"
+        if error is not None:
+            report_error(row_number, error)
+            continue
+        values.append({
+            **asset.model_dump(),
+            "assigned_to": assigned_to,
+            "user_id": asset.user_id or created_by,
+            "warranty_expired": bool(asset.warranty_expiry and asset.warranty_expiry < today),
+            "maintenance_overdue": bool(asset.maintenance_schedule and asset.maintenance_schedule < today),
+            "created_at": now,
+            "updated_at": now
+        })
+    if values:
+        db.execute(insert(models.Asset), values)
+    return len(values)
+
+@router.post("/import", response_model=schemas.AssetImportResult, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def import_assets(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    atomic: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Bulk-create assets from a CSV or NDJSON file in a single transaction.
+
+    Invalid rows are skipped and reported; with ``atomic`` any invalid row aborts the import.
+    """
+    if current_user.role != "hr":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only HR can import assets"
+        )
+    file_format = upload_format(file, format)
+
+    try:
+        imported, failed = 0, 0
+        errors, batch = [], []
+
+        def report_error(row_number: int, error: str):
+            nonlocal failed
+            failed += 1
+            if len(errors) < MAX_REPORTED_IMPORT_ERRORS:
+                errors.append({"row": row_number, "errors": [error]})
+
+        for row_number, values, error in iter_upload_rows(file, file_format):
+            asset, ref = None, ""
+            if error is None:
+                ref = values.pop("assigned_to", None)
+                ref = str(ref).strip() if ref is not None else ""
+                try:
+                    asset = schemas.AssetCreate(**values)
+                    if not ref:
+                        error = "assigned_to: field required"
+                except ValidationError as e:
+                    error = validation_message(e)
+            batch.append((row_number, asset, ref, error))
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                imported += _insert_import_batch(db, batch, current_user.id, report_error)
+                batch = []
+        if batch:
+            imported += _insert_import_batch(db, batch, current_user.id, report_error)
+
+        if atomic and failed:
+            db.rollback()
+            imported = 0
+        else:
+            db.commit()
+        logger.info(f"Imported {imported} assets, {failed} rows failed")
+        return {
+            "imported": imported,
+            "failed": failed,
+            "errors": errors,
+            "errors_truncated": failed > len(errors)
+        }
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error importing assets: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/", response_model=List[schemas.Asset])
 async def read_assets(
     db: Session = Depends(get_db),
@@ -56,6 +178,214 @@ async def read_assets(
         logger.error(f"Error fetching assets: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+# Largest page the search returns
+MAX_SEARCH_LIMIT = 500
+
+# Columns the search counts facets for
+FACET_COLUMNS = {
+    "category": models.Asset.category,
+    "department": models.Asset.department,
+    "condition": models.Asset.condition,
+}
+
+def _facet_counts(rows, selected: dict) -> dict:
+    """Counts per value of each facet column from (category, department, condition, count) rows.
+
+    Each facet ignores its own selection and applies the others, so unselected values show
+    how many assets they would add.
+    """
+    facets = {}
+    for name in FACET_COLUMNS:
+        counts = {}
+        for row in rows:
+            if all(not values or getattr(row, other) in values for other, values in selected.items() if other != name):
+                value = getattr(row, name)
+                counts[value] = counts.get(value, 0) + row.count
+        facets[name] = [
+            {"value": value, "count": count}
+            for value, count in sorted(counts.items(), key=lambda item: (-item[1], item[0] or ""))
+        ]
+    return facets
+
+@router.get("/search", response_model=schemas.AssetSearchResult)
+def search_assets(
+    category: Optional[List[str]] = Query(None),
+    department: Optional[List[str]] = Query(None),
+    condition: Optional[List[str]] = Query(None),
+    assigned_to: Optional[int] = None,
+    purchased_from: Optional[date] = None,
+    purchased_to: Optional[date] = None,
+    warranty_from: Optional[date] = None,
+    warranty_to: Optional[date] = None,
+    maintenance_from: Optional[date] = None,
+    maintenance_to: Optional[date] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=MAX_SEARCH_LIMIT),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Filter assets server-side and return one page with facet counts.
+
+    Facet counts come from a single query grouped by category, department and condition
+    over the assets matching the other filters. Employees only search their own assets.
+    """
+    if current_user.role != "hr":
+        if assigned_to is not None and assigned_to != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized to search other users' assets")
+        assigned_to = current_user.id
+
+    try:
+        filters = []
+        if assigned_to is not None:
+            filters.append(models.Asset.assigned_to == assigned_to)
+        for column, start, end in (
+            (models.Asset.purchase_date, purchased_from, purchased_to),
+            (models.Asset.warranty_expiry, warranty_from, warranty_to),
+            (models.Asset.maintenance_schedule, maintenance_from, maintenance_to),
+        ):
+            if start is not None:
+                filters.append(column >= start)
+            if end is not None:
+                filters.append(column <= end)
+
+        selected = {"category": category, "department": department, "condition": condition}
+        facet_filters = [FACET_COLUMNS[name].in_(values) for name, values in selected.items() if values]
+
+        facet_rows = db.query(
+            *FACET_COLUMNS.values(),
+            func.count(models.Asset.id).label("count")
+        ).filter(*filters).group_by(*FACET_COLUMNS.values()).all()
+        # Combinations matching every filter add up to the total
+        total = sum(
+            row.count for row in facet_rows
+            if all(not values or getattr(row, name) in values for name, values in selected.items())
+        )
+
+        items = db.query(models.Asset).filter(*filters, *facet_filters).order_by(
+            models.Asset.id
+        ).offset(skip).limit(limit).all()
+        return {
+            "total": total,
+            "skip": skip,
+            "limit": limit,
+            "items": items,
+            "facets": _facet_counts(facet_rows, selected)
+        }
+    except Exception as e:
+        logger.error(f"Error searching assets: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Longest range the maintenance / warranty calendar will return in one call
+MAX_CALENDAR_DAYS = 366
+
+def _due_assets(db: Session, column, start: Optional[date], end: date):
+    """Assets whose ``column`` date falls in ``start``..``end``, read through the column's index.
+
+    Without ``start`` everything up to ``end`` is returned, including overdue assets.
+    """
+    query = db.query(
+        models.Asset.id,
+        models.Asset.asset_name,
+        models.Asset.category,
+        models.Asset.department,
+        models.Asset.assigned_to,
+        column.label("due_date")
+    ).filter(column <= end)
+    if start is not None:
+        query = query.filter(column >= start)
+    return query
+
+def _due_report(db: Session, kind: str, column, days: int, include_overdue: bool):
+    window_start = None if include_overdue else date.today()
+    window_end = date.today() + timedelta(days=days)
+    rows = _due_assets(db, column, window_start, window_end).order_by(
+        models.Asset.department, models.Asset.category, column
+    ).all()
+    groups = []
+    for (department, category), items in groupby(rows, key=lambda row: (row.department, row.category)):
+        items = [row._asdict() for row in items]
+        groups.append({"department": department, "category": category, "count": len(items), "assets": items})
+    return {
+        "kind": kind,
+        "window_start": window_start,
+        "window_end": window_end,
+        "total": len(rows),
+        "groups": groups
+    }
+
+@router.get("/due/maintenance", response_model=schemas.AssetDueReport)
+async def read_maintenance_due(
+    days: int = Query(30, ge=0, le=3650),
+    include_overdue: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Assets due for maintenance within the next ``days`` days, grouped by department and category"""
+    try:
+        if current_user.role != "hr":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only HR can view maintenance schedules"
+            )
+        return _due_report(db, "maintenance", models.Asset.maintenance_schedule, days, include_overdue)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching maintenance due assets: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/due/warranty", response_model=schemas.AssetDueReport)
+async def read_warranty_expiring(
+    days: int = Query(30, ge=0, le=3650),
+    include_overdue: bool = False,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Assets whose warranty expires within the next ``days`` days, grouped by department and category"""
+    try:
+        if current_user.role != "hr":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only HR can view warranty expiries"
+            )
+        return _due_report(db, "warranty", models.Asset.warranty_expiry, days, include_overdue)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching warranty expiring assets: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/due/calendar", response_model=List[schemas.AssetCalendarDay])
+async def read_asset_calendar(
+    start_date: date,
+    end_date: date,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Maintenance and warranty expiry events per day, listing only days that have events"""
+    try:
+        if current_user.role != "hr":
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Only HR can view the asset calendar"
+            )
+        if end_date < start_date:
+            raise HTTPException(status_code=400, detail="End date cannot be before start date")
+        if (end_date - start_date).days + 1 > MAX_CALENDAR_DAYS:
+            raise HTTPException(status_code=400, detail=f"Date range cannot exceed {MAX_CALENDAR_DAYS} days")
+
+        calendar = {}
+        for kind, column in (("maintenance", models.Asset.maintenance_schedule), ("warranty_expiry", models.Asset.warranty_expiry)):
+            for row in _due_assets(db, column, start_date, end_date).order_by(column, models.Asset.id):
+                day = calendar.setdefault(row.due_date, {"date": row.due_date, "maintenance": [], "warranty_expiry": []})
+                day[kind].append(row._asdict())
+        return [calendar[day] for day in sorted(calendar)]
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching asset calendar: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/asset/{asset_id}", response_model=schemas.Asset)
 async def read_asset(
     asset_id: int,
@@ -101,6 +431,7 @@ async def update_asset(
         update_data = asset.model_dump(exclude_unset=True)
         for key, value in update_data.items():
             setattr(db_asset, key, value)
+        _refresh_due_flags(db_asset)
         
         db_asset.updated_at = datetime.utcnow()
         db.commit()
@@ -161,6 +492,7 @@ async def schedule_maintenance(
         
         db_asset.maintenance_schedule = maintenance_date
         db_asset.notes = notes
+        _refresh_due_flags(db_asset)
         db_asset.updated_at = datetime.utcnow()
         db.commit()
         db.refresh(db_asset)
@@ -1,10 +1,16 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy import case, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date, time, datetime
 from .. import models, schemas
 from ..database import get_db
-from ..routers.users import oauth2_scheme, SECRET_KEY, ALGORITHM
+from ..routers.users import oauth2_scheme, SECRET_KEY, ALGORITHM, get_active_user_by_email
+from ..services.attendance_archive import archive_year, attendance_source
+from ..services.change_log import record_changes
+from ..services.singleflight import dashboard_flight, DASHBOARD_CACHE_SECONDS
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
 from jose import JWTError, jwt
 import logging
 
@@ -17,6 +23,11 @@ router = APIRouter(
     tags=["attendance"]
 )
 
+def _upsert(db: Session, model):
+    """Dialect-specific ``INSERT`` supporting ``ON CONFLICT DO UPDATE``."""
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    return dialect.insert(model)
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -35,9 +46,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         logger.error(f"JWT decode error: {str(e)}")
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = get_active_user_by_email(db, email)
     if user is None:
-        logger.error(f"No user found for email: {email}")
+        logger.error(f"No active user found for email: {email}")
         raise credentials_exception
     
     logger.info(f"User authenticated successfully: {user.email}")
@@ -52,33 +63,43 @@ async def check_in(
     try:
         logger.info(f"Check-in request received for user {current_user.id}")
         
-        # Check if user exists
-        user = db.query(models.User).filter(models.User.id == attendance.employee_id).first()
-        if not user:
-            logger.error(f"User not found with ID: {attendance.employee_id}")
-            raise HTTPException(status_code=404, detail="User not found")
-        
         # Verify that the current user is checking in for themselves
         if current_user.id != attendance.employee_id:
             logger.error(f"User {current_user.id} attempted to check in for user {attendance.employee_id}")
             raise HTTPException(status_code=403, detail="Not authorized to check in for another user")
         
-        # Create new attendance record
-        db_attendance = models.Attendance(
+        # Upsert today's record: a new row, or an ``absent`` mark turned into a check-in.
+        # Repeated check-ins keep the first check-in time.
+        now = datetime.utcnow()
+        stmt = _upsert(db, models.Attendance).values(
             employee_id=attendance.employee_id,
             date=date.today(),
             check_in=attendance.check_in,
             status="present",
             late_entry=attendance.late_entry,
-            created_at=datetime.utcnow(),
-            updated_at=datetime.utcnow()
+            early_exit=False,
+            created_at=now,
+            updated_at=now
         )
-        
-        db.add(db_attendance)
+        not_checked_in = models.Attendance.check_in.is_(None)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[models.Attendance.employee_id, models.Attendance.date],
+            set_={
+                "check_in": func.coalesce(models.Attendance.check_in, stmt.excluded.check_in),
+                "status": case((not_checked_in, stmt.excluded.status), else_=models.Attendance.status),
+                "late_entry": case((not_checked_in, stmt.excluded.late_entry), else_=models.Attendance.late_entry),
+                "updated_at": stmt.excluded.updated_at
+            }
+        ).returning(models.Attendance)
+        db_attendance = db.scalars(stmt, execution_options={"populate_existing": True}).one()
+        if db_attendance.created_at != now:
+            # Existing rows updated by the upsert are not picked up as inserts
+            record_changes(db, models.Attendance, models.Attendance.id == db_attendance.id, "update")
         db.commit()
-        db.refresh(db_attendance)
         logger.info(f"Check-in successful for user {attendance.employee_id}")
         return db_attendance
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during check-in: {str(e)}")
         db.rollback()
@@ -92,81 +113,56 @@ async def check_out_by_employee_id(
 ):
     try:
         logger.info(f"Check-out request received for employee {attendance_update.employee_id}")
-        logger.info(f"Check-out data: {attendance_update}")
-        logger.info(f"Check-out time type: {type(attendance_update.check_out)}")
         
         # Verify that the current user is checking out for themselves or is HR
         if current_user.id != attendance_update.employee_id and current_user.role.lower() != "hr":
             logger.error(f"User {current_user.id} attempted to check out for user {attendance_update.employee_id}")
             raise HTTPException(status_code=403, detail="Not authorized to check out for another user")
         
-        # Find today's attendance record for the user
-        today = date.today()
-        
         # If a date is provided, use it, otherwise use today
-        query_date = today
-        if hasattr(attendance_update, 'date') and attendance_update.date:
+        query_date = date.today()
+        if attendance_update.date:
             try:
-                if isinstance(attendance_update.date, str):
-                    query_date = datetime.strptime(attendance_update.date, '%Y-%m-%d').date()
-                else:
-                    query_date = attendance_update.date
+                query_date = datetime.strptime(attendance_update.date, '%Y-%m-%d').date()
             except ValueError:
                 logger.error(f"Invalid date format: {attendance_update.date}")
                 # Fall back to today if date parsing fails
         
-        # Find the most recent attendance record without a check-out
-        attendance = db.query(models.Attendance).filter(
-            models.Attendance.employee_id == attendance_update.employee_id,
-            models.Attendance.date == query_date,
-            models.Attendance.check_out == None
-        ).order_by(models.Attendance.check_in.desc()).first()
+        if not attendance_update.check_out:
+            logger.error("No check-out time provided")
+            raise HTTPException(status_code=400, detail="Check-out time is required")
+        try:
+            hours, minutes = attendance_update.check_out.split(':')[:2]
+            check_out_time = time(int(hours), int(minutes))
+        except ValueError as e:
+            logger.error(f"Invalid time format: {attendance_update.check_out}, error: {str(e)}")
+            raise HTTPException(status_code=400, detail="Invalid time format. Use HH:MM")
+        
+        # Close the day's open record in a single statement
+        attendance = db.scalars(
+            update(models.Attendance).where(
+                models.Attendance.employee_id == attendance_update.employee_id,
+                models.Attendance.date == query_date,
+                models.Attendance.check_in.isnot(None),
+                models.Attendance.check_out.is_(None)
+            ).values(
+                check_out=check_out_time,
+                early_exit=attendance_update.early_exit,
+                updated_at=datetime.utcnow()
+            ).returning(models.Attendance),
+            execution_options={"populate_existing": True, "synchronize_session": False}
+        ).one_or_none()
         
         if not attendance:
+            db.rollback()
             logger.error(f"No check-in record found for user {attendance_update.employee_id} on {query_date}")
             raise HTTPException(status_code=404, detail="No check-in record found for today")
         
-        # Process the check-out time
-        if attendance_update.check_out:
-            check_out_time = None
-            
-            # Extract the actual time value based on type
-            if isinstance(attendance_update.check_out, str):
-                try:
-                    # If it's a string, parse it
-                    check_out_time = datetime.strptime(attendance_update.check_out, '%H:%M').time()
-                except ValueError as e:
-                    logger.error(f"Invalid time format: {attendance_update.check_out}, error: {str(e)}")
-                    raise HTTPException(status_code=400, detail="Invalid time format. Use HH:MM")
-            elif isinstance(attendance_update.check_out, time):
-                # If it's already a time object, use it directly
-                check_out_time = attendance_update.check_out
-            else:
-                # For any other format, convert to string representation and try to parse
-                try:
-                    time_str = str(attendance_update.check_out)
-                    if ':' in time_str:
-                        # Try to extract hours and minutes from the string
-                        hours, minutes = time_str.split(':')[:2]
-                        check_out_time = time(int(hours), int(minutes))
-                    else:
-                        raise ValueError("Cannot parse time from given value")
-                except Exception as e:
-                    logger.error(f"Unsupported time format: {attendance_update.check_out}, error: {str(e)}")
-                    raise HTTPException(status_code=400, detail=f"Unsupported time format: {str(attendance_update.check_out)}")
-            
-            # Update the attendance record
-            attendance.check_out = check_out_time
-            attendance.early_exit = attendance_update.early_exit
-            attendance.updated_at = datetime.utcnow()
-            
-            db.commit()
-            db.refresh(attendance)
-            logger.info(f"Check-out successful for user {attendance_update.employee_id}")
-            return attendance
-        else:
-            logger.error("No check-out time provided")
-            raise HTTPException(status_code=400, detail="Check-out time is required")
+        db.commit()
+        logger.info(f"Check-out successful for user {attendance_update.employee_id}")
+        return attendance
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error during check-out: {str(e)}")
         db.rollback()
@@ -237,11 +233,15 @@ async def get_attendance_records(
             logger.error(f"Invalid date format: {start_date} or {end_date}")
             raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
         
-        records = db.query(models.Attendance).filter(
-            models.Attendance.employee_id == employee_id,
-            models.Attendance.date >= start,
-            models.Attendance.date <= end
-        ).order_by(models.Attendance.date.desc()).all()
+        # Ranges reaching into archived years also read the archive tables
+        source = attendance_source(db, start, end)
+        records = db.execute(
+            select(source).where(
+                source.c.employee_id == employee_id,
+                source.c.date >= start,
+                source.c.date <= end
+            ).order_by(source.c.date.desc())
+        ).all()
         
         logger.info(f"Found {len(records)} attendance records for user {employee_id}")
         return records
@@ -249,10 +249,45 @@ async def get_attendance_records(
         logger.error(f"Error fetching attendance records: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch attendance records: {str(e)}")
 
+@router.get("/archive", response_model=List[schemas.AttendanceArchive])
+def read_attendance_archives(
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    if current_user.role.lower() != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view attendance archives")
+    return db.query(models.AttendanceArchive).order_by(models.AttendanceArchive.year).all()
+
+@router.post("/archive/{year}", response_model=schemas.AttendanceArchive, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def archive_attendance_year(
+    year: int,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Move a closed year of attendance out of the hot table"""
+    if current_user.role.lower() != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can archive attendance")
+    if year >= date.today().year:
+        raise HTTPException(status_code=400, detail="Only closed years can be archived")
+    try:
+        archive_year(db, year)
+        return db.get(models.AttendanceArchive, year)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error archiving attendance of {year}: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to archive attendance: {str(e)}")
+
 @router.get("/summary", response_model=schemas.AttendanceSummary)
 def get_attendance_summary(db: Session = Depends(get_db)):
+    # Concurrent dashboard refreshes share one computation
     today = date.today()
-    
+    return dashboard_flight.do(
+        ("attendance_summary", today),
+        lambda: _compute_attendance_summary(db, today),
+        ttl=DASHBOARD_CACHE_SECONDS
+    )
+
+def _compute_attendance_summary(db: Session, today: date) -> schemas.AttendanceSummary:
     # Get unique users who have checked in today
     present_users = db.query(models.Attendance.employee_id).filter(
         models.Attendance.date == today,
@@ -327,7 +362,7 @@ def get_attendance_summary(db: Session = Depends(get_db)):
     )
 
 @router.get("/all-records", response_model=List[dict])
-async def get_all_attendance_records(
+def get_all_attendance_records(
     date: str = Query(None),
     current_user: models.User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -340,9 +375,9 @@ async def get_all_attendance_records(
             logger.error(f"User {current_user.id} (role: {current_user.role}) attempted to access all attendance records")
             raise HTTPException(status_code=403, detail="Only HR can view all attendance records")
         
-        # Use today's date if not specified
+        # Use today's date if not specified (the ``date`` parameter shadows the date class)
         if not date:
-            query_date = date.today()
+            query_date = datetime.today().date()
         else:
             try:
                 query_date = datetime.strptime(date, '%Y-%m-%d').date()
@@ -350,48 +385,61 @@ async def get_all_attendance_records(
                 logger.error(f"Invalid date format: {date}")
                 raise HTTPException(status_code=400, detail="Invalid date format. Use YYYY-MM-DD")
         
-        # Get all users and their attendance for the specified date
-        records = []
-        users = db.query(models.User).all()
-        
-        for user in users:
-            # Find attendance record for this user on the specified date
-            attendance = db.query(models.Attendance).filter(
-                models.Attendance.employee_id == user.id,
-                models.Attendance.date == query_date
-            ).first()
-            
-            # Create a record with user details and attendance status
-            if attendance:
-                record = {
-                    "id": attendance.id,
-                    "employee_id": user.id,
-                    "employee_name": f"{user.first_name} {user.last_name}",
-                    "date": str(attendance.date),
-                    "check_in": str(attendance.check_in) if attendance.check_in else None,
-                    "check_out": str(attendance.check_out) if attendance.check_out else None,
-                    "status": attendance.status,
-                    "late_entry": attendance.late_entry,
-                    "early_exit": attendance.early_exit
-                }
-            else:
-                # Create a placeholder for users without attendance record
-                record = {
-                    "id": 0,
-                    "employee_id": user.id,
-                    "employee_name": f"{user.first_name} {user.last_name}",
-                    "date": str(query_date),
-                    "check_in": None,
-                    "check_out": None,
-                    "status": "absent",
-                    "late_entry": False,
-                    "early_exit": False
-                }
-            
-            records.append(record)
-        
+        # Every HR viewer gets the same answer, so concurrent refreshes share one computation
+        records = dashboard_flight.do(
+            ("attendance_all_records", query_date, "hr"),
+            lambda: _attendance_records_for_day(db, query_date),
+            ttl=DASHBOARD_CACHE_SECONDS
+        )
         logger.info(f"Found {len(records)} attendance records")
         return records
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching all attendance records: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch attendance records: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch attendance records: {str(e)}")
+
+def _attendance_records_for_day(db: Session, query_date: date) -> List[dict]:
+    # Get all users and their attendance for the specified date
+    records = []
+    users = db.query(models.User).all()
+    
+    # The day's attendance in one query; past days may have been archived
+    source = attendance_source(db, query_date, query_date)
+    attendance_by_user = {
+        attendance.employee_id: attendance
+        for attendance in db.execute(select(source).where(source.c.date == query_date))
+    }
+    
+    for user in users:
+        attendance = attendance_by_user.get(user.id)
+        
+        # Create a record with user details and attendance status
+        if attendance:
+            record = {
+                "id": attendance.id,
+                "employee_id": user.id,
+                "employee_name": f"{user.first_name} {user.last_name}",
+                "date": str(attendance.date),
+                "check_in": str(attendance.check_in) if attendance.check_in else None,
+                "check_out": str(attendance.check_out) if attendance.check_out else None,
+                "status": attendance.status,
+                "late_entry": attendance.late_entry,
+                "early_exit": attendance.early_exit
+            }
+        else:
+            # Create a placeholder for users without attendance record
+            record = {
+                "id": 0,
+                "employee_id": user.id,
+                "employee_name": f"{user.first_name} {user.last_name}",
+                "date": str(query_date),
+                "check_in": None,
+                "check_out": None,
+                "status": "absent",
+                "late_entry": False,
+                "early_exit": False
+            }
+        
+        records.append(record)
+    return records
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date, datetime
+from .. import models
+from ..schemas import Holiday, HolidayCreate
+from ..database import get_db
+from ..services.business_days import invalidate_calendars
+from .users import get_current_user, get_current_hr_user
+import logging
+
+router = APIRouter(
+    prefix="/holidays",
+    tags=["holidays"]
+)
+logger = logging.getLogger(__name__)
+
+@router.post("/", response_model=Holiday)
+async def create_holiday(
+    holiday: HolidayCreate,
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        db_holiday = models.Holiday(
+            **holiday.model_dump(),
+            created_at=datetime.utcnow()
+        )
+        db.add(db_holiday)
+        db.commit()
+        db.refresh(db_holiday)
+        invalidate_calendars()
+        return db_holiday
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error creating holiday: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/", response_model=List[Holiday])
+async def read_holidays(
+    year: Optional[int] = None,
+    department: Optional[str] = None,
+    location: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        query = db.query(models.Holiday)
+        if year:
+            query = query.filter(
+                models.Holiday.date >= date(year, 1, 1),
+                models.Holiday.date <= date(year, 12, 31)
+            )
+        if department:
+            query = query.filter(models.Holiday.department == department)
+        if location:
+            query = query.filter(models.Holiday.location == location)
+        return query.order_by(models.Holiday.date).all()
+    except Exception as e:
+        logger.error(f"Error fetching holidays: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/{holiday_id}")
+async def delete_holiday(
+    holiday_id: int,
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        result = db.query(models.Holiday).filter(models.Holiday.id == holiday_id).delete()
+        if result == 0:
+            raise HTTPException(status_code=404, detail="Holiday not found")
+        db.commit()
+        invalidate_calendars()
+        return {"message": "Holiday deleted successfully"}
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error deleting holiday: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,54 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from .. import models, schemas
+from ..database import get_db
+from ..services.scheduler import scheduler
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
+from .users import get_current_hr_user
+import logging
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+logger = logging.getLogger(__name__)
+
+@router.get("/", response_model=List[schemas.ScheduledJob])
+async def read_jobs(current_user: models.User = Depends(get_current_hr_user)):
+    return [
+        {
+            "name": job.name,
+            "interval_seconds": job.interval.total_seconds() if job.interval else None,
+            "run_at": job.run_at,
+            "next_run": job.next_run
+        }
+        for job in scheduler.jobs.values()
+    ]
+
+@router.get("/runs", response_model=List[schemas.JobRun])
+async def read_job_runs(
+    job_name: Optional[str] = None,
+    limit: int = 50,
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        query = db.query(models.JobRun)
+        if job_name:
+            query = query.filter(models.JobRun.job_name == job_name)
+        return query.order_by(models.JobRun.id.desc()).limit(limit).all()
+    except Exception as e:
+        logger.error(f"Error fetching job runs: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{job_name}/run", response_model=schemas.JobRun, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def run_job(
+    job_name: str,
+    current_user: models.User = Depends(get_current_hr_user)
+):
+    """Run a scheduled job immediately in this worker"""
+    if job_name not in scheduler.jobs:
+        raise HTTPException(status_code=404, detail="Job not found")
+    logger.info(f"User {current_user.id} triggered job {job_name}")
+    return scheduler.run_job(job_name)
@@ -1,10 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import and_, bindparam, update
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from datetime import date, datetime, timezone
+import json
+from datetime import date, datetime, timezone, timedelta
+from itertools import accumulate
 from .. import models, schemas
 from ..database import get_db
 from ..routers.users import oauth2_scheme, SECRET_KEY, ALGORITHM, get_current_user
+from ..services.business_days import count_business_days, count_business_days_bulk
+from ..services.leave_accrual import accrue_leave
+from ..services.leave_reports import REPORT_KIND, submit_report, report_csv
+from ..services.change_log import record_changes
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
 import logging
 
 # Configure logging
@@ -16,6 +24,43 @@ router = APIRouter(
     tags=["leave"]
 )
 
+# Requests in these states block overlapping requests and count towards coverage
+ACTIVE_LEAVE_STATUSES = ("pending", "approved")
+
+# Leave balance column each leave type is deducted from
+LEAVE_TYPE_COLUMNS = {
+    "annual": "annual_leave",
+    "sick": "sick_leave",
+    "casual": "casual_leave"
+}
+
+# Longest range the coverage calendar will compute in one call
+MAX_COVERAGE_DAYS = 731
+
+def _sweep_coverage(intervals, range_start: date, n_days: int) -> List[int]:
+    """Count employees on leave for each day of a range with a sweep over interval endpoints.
+
+    ``intervals`` are ``(employee_id, start_date, end_date)`` tuples intersecting the range,
+    sorted by employee and start date. Overlapping or adjacent intervals of one employee are
+    merged first so nobody is counted twice on the same day.
+    """
+    deltas = [0] * (n_days + 1)
+    last_employee, run_start, run_end = None, 0, 0
+    for employee_id, start, end in intervals:
+        start = max((start - range_start).days, 0)
+        end = min((end - range_start).days, n_days - 1)
+        if employee_id == last_employee and start <= run_end + 1:
+            run_end = max(run_end, end)
+            continue
+        if last_employee is not None:
+            deltas[run_start] += 1
+            deltas[run_end + 1] -= 1
+        last_employee, run_start, run_end = employee_id, start, end
+    if last_employee is not None:
+        deltas[run_start] += 1
+        deltas[run_end + 1] -= 1
+    return list(accumulate(deltas[:-1]))
+
 @router.post("/request", response_model=schemas.LeaveRequest)
 async def create_leave_request(
     leave: schemas.LeaveRequestCreate,
@@ -24,6 +69,23 @@ async def create_leave_request(
 ):
     """Create a new leave request"""
     try:
+        if leave.end_date < leave.start_date:
+            raise HTTPException(status_code=400, detail="End date cannot be before start date")
+
+        # Reject requests intersecting a pending or approved request of the same employee
+        overlapping = db.query(models.LeaveRequest.id).filter(
+            models.LeaveRequest.employee_id == leave.employee_id,
+            models.LeaveRequest.start_date <= leave.end_date,
+            models.LeaveRequest.end_date >= leave.start_date,
+            models.LeaveRequest.status.in_(ACTIVE_LEAVE_STATUSES)
+        ).first()
+        if overlapping:
+            logger.error(f"Leave request for user {leave.employee_id} overlaps request {overlapping.id}")
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Leave request overlaps existing request {overlapping.id}"
+            )
+
         # Create leave request
         db_leave = models.LeaveRequest(
             employee_id=leave.employee_id,
@@ -40,17 +102,24 @@ async def create_leave_request(
         db.refresh(db_leave)
         logger.info(f"Created leave request for user {current_user.id}")
         return db_leave
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error creating leave request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/request/{leave_id}/approve")
-async def approve_leave_request(
+def approve_leave_request(
     leave_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
 ):
-    """Approve a leave request and deduct from leave balance"""
+    """Approve a leave request and deduct from leave balance
+
+    The status change and the deduction are conditional UPDATEs in one transaction: the
+    request only moves out of ``pending`` once and the balance is only reduced while it
+    covers the days, so concurrent approvals can neither double-approve nor overdraw.
+    """
     if current_user.role != "hr":
         raise HTTPException(status_code=403, detail="Only HR can approve leave requests")
 
@@ -60,39 +129,49 @@ async def approve_leave_request(
         if not leave_request:
             raise HTTPException(status_code=404, detail="Leave request not found")
 
-        # Calculate number of days
-        days = (leave_request.end_date - leave_request.start_date).days + 1
+        column_name = LEAVE_TYPE_COLUMNS.get((leave_request.leave_type or "").lower())
+        if column_name is None:
+            raise HTTPException(status_code=400, detail="Invalid leave type")
 
-        # Get the leave balance
-        leave_balance = db.query(models.LeaveBalance).filter(
-            models.LeaveBalance.employee_id == leave_request.employee_id
+        # Calculate number of working days, skipping weekends and holidays
+        employee = db.query(models.User.department, models.User.location).filter(
+            models.User.id == leave_request.employee_id
         ).first()
+        days = count_business_days(
+            db,
+            leave_request.start_date,
+            leave_request.end_date,
+            employee.department if employee else None,
+            employee.location if employee else None
+        )
 
-        if not leave_balance:
-            raise HTTPException(status_code=404, detail="Leave balance not found")
-
-        # Deduct from appropriate leave type
-        if leave_request.leave_type.lower() == "annual":
-            if leave_balance.annual_leave < days:
-                raise HTTPException(status_code=400, detail="Insufficient annual leave balance")
-            leave_balance.annual_leave -= days
-        elif leave_request.leave_type.lower() == "sick":
-            if leave_balance.sick_leave < days:
-                raise HTTPException(status_code=400, detail="Insufficient sick leave balance")
-            leave_balance.sick_leave -= days
-        elif leave_request.leave_type.lower() == "casual":
-            if leave_balance.casual_leave < days:
-                raise HTTPException(status_code=400, detail="Insufficient casual leave balance")
-            leave_balance.casual_leave -= days
-        else:
-            raise HTTPException(status_code=400, detail="Invalid leave type")
+        now = datetime.utcnow()
+        approved = db.execute(
+            update(models.LeaveRequest).where(
+                models.LeaveRequest.id == leave_id,
+                models.LeaveRequest.status == "pending"
+            ).values(status="approved", updated_at=now).execution_options(synchronize_session=False)
+        )
+        if approved.rowcount == 0:
+            db.rollback()
+            raise HTTPException(status_code=409, detail="Leave request is no longer pending")
 
-        # Update leave request status
-        leave_request.status = "approved"
-        leave_request.updated_at = datetime.utcnow()
-        
-        # Update leave balance timestamp
-        leave_balance.updated_at = datetime.utcnow()
+        # Deduct from appropriate leave type, only while the balance covers the days
+        column = getattr(models.LeaveBalance, column_name)
+        deducted = db.execute(
+            update(models.LeaveBalance).where(
+                models.LeaveBalance.employee_id == leave_request.employee_id,
+                column >= days
+            ).values({column: column - days, models.LeaveBalance.updated_at: now}).execution_options(synchronize_session=False)
+        )
+        if deducted.rowcount == 0:
+            db.rollback()
+            has_balance = db.query(models.LeaveBalance.id).filter(
+                models.LeaveBalance.employee_id == leave_request.employee_id
+            ).first()
+            if not has_balance:
+                raise HTTPException(status_code=404, detail="Leave balance not found")
+            raise HTTPException(status_code=400, detail=f"Insufficient {leave_request.leave_type.lower()} leave balance")
 
         db.commit()
         logger.info(f"Approved leave request {leave_id} and deducted {days} days from {leave_request.leave_type} leave balance")
@@ -109,7 +188,7 @@ async def approve_leave_request(
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.put("/request/{leave_id}/reject")
-async def reject_leave_request(
+def reject_leave_request(
     leave_id: int,
     db: Session = Depends(get_db),
     current_user: models.User = Depends(get_current_user)
@@ -119,18 +198,181 @@ async def reject_leave_request(
         raise HTTPException(status_code=403, detail="Only HR can reject leave requests")
 
     try:
-        leave_request = db.query(models.LeaveRequest).filter(models.LeaveRequest.id == leave_id).first()
-        if not leave_request:
-            raise HTTPException(status_code=404, detail="Leave request not found")
+        rejected = db.execute(
+            update(models.LeaveRequest).where(
+                models.LeaveRequest.id == leave_id,
+                models.LeaveRequest.status == "pending"
+            ).values(status="rejected", updated_at=datetime.utcnow()).execution_options(synchronize_session=False)
+        )
+        if rejected.rowcount == 0:
+            db.rollback()
+            exists = db.query(models.LeaveRequest.id).filter(models.LeaveRequest.id == leave_id).first()
+            if not exists:
+                raise HTTPException(status_code=404, detail="Leave request not found")
+            raise HTTPException(status_code=409, detail="Leave request is no longer pending")
 
-        leave_request.status = "rejected"
         db.commit()
         logger.info(f"Rejected leave request {leave_id}")
         return {"message": "Leave request rejected successfully"}
+    except HTTPException:
+        raise
     except Exception as e:
+        db.rollback()
         logger.error(f"Error rejecting leave request: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/requests/decisions", response_model=schemas.LeaveDecisionBatchResult, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def decide_leave_requests(
+    batch: schemas.LeaveDecisionBatch,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Approve or reject many leave requests in one transaction
+
+    Requests and balances are loaded with one query each and every decision is validated
+    in memory, in the order given. Valid decisions are then applied together; if another
+    approval changes one of the rows in the meantime the whole batch is rolled back with
+    409 and can simply be resubmitted.
+    """
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can approve or reject leave requests")
+
+    try:
+        leave_ids = {decision.leave_id for decision in batch.decisions}
+        leave_requests = {
+            row.id: row
+            for row in db.query(
+                models.LeaveRequest.id,
+                models.LeaveRequest.employee_id,
+                models.LeaveRequest.leave_type,
+                models.LeaveRequest.start_date,
+                models.LeaveRequest.end_date,
+                models.LeaveRequest.status,
+                models.User.department,
+                models.User.location
+            ).outerjoin(
+                models.User, models.User.id == models.LeaveRequest.employee_id
+            ).filter(models.LeaveRequest.id.in_(leave_ids))
+        }
+        employee_ids = {row.employee_id for row in leave_requests.values()}
+        balances = {
+            row.employee_id: {column: row[index + 1] or 0 for index, column in enumerate(LEAVE_TYPE_COLUMNS.values())}
+            for row in db.query(
+                models.LeaveBalance.employee_id,
+                *(getattr(models.LeaveBalance, column) for column in LEAVE_TYPE_COLUMNS.values())
+            ).filter(models.LeaveBalance.employee_id.in_(employee_ids))
+        }
+
+        # Business days of every request to approve, counted per employee calendar in one pass
+        to_approve = [
+            leave_requests[decision.leave_id] for decision in batch.decisions
+            if decision.decision == "approve" and decision.leave_id in leave_requests
+        ]
+        day_counts = dict(zip(
+            [row.id for row in to_approve],
+            count_business_days_bulk(
+                db,
+                [row.start_date for row in to_approve],
+                [row.end_date for row in to_approve],
+                [row.department for row in to_approve],
+                [row.location for row in to_approve]
+            ).tolist()
+        )) if to_approve else {}
+
+        results, decided = [], set()
+        approve_ids, reject_ids = [], []
+        deductions = {}
+        for decision in batch.decisions:
+            result = {"leave_id": decision.leave_id, "decision": decision.decision, "success": False}
+            results.append(result)
+            leave_request = leave_requests.get(decision.leave_id)
+            if leave_request is None:
+                result["detail"] = "Leave request not found"
+                continue
+            if decision.leave_id in decided:
+                result["detail"] = "Duplicate decision for this leave request"
+                continue
+            if leave_request.status != "pending":
+                result["detail"] = "Leave request is no longer pending"
+                continue
+
+            if decision.decision == "reject":
+                reject_ids.append(decision.leave_id)
+            else:
+                column = LEAVE_TYPE_COLUMNS.get((leave_request.leave_type or "").lower())
+                balance = balances.get(leave_request.employee_id)
+                days = day_counts[decision.leave_id]
+                if column is None:
+                    result["detail"] = "Invalid leave type"
+                    continue
+                if balance is None:
+                    result["detail"] = "Leave balance not found"
+                    continue
+                if balance[column] < days:
+                    result["detail"] = f"Insufficient {leave_request.leave_type.lower()} leave balance"
+                    continue
+                balance[column] -= days
+                employee_deductions = deductions.setdefault(
+                    leave_request.employee_id, dict.fromkeys(LEAVE_TYPE_COLUMNS.values(), 0)
+                )
+                employee_deductions[column] += days
+                approve_ids.append(decision.leave_id)
+                result["days_deducted"] = days
+            decided.add(decision.leave_id)
+            result["success"] = True
+
+        now = datetime.utcnow()
+        applied = 0
+        for status_value, ids in (("approved", approve_ids), ("rejected", reject_ids)):
+            if ids:
+                applied += db.execute(
+                    update(models.LeaveRequest).where(
+                        models.LeaveRequest.id.in_(ids),
+                        models.LeaveRequest.status == "pending"
+                    ).values(status=status_value, updated_at=now).execution_options(synchronize_session=False)
+                ).rowcount
+
+        if deductions:
+            balance_table = models.LeaveBalance.__table__
+            applied_deductions = db.execute(
+                update(balance_table).where(
+                    balance_table.c.employee_id == bindparam("b_employee_id"),
+                    and_(*(balance_table.c[column] >= bindparam(f"b_{column}") for column in LEAVE_TYPE_COLUMNS.values()))
+                ).values({
+                    **{column: balance_table.c[column] - bindparam(f"b_{column}") for column in LEAVE_TYPE_COLUMNS.values()},
+                    "updated_at": now
+                }),
+                [
+                    {"b_employee_id": employee_id, **{f"b_{column}": days for column, days in employee_deductions.items()}}
+                    for employee_id, employee_deductions in deductions.items()
+                ]
+            ).rowcount
+            record_changes(db, models.LeaveBalance, models.LeaveBalance.employee_id.in_(deductions), "update")
+        else:
+            applied_deductions = 0
+
+        if applied != len(approve_ids) + len(reject_ids) or applied_deductions != len(deductions):
+            db.rollback()
+            raise HTTPException(
+                status_code=409,
+                detail="Leave requests or balances changed while the batch was processed; please retry"
+            )
+
+        db.commit()
+        logger.info(f"Applied {len(approve_ids)} approvals and {len(reject_ids)} rejections in one batch")
+        return {
+            "approved": len(approve_ids),
+            "rejected": len(reject_ids),
+            "failed": len(results) - len(approve_ids) - len(reject_ids),
+            "results": results
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error applying leave decisions: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/requests/{user_id}", response_model=List[schemas.LeaveRequest])
 async def get_leave_requests(
     user_id: Optional[int] = None,
@@ -185,9 +427,18 @@ def get_leave_balance(
             models.LeaveRequest.end_date <= end_date
         ).all()
 
-        # Calculate total days taken
-        for leave in approved_leaves:
-            days_taken += (leave.end_date - leave.start_date).days + 1
+        # Calculate total working days taken
+        if approved_leaves:
+            employee = db.query(models.User.department, models.User.location).filter(
+                models.User.id == user_id
+            ).first()
+            days_taken = int(count_business_days_bulk(
+                db,
+                [leave.start_date for leave in approved_leaves],
+                [leave.end_date for leave in approved_leaves],
+                [employee.department if employee else None] * len(approved_leaves),
+                [employee.location if employee else None] * len(approved_leaves)
+            ).sum())
 
         # Return the leave balance response with required fields
         return {
@@ -204,6 +455,148 @@ def get_leave_balance(
         logger.error(f"Error getting leave balance: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get leave balance: {str(e)}")
 
+@router.get("/coverage", response_model=schemas.LeaveCoverage)
+def get_department_coverage(
+    start_date: date,
+    end_date: date,
+    department: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Number of department members on approved or pending leave for each day in a range"""
+    try:
+        department = department or current_user.department
+        if current_user.role.lower() != "hr" and department != current_user.department:
+            raise HTTPException(status_code=403, detail="Not authorized to view another department's coverage")
+        if not department:
+            raise HTTPException(status_code=400, detail="Department is required")
+        if end_date < start_date:
+            raise HTTPException(status_code=400, detail="End date cannot be before start date")
+        n_days = (end_date - start_date).days + 1
+        if n_days > MAX_COVERAGE_DAYS:
+            raise HTTPException(status_code=400, detail=f"Date range cannot exceed {MAX_COVERAGE_DAYS} days")
+
+        intervals = db.query(
+            models.LeaveRequest.employee_id,
+            models.LeaveRequest.start_date,
+            models.LeaveRequest.end_date,
+            models.LeaveRequest.status
+        ).join(models.User, models.User.id == models.LeaveRequest.employee_id).filter(
+            models.User.department == department,
+            models.User.archived_at.is_(None),
+            models.LeaveRequest.status.in_(ACTIVE_LEAVE_STATUSES),
+            models.LeaveRequest.start_date <= end_date,
+            models.LeaveRequest.end_date >= start_date
+        ).order_by(models.LeaveRequest.employee_id, models.LeaveRequest.start_date).all()
+
+        headcount = db.query(models.User).filter(
+            models.User.department == department,
+            models.User.archived_at.is_(None)
+        ).count()
+
+        on_leave = _sweep_coverage([row[:3] for row in intervals], start_date, n_days)
+        approved = _sweep_coverage([row[:3] for row in intervals if row.status == "approved"], start_date, n_days)
+        pending = _sweep_coverage([row[:3] for row in intervals if row.status == "pending"], start_date, n_days)
+
+        return {
+            "department": department,
+            "start_date": start_date,
+            "end_date": end_date,
+            "headcount": headcount,
+            "days": [
+                {
+                    "date": start_date + timedelta(days=offset),
+                    "on_leave": on_leave[offset],
+                    "approved": approved[offset],
+                    "pending": pending[offset]
+                }
+                for offset in range(n_days)
+            ]
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error computing leave coverage: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to compute leave coverage: {str(e)}")
+
+@router.get("/day-counts", response_model=List[schemas.LeaveDayCount])
+def get_leave_day_counts(
+    year: int,
+    status: Optional[str] = None,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Calendar and business day counts for every leave request starting in a year"""
+    if current_user.role.lower() != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view leave day counts")
+
+    try:
+        query = db.query(
+            models.LeaveRequest.id,
+            models.LeaveRequest.employee_id,
+            models.LeaveRequest.leave_type,
+            models.LeaveRequest.status,
+            models.LeaveRequest.start_date,
+            models.LeaveRequest.end_date,
+            models.User.department,
+            models.User.location
+        ).join(models.User, models.User.id == models.LeaveRequest.employee_id).filter(
+            models.LeaveRequest.start_date >= date(year, 1, 1),
+            models.LeaveRequest.start_date <= date(year, 12, 31)
+        )
+        if status:
+            query = query.filter(models.LeaveRequest.status == status)
+        rows = query.order_by(models.LeaveRequest.id).all()
+
+        business_days = count_business_days_bulk(
+            db,
+            [row.start_date for row in rows],
+            [row.end_date for row in rows],
+            [row.department for row in rows],
+            [row.location for row in rows]
+        )
+        return [
+            {
+                "id": row.id,
+                "employee_id": row.employee_id,
+                "leave_type": row.leave_type,
+                "status": row.status,
+                "start_date": row.start_date,
+                "end_date": row.end_date,
+                "calendar_days": (row.end_date - row.start_date).days + 1,
+                "business_days": int(days)
+            }
+            for row, days in zip(rows, business_days)
+        ]
+    except Exception as e:
+        logger.error(f"Error counting leave days: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to count leave days: {str(e)}")
+
+@router.post("/accrual/{year}", response_model=schemas.LeaveAccrualResult, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def run_leave_accrual(
+    year: int,
+    request: Optional[schemas.LeaveAccrualRequest] = None,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Roll all leave balances over into a new year; rerunning a year is a no-op"""
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can run leave accrual")
+    if year > date.today().year + 1:
+        raise HTTPException(status_code=400, detail="Cannot accrue leave more than one year ahead")
+
+    try:
+        policy = {
+            leave_type: rule.model_dump()
+            for leave_type, rule in (request.policy if request else {}).items()
+        }
+        updated = accrue_leave(db, year, policy)
+        return {"year": year, "updated": updated}
+    except Exception as e:
+        logger.error(f"Error running leave accrual: {str(e)}")
+        db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/all-requests", response_model=List[dict])
 async def get_all_leave_requests(
     status: Optional[str] = None,
@@ -251,4 +644,74 @@ async def get_all_leave_requests(
         return enriched_requests
     except Exception as e:
         logger.error(f"Error fetching all leave requests: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Failed to fetch leave requests: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to fetch leave requests: {str(e)}") 
+
+
+@router.post(
+    "/reports/utilization",
+    response_model=schemas.BackgroundJob,
+    response_model_exclude={"result"},
+    status_code=status.HTTP_202_ACCEPTED
+)
+def request_leave_utilization_report(
+    request: schemas.LeaveUtilizationReportRequest,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """Build a leave utilization report in the background; poll the returned job for progress.
+
+    A report already built or being built for the same parameters is returned with 200
+    while no leave request, balance or employee has changed since.
+    """
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can request leave reports")
+
+    try:
+        job, reused = submit_report(db, request.model_dump(), current_user.id)
+        if reused:
+            response.status_code = status.HTTP_200_OK
+        return job
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error queueing leave utilization report: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to queue leave utilization report: {str(e)}")
+
+def _get_report_job(db: Session, job_id: str, current_user: models.User) -> models.BackgroundJob:
+    if current_user.role != "hr":
+        raise HTTPException(status_code=403, detail="Only HR can view leave reports")
+    job = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.id == job_id,
+        models.BackgroundJob.kind == REPORT_KIND
+    ).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Leave report not found")
+    return job
+
+@router.get("/reports/{job_id}", response_model=schemas.BackgroundJob, response_model_exclude={"result"})
+def read_leave_report_job(
+    job_id: str,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    return _get_report_job(db, job_id, current_user)
+
+@router.get("/reports/{job_id}/result")
+def download_leave_report(
+    job_id: str,
+    format: str = Query("json", pattern="^(json|csv)$"),
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(get_current_user)
+):
+    """The finished report as JSON, or its monthly rows as CSV"""
+    job = _get_report_job(db, job_id, current_user)
+    if job.status != "completed":
+        raise HTTPException(status_code=409, detail=f"Leave report is {job.status}")
+
+    if format == "csv":
+        return Response(
+            content=report_csv(json.loads(job.result)),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="leave-utilization-{job.id}.csv"'}
+        )
+    return Response(content=job.result, media_type="application/json")
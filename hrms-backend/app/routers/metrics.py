@@ -0,0 +1,14 @@
+from fastapi import APIRouter, Depends
+from .. import models, schemas
+from ..metrics import metrics
+from .users import get_current_hr_user
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"]
+)
+
+@router.get("/", response_model=schemas.MetricsSnapshot)
+async def read_metrics(current_user: models.User = Depends(get_current_hr_user)):
+    """Counters and gauges of this worker, e.g. admitted and shed requests"""
+    return metrics.snapshot()
@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from .. import models, schemas
+from ..database import get_db
+from ..services.payroll import compute_period, get_period
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
+from .users import get_current_user, get_current_hr_user
+import logging
+
+router = APIRouter(
+    prefix="/payroll",
+    tags=["payroll"]
+)
+logger = logging.getLogger(__name__)
+
+# Longest pay period the engine will compute in one call
+MAX_PERIOD_DAYS = 366
+
+@router.post("/periods", response_model=schemas.PayrollPeriod, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def create_payroll_period(
+    period: schemas.PayrollPeriodCreate,
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    """Compute attendance metrics for a pay period, or return the stored result"""
+    if period.end_date < period.start_date:
+        raise HTTPException(status_code=400, detail="End date cannot be before start date")
+    if (period.end_date - period.start_date).days + 1 > MAX_PERIOD_DAYS:
+        raise HTTPException(status_code=400, detail=f"Pay period cannot exceed {MAX_PERIOD_DAYS} days")
+
+    try:
+        existing = get_period(db, period.start_date, period.end_date)
+        if existing and not period.recompute:
+            return existing
+        return compute_period(db, period.start_date, period.end_date, period.standard_hours)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error computing payroll period: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to compute payroll period: {str(e)}")
+
+@router.get("/periods", response_model=List[schemas.PayrollPeriod])
+async def read_payroll_periods(
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    try:
+        return db.query(models.PayrollPeriod).order_by(models.PayrollPeriod.start_date.desc()).all()
+    except Exception as e:
+        logger.error(f"Error fetching payroll periods: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/periods/{period_id}/metrics", response_model=List[schemas.PayrollPeriodMetric])
+async def read_payroll_metrics(
+    period_id: int,
+    employee_id: Optional[int] = None,
+    current_user: models.User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Stored per-employee metrics of a period; employees only see their own"""
+    try:
+        if current_user.role.lower() != "hr":
+            if employee_id is not None and employee_id != current_user.id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="Not authorized to view another user's payroll metrics"
+                )
+            employee_id = current_user.id
+
+        if not db.query(models.PayrollPeriod.id).filter(models.PayrollPeriod.id == period_id).first():
+            raise HTTPException(status_code=404, detail="Payroll period not found")
+
+        query = db.query(models.PayrollPeriodMetric).filter(models.PayrollPeriodMetric.period_id == period_id)
+        if employee_id is not None:
+            query = query.filter(models.PayrollPeriodMetric.employee_id == employee_id)
+        return query.order_by(models.PayrollPeriodMetric.employee_id).all()
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error fetching payroll metrics: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
@@ -8,6 +8,7 @@ from datetime import datetime
 import uuid
 import logging
 from .users import get_current_user, get_current_hr_user
+from ..services.cache import GenerationalCache
 
 router = APIRouter(
     prefix="/policies",
@@ -15,6 +16,9 @@ router = APIRouter(
 )
 logger = logging.getLogger(__name__)
 
+# Serialized policies, expired when any worker changes a policy
+policy_cache = GenerationalCache("policies", ("policies",))
+
 @router.post("/", response_model=Policy)
 async def create_policy(
     policy: PolicyCreate,
@@ -52,8 +56,10 @@ async def read_policies(
     db: Session = Depends(get_db)
 ):
     try:
-        policies = db.query(models.Policy).offset(skip).limit(limit).all()
-        return policies
+        return policy_cache.get_or_load(("list", skip, limit), lambda: [
+            Policy.model_validate(policy).model_dump()
+            for policy in db.query(models.Policy).offset(skip).limit(limit).all()
+        ])
     except Exception as e:
         logger.error(f"Error fetching policies: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
@@ -65,7 +71,11 @@ async def read_policy(
     db: Session = Depends(get_db)
 ):
     try:
-        policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
+        def load_policy():
+            policy = db.query(models.Policy).filter(models.Policy.id == policy_id).first()
+            return Policy.model_validate(policy).model_dump() if policy is not None else None
+
+        policy = policy_cache.get_or_load(("policy", policy_id), load_policy)
         if policy is None:
             raise HTTPException(status_code=404, detail="Policy not found")
         return policy
@@ -0,0 +1,37 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse
+from typing import List
+import os
+from .. import models, schemas
+from ..database import current_tenant
+from ..services.profiler import PROFILE_ID_PATTERN, list_profiles, profile_path
+from .users import get_current_hr_user
+
+router = APIRouter(
+    prefix="/profiles",
+    tags=["profiles"]
+)
+
+@router.get("/", response_model=List[schemas.ProfileSummary])
+def read_profiles(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: models.User = Depends(get_current_hr_user)
+):
+    """Recent request profiles of the caller's tenant, newest first"""
+    tenant = current_tenant.get()
+    return [summary for summary in list_profiles() if summary.get("tenant") == tenant][:limit]
+
+@router.get("/{profile_id}")
+def download_profile(
+    profile_id: str,
+    current_user: models.User = Depends(get_current_hr_user)
+):
+    """Speedscope file of a profile; open it at https://www.speedscope.app"""
+    summary = next((summary for summary in list_profiles() if summary["id"] == profile_id), None) if PROFILE_ID_PATTERN.match(profile_id) else None
+    if summary is None or summary.get("tenant") != current_tenant.get() or not os.path.exists(profile_path(profile_id)):
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(
+        profile_path(profile_id),
+        media_type="application/json",
+        filename=f"{profile_id}.speedscope.json"
+    )
@@ -0,0 +1,80 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy.orm import Session
+from typing import Optional
+from .. import models, schemas
+from ..database import get_db
+from ..services.change_log import SYNC_MODELS, EXCLUDED_COLUMNS
+from .users import get_current_hr_user
+import logging
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["sync"]
+)
+logger = logging.getLogger(__name__)
+
+MAX_SYNC_BATCH = 10000
+
+def _serialize(model, row) -> dict:
+    return jsonable_encoder({
+        column.name: getattr(row, column.key)
+        for column in model.__table__.columns
+        if column.name not in EXCLUDED_COLUMNS
+    })
+
+@router.get("/changes", response_model=schemas.SyncBatch)
+def read_changes(
+    after: int = Query(0, ge=0, description="Cursor returned by the previous batch; 0 for a full sync"),
+    limit: int = Query(1000, ge=1, le=MAX_SYNC_BATCH),
+    tables: Optional[str] = Query(None, description="Comma-separated table names; all synced tables by default"),
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    """Changes after a cursor, oldest first, with the current state of each changed row.
+
+    Several changes of one row within a batch collapse into its latest entry. Rows that no
+    longer exist are returned as ``delete`` tombstones without data.
+    """
+    table_names = list(SYNC_MODELS) if not tables else [name.strip() for name in tables.split(",") if name.strip()]
+    unknown = [name for name in table_names if name not in SYNC_MODELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown tables: {', '.join(unknown)}")
+
+    try:
+        entries = db.query(models.ChangeLog).filter(
+            models.ChangeLog.id > after,
+            models.ChangeLog.table_name.in_(table_names)
+        ).order_by(models.ChangeLog.id).limit(limit).all()
+
+        latest = {}
+        for entry in entries:
+            latest[(entry.table_name, entry.row_id)] = entry
+
+        # Current state of the changed rows, one query per table
+        current = {}
+        for table_name in {table_name for table_name, _ in latest}:
+            model = SYNC_MODELS[table_name]
+            row_ids = [row_id for name, row_id in latest if name == table_name]
+            for row in db.query(model).filter(model.id.in_(row_ids)):
+                current[(table_name, row.id)] = _serialize(model, row)
+
+        changes = []
+        for key, entry in sorted(latest.items(), key=lambda item: item[1].id):
+            data = current.get(key)
+            changes.append({
+                "cursor": entry.id,
+                "table": entry.table_name,
+                "id": entry.row_id,
+                "operation": "upsert" if data is not None else "delete",
+                "changed_at": entry.changed_at,
+                "data": data
+            })
+        return {
+            "changes": changes,
+            "next_cursor": entries[-1].id if entries else after,
+            "has_more": len(entries) == limit
+        }
+    except Exception as e:
+        logger.error(f"Error reading change log: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
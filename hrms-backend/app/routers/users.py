@@ -1,13 +1,27 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query
+from sqlalchemy import insert, inspect, or_
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from typing import List, Optional
 from .. import models
-from ..schemas import User, UserUpdate, UserCreate
-from ..database import get_db
+from ..schemas import User, UserUpdate, UserCreate, BackgroundJob, OffboardRequest, OffboardResult
+from ..database import get_db, SessionLocal, current_tenant
+from ..services.uploads import iter_upload_rows, upload_format, validation_message
+from ..services.offboarding import offboard_users
+from ..services.query_budget import query_budget, BULK_QUERY_BUDGET_SECONDS
+from ..services.cache import GenerationalCache
 from passlib.context import CryptContext
+from pydantic import ValidationError
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextvars
+import multiprocessing
+import threading
+import json
+import uuid
+import os
 import logging
 from sqlalchemy.sql import text
 
@@ -24,15 +38,67 @@ SECRET_KEY = "your-secret-key-here"  # Change this to a secure secret key
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+# Leave granted to every new employee
+DEFAULT_LEAVE_BALANCE = {
+    "annual_leave": 10.0,
+    "sick_leave": 5.0,
+    "casual_leave": 5.0
+}
+
+# Users hashed and inserted together during bulk onboarding
+ONBOARDING_BATCH_SIZE = 500
+MAX_REPORTED_ONBOARDING_ERRORS = 1000
+
+# Processes used to hash passwords during bulk onboarding
+HASH_WORKERS = int(os.getenv("HRMS_HASH_WORKERS", os.cpu_count() or 1))
+
+# Onboarding jobs run at once; further jobs wait in the executor's queue
+ONBOARDING_WORKERS = int(os.getenv("HRMS_ONBOARDING_WORKERS", "1"))
+
+_hash_pool = None
+_hash_pool_lock = threading.Lock()
+_onboarding_executor = None
+_onboarding_executor_lock = threading.Lock()
+
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+def get_hash_pool() -> ProcessPoolExecutor:
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is None:
+            # spawn rather than fork: forking a multi-threaded server process can deadlock
+            _hash_pool = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _hash_pool
+
+def shutdown_hash_pool():
+    global _hash_pool
+    with _hash_pool_lock:
+        if _hash_pool is not None:
+            _hash_pool.shutdown(cancel_futures=True)
+            _hash_pool = None
+
+def get_onboarding_executor() -> ThreadPoolExecutor:
+    """Threads running bulk onboarding jobs outside the request that queued them."""
+    global _onboarding_executor
+    with _onboarding_executor_lock:
+        if _onboarding_executor is None:
+            _onboarding_executor = ThreadPoolExecutor(max_workers=ONBOARDING_WORKERS, thread_name_prefix="onboarding")
+        return _onboarding_executor
+
+def shutdown_onboarding_executor():
+    global _onboarding_executor
+    with _onboarding_executor_lock:
+        if _onboarding_executor is not None:
+            _onboarding_executor.shutdown(cancel_futures=True)
+            _onboarding_executor = None
+
 def authenticate_user(db: Session, email: str, password: str):
     user = db.query(models.User).filter(models.User.email == email).first()
-    if not user:
+    if not user or user.archived_at is not None:
         return False
     if not verify_password(password, user.hashed_password):
         return False
@@ -79,6 +145,31 @@ async def login_for_access_token(
         logger.error(f"Error during login: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Login failed: {str(e)}")
 
+# Users by email for request authentication, expired when any worker changes a user
+principal_cache = GenerationalCache("principals", ("users",), max_entries=10000)
+
+def _load_principal(db: Session, email: str) -> Optional[dict]:
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user is None:
+        return None
+    return {attribute.key: getattr(user, attribute.key) for attribute in inspect(models.User).column_attrs}
+
+def get_active_user_by_email(db: Session, email: str) -> Optional[models.User]:
+    """Active user with ``email``, from the principal cache when it is current.
+
+    The user is attached to ``db`` as a persistent instance without querying, so callers
+    can use and modify it like a loaded one.
+    """
+    values = principal_cache.get_or_load(email, lambda: _load_principal(db, email))
+    if values is None or values["archived_at"] is not None:
+        return None
+    user = db.identity_map.get(identity_key(models.User, values["id"]))
+    if user is None:
+        user = models.User(**values)
+        make_transient_to_detached(user)
+        db.add(user)
+    return user
+
 async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -93,7 +184,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = get_active_user_by_email(db, email)
     if user is None:
         raise credentials_exception
     return user
@@ -234,15 +325,8 @@ async def delete_user(
             )
         
         try:
-            # Delete related records first
-            db.query(models.LeaveBalance).filter(models.LeaveBalance.employee_id == user_id).delete()
-            db.query(models.LeaveRequest).filter(models.LeaveRequest.employee_id == user_id).delete()
-            db.query(models.Attendance).filter(models.Attendance.employee_id == user_id).delete()
-            db.query(models.Asset).filter(models.Asset.user_id == user_id).delete()
-            db.query(models.Policy).filter(models.Policy.created_by == user_id).delete()
-            
-            # Now delete the user
-            db.delete(db_user)
+            # Delete the user and related records with set-based statements
+            offboard_users(db, [user_id], "delete", current_user.id)
             db.commit()
             
             return {"message": "User deleted successfully"}
@@ -264,6 +348,30 @@ async def delete_user(
             detail=f"Failed to delete user: {str(e)}"
         )
 
+@router.post("/users/offboard", response_model=OffboardResult, dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))])
+def bulk_offboard_users(
+    request: OffboardRequest,
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    """Archive or delete many users and their dependent records in one transaction"""
+    if current_user.id in request.user_ids:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot offboard your own account"
+        )
+    try:
+        result = offboard_users(db, request.user_ids, request.mode, current_user.id)
+        db.commit()
+        return result
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error offboarding users: {str(e)}", exc_info=True)
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to offboard users: {str(e)}"
+        )
+
 @router.post("/users/", response_model=User)
 async def create_user(
     user: UserCreate,
@@ -303,6 +411,7 @@ async def create_user(
             last_name=user.last_name,
             phone=user.phone,
             department=user.department,
+            location=user.location,
             position=user.position,
             hire_date=user.hire_date,
             created_at=datetime.utcnow(),
@@ -316,9 +425,7 @@ async def create_user(
         # Create leave balance for the new user
         leave_balance = models.LeaveBalance(
             employee_id=db_user.id,
-            annual_leave=10.0,  # Default annual leave days
-            sick_leave=5.0,     # Default sick leave days
-            casual_leave=5.0,   # Default casual leave days
+            **DEFAULT_LEAVE_BALANCE,
             created_at=datetime.utcnow(),
             updated_at=datetime.utcnow()
         )
@@ -330,4 +437,146 @@ async def create_user(
     except Exception as e:
         logger.error(f"Error creating user: {str(e)}", exc_info=True)
         db.rollback()
-        raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Failed to create user: {str(e)}") 
+
+def _run_bulk_onboarding(job_id: str, users: list, errors: list):
+    """Create validated users and their leave balances in batches, recording progress on the job.
+
+    ``users`` holds ``(row_number, UserCreate)`` pairs; ``errors`` the rows that already
+    failed validation.
+    """
+    db = SessionLocal()
+    try:
+        job = db.get(models.BackgroundJob, job_id)
+        job.status = "running"
+        db.commit()
+
+        # Emails and employee ids already registered, fetched with one set query per batch
+        taken_emails, taken_codes = set(), set()
+        for start in range(0, len(users), ONBOARDING_BATCH_SIZE):
+            chunk = [user for _, user in users[start:start + ONBOARDING_BATCH_SIZE]]
+            existing = db.query(models.User.email, models.User.employee_id).filter(or_(
+                models.User.email.in_([user.email for user in chunk]),
+                models.User.employee_id.in_([user.employee_id for user in chunk if user.employee_id])
+            )).all()
+            taken_emails.update(row.email for row in existing)
+            taken_codes.update(row.employee_id for row in existing if row.employee_id)
+
+        accepted = []
+        for row_number, user in users:
+            if user.email in taken_emails:
+                errors.append({"row": row_number, "errors": ["Email already registered"]})
+            elif user.employee_id and user.employee_id in taken_codes:
+                errors.append({"row": row_number, "errors": ["Employee ID already exists"]})
+            else:
+                taken_emails.add(user.email)
+                if user.employee_id:
+                    taken_codes.add(user.employee_id)
+                accepted.append(user)
+        job.processed = len(errors)
+        db.commit()
+
+        pool = get_hash_pool()
+        created = 0
+        for start in range(0, len(accepted), ONBOARDING_BATCH_SIZE):
+            batch = accepted[start:start + ONBOARDING_BATCH_SIZE]
+            hashes = pool.map(
+                get_password_hash,
+                [user.password for user in batch],
+                chunksize=max(1, len(batch) // (HASH_WORKERS * 4))
+            )
+            now = datetime.utcnow()
+            user_ids = db.execute(
+                insert(models.User).returning(models.User.id, sort_by_parameter_order=True),
+                [
+                    {**user.model_dump(exclude={"password"}), "hashed_password": hashed, "created_at": now, "updated_at": now}
+                    for user, hashed in zip(batch, hashes)
+                ]
+            ).scalars().all()
+            db.execute(insert(models.LeaveBalance), [
+                {"employee_id": user_id, **DEFAULT_LEAVE_BALANCE, "created_at": now, "updated_at": now}
+                for user_id in user_ids
+            ])
+            created += len(user_ids)
+            job.processed = len(errors) + created
+            db.commit()
+            logger.info(f"Bulk onboarding {job_id}: {job.processed}/{job.total} rows processed")
+
+        errors.sort(key=lambda error: error["row"])
+        job.status = "completed"
+        job.result = json.dumps({
+            "created": created,
+            "failed": len(errors),
+            "errors": errors[:MAX_REPORTED_ONBOARDING_ERRORS],
+            "errors_truncated": len(errors) > MAX_REPORTED_ONBOARDING_ERRORS
+        })
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Bulk onboarding {job_id} failed: {str(e)}", exc_info=True)
+        job = db.get(models.BackgroundJob, job_id)
+        if job:
+            job.status = "failed"
+            job.error = str(e)
+            db.commit()
+    finally:
+        db.close()
+
+@router.post("/users/bulk", response_model=BackgroundJob, status_code=status.HTTP_202_ACCEPTED)
+def bulk_create_users(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$"),
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    """Onboard users from a CSV or NDJSON file in the background; poll the returned job for progress"""
+    users, errors = [], []
+    for row_number, values, error in iter_upload_rows(file, upload_format(file, format)):
+        if error is None:
+            try:
+                users.append((row_number, UserCreate(**values)))
+                continue
+            except ValidationError as e:
+                error = validation_message(e)
+        errors.append({"row": row_number, "errors": [error]})
+
+    try:
+        job = models.BackgroundJob(
+            id=uuid.uuid4().hex,
+            kind="user_onboarding",
+            status="queued",
+            total=len(users) + len(errors),
+            processed=0,
+            created_by=current_user.id,
+            created_at=datetime.utcnow(),
+            updated_at=datetime.utcnow()
+        )
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error queueing bulk onboarding: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"Failed to queue bulk onboarding: {str(e)}")
+
+    # The job must not hold the request's admission slot or idempotency key, and only
+    # the tenant travels with it, not the request's query budget or profile
+    context = contextvars.Context()
+    context.run(current_tenant.set, current_tenant.get())
+    get_onboarding_executor().submit(context.run, _run_bulk_onboarding, job.id, users, errors)
+    logger.info(f"Queued bulk onboarding {job.id} with {job.total} rows")
+    return job
+
+@router.get("/users/bulk/{job_id}", response_model=BackgroundJob)
+async def read_bulk_onboarding_job(
+    job_id: str,
+    current_user: models.User = Depends(get_current_hr_user),
+    db: Session = Depends(get_db)
+):
+    job = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.id == job_id,
+        models.BackgroundJob.kind == "user_onboarding"
+    ).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Onboarding job not found")
+    return job
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, ConfigDict, EmailStr, field_validator, Field
-from typing import Optional, List
+from typing import Any, Dict, List, Literal, Optional
+import json
 from datetime import date, time, datetime
 from .models import UserRole
 
@@ -14,6 +15,7 @@ class UserBase(BaseModel):
     phone: Optional[str] = None
     department: Optional[str] = None
     position: Optional[str] = None
+    location: Optional[str] = None
     hire_date: Optional[date] = None
 
     @field_validator('hire_date', mode='before')
@@ -37,6 +39,7 @@ class UserUpdate(BaseModel):
     phone: Optional[str] = None
     department: Optional[str] = None
     position: Optional[str] = None
+    location: Optional[str] = None
     hire_date: Optional[date] = None
 
     @field_validator('hire_date', mode='before')
@@ -48,6 +51,7 @@ class UserUpdate(BaseModel):
 class User(UserBase):
     # Primary key for database relationships
     id: int
+    archived_at: Optional[datetime] = None
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -65,6 +69,17 @@ class User(UserBase):
             return cls(**obj.to_dict())
         return super().from_orm(obj)
 
+class OffboardRequest(BaseModel):
+    user_ids: List[int] = Field(..., min_length=1, max_length=10000)
+    mode: Literal["archive", "delete"] = "archive"
+
+class OffboardResult(BaseModel):
+    mode: str
+    users: int
+    not_found: List[int]
+    assets_returned: int
+    deleted: Dict[str, int]
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -105,6 +120,14 @@ class Attendance(AttendanceBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class AttendanceArchive(BaseModel):
+    year: int
+    table_name: str
+    row_count: int
+    archived_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
 class AttendanceSummary(BaseModel):
     total_present: int
     absentee_percentage: float
@@ -112,6 +135,34 @@ class AttendanceSummary(BaseModel):
     early_exits: int
     monthly_working_hours: List[dict]
 
+class PayrollPeriodCreate(BaseModel):
+    start_date: date
+    end_date: date
+    standard_hours: float = 8.0
+    recompute: bool = False
+
+class PayrollPeriod(BaseModel):
+    id: int
+    start_date: date
+    end_date: date
+    standard_hours: float
+    employee_count: int
+    computed_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+class PayrollPeriodMetric(BaseModel):
+    employee_id: int
+    worked_hours: float
+    overtime_hours: float
+    days_present: int
+    expected_days: int
+    absent_days: int
+    late_entries: int
+    early_exits: int
+
+    model_config = ConfigDict(from_attributes=True)
+
 class LeaveRequestBase(BaseModel):
     # Primary key of the user (not employee_id)
     employee_id: int
@@ -131,6 +182,39 @@ class LeaveRequest(LeaveRequestBase):
 
     model_config = ConfigDict(from_attributes=True)
 
+class LeaveDecision(BaseModel):
+    leave_id: int
+    decision: Literal["approve", "reject"]
+
+class LeaveDecisionBatch(BaseModel):
+    decisions: List[LeaveDecision] = Field(..., min_length=1, max_length=5000)
+
+class LeaveDecisionResult(BaseModel):
+    leave_id: int
+    decision: str
+    success: bool
+    days_deducted: Optional[float] = None
+    detail: Optional[str] = None
+
+class LeaveDecisionBatchResult(BaseModel):
+    approved: int
+    rejected: int
+    failed: int
+    results: List[LeaveDecisionResult]
+
+class LeaveCoverageDay(BaseModel):
+    date: date
+    on_leave: int
+    approved: int
+    pending: int
+
+class LeaveCoverage(BaseModel):
+    department: str
+    start_date: date
+    end_date: date
+    headcount: int
+    days: List[LeaveCoverageDay]
+
 class LeaveBalanceBase(BaseModel):
     # Primary key of the user (not employee_id)
     employee_id: int
@@ -159,6 +243,54 @@ class LeaveBalance(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class LeaveAccrualRule(BaseModel):
+    accrual: Optional[float] = Field(None, ge=0)
+    carry_over: Optional[float] = Field(None, ge=0)
+
+class LeaveAccrualRequest(BaseModel):
+    # Overrides of the default rules, keyed by leave_balance column
+    policy: Dict[Literal["annual_leave", "sick_leave", "casual_leave"], LeaveAccrualRule] = {}
+
+class LeaveAccrualResult(BaseModel):
+    year: int
+    updated: int
+
+class LeaveUtilizationReportRequest(BaseModel):
+    year: int = Field(..., ge=2000, le=2100)
+    departments: Optional[List[str]] = None
+    leave_types: Optional[List[str]] = None
+    statuses: List[Literal["pending", "approved", "rejected"]] = ["approved"]
+
+    @field_validator('departments', 'leave_types', 'statuses')
+    def normalize_list(cls, value):
+        # Sorted and deduplicated, so equal requests share a cached report
+        return sorted(set(value)) if value else value
+
+class LeaveDayCount(BaseModel):
+    id: int
+    employee_id: int
+    leave_type: str
+    status: str
+    start_date: date
+    end_date: date
+    calendar_days: int
+    business_days: int
+
+class HolidayBase(BaseModel):
+    name: str
+    date: date
+    location: Optional[str] = None
+    department: Optional[str] = None
+
+class HolidayCreate(HolidayBase):
+    pass
+
+class Holiday(HolidayBase):
+    id: int
+    created_at: Optional[datetime] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
 class AssetBase(BaseModel):
     asset_name: str
     category: str
@@ -185,6 +317,8 @@ class AssetUpdate(AssetBase):
 
 class Asset(AssetBase):
     id: int
+    warranty_expired: Optional[bool] = False
+    maintenance_overdue: Optional[bool] = False
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
 
@@ -196,6 +330,58 @@ class Asset(AssetBase):
         }
     )
 
+class AssetFacetCount(BaseModel):
+    value: Optional[str] = None
+    count: int
+
+class AssetFacets(BaseModel):
+    category: List[AssetFacetCount]
+    department: List[AssetFacetCount]
+    condition: List[AssetFacetCount]
+
+class AssetSearchResult(BaseModel):
+    total: int
+    skip: int
+    limit: int
+    items: List[Asset]
+    facets: AssetFacets
+
+class AssetImportError(BaseModel):
+    row: int
+    errors: List[str]
+
+class AssetImportResult(BaseModel):
+    imported: int
+    failed: int
+    errors: List[AssetImportError]
+    errors_truncated: bool = False
+
+class AssetDueItem(BaseModel):
+    id: int
+    asset_name: str
+    category: Optional[str] = None
+    department: Optional[str] = None
+    assigned_to: Optional[int] = None
+    due_date: date
+
+class AssetDueGroup(BaseModel):
+    department: Optional[str] = None
+    category: Optional[str] = None
+    count: int
+    assets: List[AssetDueItem]
+
+class AssetDueReport(BaseModel):
+    kind: str
+    window_start: Optional[date] = None
+    window_end: date
+    total: int
+    groups: List[AssetDueGroup]
+
+class AssetCalendarDay(BaseModel):
+    date: date
+    maintenance: List[AssetDueItem]
+    warranty_expiry: List[AssetDueItem]
+
 class PolicyBase(BaseModel):
     title: str
     description: str
@@ -222,4 +408,95 @@ class Policy(PolicyBase):
             datetime: lambda v: v.isoformat() if v else None,
             date: lambda v: v.isoformat() if v else None
         }
-    ) 
\ No newline at end of file
+    ) 
+
+class ScheduledJob(BaseModel):
+    name: str
+    interval_seconds: Optional[float] = None
+    run_at: Optional[time] = None
+    next_run: Optional[datetime] = None
+
+class JobRun(BaseModel):
+    id: int
+    job_name: str
+    started_at: datetime
+    duration_ms: float
+    rows_touched: int
+    status: str
+    error: Optional[str] = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+class BackgroundJob(BaseModel):
+    id: str
+    kind: str
+    status: str
+    total: int
+    processed: int
+    result: Optional[Any] = None
+    error: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    model_config = ConfigDict(from_attributes=True)
+
+    @field_validator('result', mode='before')
+    def parse_result(cls, value):
+        if isinstance(value, str):
+            return json.loads(value)
+        return value
+
+class MetricsSnapshot(BaseModel):
+    counters: Dict[str, float]
+    gauges: Dict[str, float]
+
+class SyncChange(BaseModel):
+    cursor: int
+    table: str
+    id: int
+    operation: Literal["upsert", "delete"]
+    changed_at: datetime
+    data: Optional[Dict[str, Any]] = None
+
+class SyncBatch(BaseModel):
+    changes: List[SyncChange]
+    next_cursor: int
+    has_more: bool
+
+class AttendanceAnalyticsQuery(BaseModel):
+    group_by: List[Literal[
+        "department", "position", "location", "employee_id", "status", "date", "week", "month", "weekday", "hours_bucket"
+    ]] = Field(default_factory=list, max_length=4)
+    metrics: List[Literal[
+        "records", "employees", "present", "absent", "absence_rate", "late_entries", "late_rate",
+        "early_exits", "early_exit_rate", "worked_hours", "avg_worked_hours"
+    ]] = Field(default_factory=lambda: ["records"], min_length=1)
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    departments: Optional[List[str]] = None
+    positions: Optional[List[str]] = None
+    locations: Optional[List[str]] = None
+    statuses: Optional[List[str]] = None
+    employee_ids: Optional[List[int]] = None
+    # A metric or group_by dimension; groups come in dimension order by default
+    order_by: Optional[str] = None
+    descending: bool = False
+    limit: int = Field(1000, ge=1, le=10000)
+
+class AttendanceAnalyticsResult(BaseModel):
+    rows: List[Dict[str, Any]]
+    total_groups: int
+    snapshot_rows: int
+    refreshed_at: Optional[datetime] = None
+    elapsed_ms: float
+
+class ProfileSummary(BaseModel):
+    id: str
+    method: str
+    path: str
+    tenant: Optional[str] = None
+    status_code: Optional[int] = None
+    duration_ms: float
+    samples: int
+    statements: int
+    created_at: datetime
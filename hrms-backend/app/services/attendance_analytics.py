@@ -0,0 +1,367 @@
+"""In-memory columnar snapshot of attendance for ad-hoc analytics.
+
+Each worker keeps, per tenant, the attendance history (hot table and archives) as NumPy
+columns, with departments, positions and locations of the employees kept in a separate
+per-user table joined through a precomputed row index. String columns are dictionary
+encoded. Group-by / filter queries are answered from these arrays with ``np.unique`` and
+``np.bincount`` and never touch the database.
+
+The snapshot is refreshed incrementally from ``change_log``: every user and attendance row
+logged since the previous refresh is re-read by id, and logged rows that no longer exist
+are dropped. Log ids are handed out in commit order, so unlike an ``updated_at``
+watermark the cursor never skips a slow transaction. A query on a
+stale snapshot is served immediately while a background thread refreshes it; only the
+first query of a tenant waits for the initial load.
+"""
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import contextvars
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+from sqlalchemy import Integer, func, select, type_coerce, union_all
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal, current_tenant
+from ..metrics import metrics
+from .attendance_archive import archive_table
+
+logger = logging.getLogger(__name__)
+
+# Seconds after which a query triggers a background refresh
+ANALYTICS_REFRESH_SECONDS = float(os.getenv("HRMS_ANALYTICS_REFRESH_SECONDS", "30"))
+# Tenant snapshots kept in memory at once; the least recently queried one is dropped first
+MAX_ANALYTICS_SNAPSHOTS = int(os.getenv("HRMS_MAX_ANALYTICS_SNAPSHOTS", "8"))
+
+# Rows fetched from the database per batch
+BATCH_SIZE = 50_000
+
+MINUTES_PER_DAY = 24 * 60
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+class _Vocabulary:
+    """Append-only dictionary encoding of a string column; code 0 is NULL."""
+
+    def __init__(self):
+        self.labels: List[Optional[str]] = [None]
+        self._codes: Dict[Optional[str], int] = {None: 0}
+
+    def encode(self, values) -> np.ndarray:
+        codes = np.empty(len(values), dtype=np.int32)
+        for position, value in enumerate(values):
+            code = self._codes.get(value)
+            if code is None:
+                code = self._codes[value] = len(self.labels)
+                self.labels.append(value)
+            codes[position] = code
+        return codes
+
+    def lookup(self, values: List[str]) -> np.ndarray:
+        """Codes of known labels; unknown labels match nothing."""
+        return np.array([self._codes[value] for value in values if value in self._codes], dtype=np.int32)
+
+def _int_column(values) -> np.ndarray:
+    return np.fromiter((value if value is not None else -1 for value in values), dtype=np.int64, count=len(values))
+
+def _upsert_columns(current: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """Merge ``new`` rows into ``current`` by id; both are sorted by id."""
+    if not len(new["id"]):
+        return current
+    replaced = np.isin(current["id"], new["id"], assume_unique=True)
+    merged = {name: np.concatenate([column[~replaced], new[name]]) for name, column in current.items()}
+    order = np.argsort(merged["id"], kind="stable")
+    return {name: column[order] for name, column in merged.items()}
+
+def _drop_rows(columns: Dict[str, np.ndarray], keep: np.ndarray) -> Dict[str, np.ndarray]:
+    if keep.all():
+        return columns
+    return {name: column[keep] for name, column in columns.items()}
+
+class AttendanceSnapshot:
+    """Columnar copy of one tenant's attendance, swapped atomically on every refresh."""
+
+    def __init__(self, tenant: Optional[str]):
+        self.tenant = tenant
+        self.statuses = _Vocabulary()
+        self.departments = _Vocabulary()
+        self.positions = _Vocabulary()
+        self.locations = _Vocabulary()
+        # Readers take both dicts once and never see a half-applied refresh
+        self.attendance: Optional[Dict[str, np.ndarray]] = None
+        self.users: Optional[Dict[str, np.ndarray]] = None
+        self.refreshed_at: Optional[datetime] = None
+        self._change_cursor = 0
+        self._refreshed_monotonic = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        return time.monotonic() - self._refreshed_monotonic > ANALYTICS_REFRESH_SECONDS
+
+    def refresh(self, db: Session):
+        with self._lock:
+            started = time.perf_counter()
+            cursor = db.query(func.max(models.ChangeLog.id)).scalar() or 0
+            oldest = db.query(func.min(models.ChangeLog.id)).scalar()
+            # Entries after our cursor were purged (or ids restarted): deletes may be missing
+            gap = self._change_cursor and (oldest is None or oldest > self._change_cursor + 1 or cursor < self._change_cursor)
+            full = self.attendance is None or bool(gap)
+
+            if full:
+                users = changed_users = self._load_users(db)
+                attendance = changed_rows = self._load_attendance(db)
+            else:
+                changed_users = self._load_users(db, self._logged(cursor, "users"))
+                changed_rows = self._load_attendance(db, self._logged(cursor, "attendance"))
+                # Logged rows that are gone now were deleted
+                removed_users = np.setdiff1d(self._logged_ids(db, cursor, "users"), changed_users["id"])
+                removed_rows = np.setdiff1d(self._logged_ids(db, cursor, "attendance"), changed_rows["id"])
+
+                users = _drop_rows(self.users, ~np.isin(self.users["id"], removed_users))
+                users = _upsert_columns(users, changed_users)
+                # Without the join column, which is rebuilt below
+                attendance = {name: column for name, column in self.attendance.items() if name != "user_row"}
+                # Deleting a user also removes its archived attendance, which is not logged
+                attendance = _drop_rows(attendance, ~(
+                    np.isin(attendance["id"], removed_rows) | np.isin(attendance["employee_id"], removed_users)
+                ))
+                attendance = _upsert_columns(attendance, changed_rows)
+
+            # Join column: row of each record's employee in the user table, -1 if unknown
+            rows = np.minimum(np.searchsorted(users["id"], attendance["employee_id"]), max(len(users["id"]) - 1, 0))
+            known = (users["id"][rows] == attendance["employee_id"]) if len(users["id"]) else np.zeros(len(rows), dtype=bool)
+            attendance["user_row"] = np.where(known, rows, -1)
+
+            self.users, self.attendance = users, attendance
+            self._change_cursor = cursor
+            self.refreshed_at = datetime.utcnow()
+            self._refreshed_monotonic = time.monotonic()
+
+            mode = "full" if full else "incremental"
+            metrics.increment("analytics_refresh_total", mode=mode)
+            metrics.set_gauge("analytics_snapshot_rows", len(attendance["id"]), tenant=self.tenant or "default")
+            logger.info(
+                f"Refreshed attendance analytics ({mode}): {len(changed_rows['id'])} records, "
+                f"{len(changed_users['id'])} users in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+
+    def _logged(self, cursor: int, table_name: str):
+        """Ids of ``table_name`` rows logged since the previous refresh, as a subquery."""
+        return select(models.ChangeLog.row_id).where(
+            models.ChangeLog.table_name == table_name,
+            models.ChangeLog.id > self._change_cursor,
+            models.ChangeLog.id <= cursor
+        )
+
+    def _logged_ids(self, db: Session, cursor: int, table_name: str) -> np.ndarray:
+        return np.unique(np.array(db.execute(self._logged(cursor, table_name)).scalars().all(), dtype=np.int64))
+
+    def _load_users(self, db: Session, changed=None):
+        query = select(
+            models.User.id, models.User.department, models.User.position, models.User.location
+        ).order_by(models.User.id)
+        if changed is not None:
+            query = query.where(models.User.id.in_(changed))
+        rows = db.execute(query).all()
+        ids, departments, positions, locations = zip(*rows) if rows else ((), (), (), ())
+        columns = {
+            "id": np.array(ids, dtype=np.int64),
+            "department": self.departments.encode(departments),
+            "position": self.positions.encode(positions),
+            "location": self.locations.encode(locations),
+        }
+        return columns
+
+    def _load_attendance(self, db: Session, changed=None):
+        # The hot table plus every archive: a changed row may have been archived since
+        tables = [models.Attendance.__table__] + [archive_table(row.year) for row in db.query(models.AttendanceArchive.year)]
+        parts = []
+        for table in tables:
+            part = select(
+                table.c.id,
+                table.c.employee_id,
+                type_coerce(table.c.date, Integer),
+                type_coerce(table.c.check_in, Integer),
+                type_coerce(table.c.check_out, Integer),
+                table.c.status,
+                table.c.late_entry,
+                table.c.early_exit
+            )
+            if changed is not None:
+                part = part.where(table.c.id.in_(changed))
+            parts.append(part)
+        source = parts[0] if len(parts) == 1 else union_all(*parts)
+
+        batches = []
+        for batch in db.execute(source.execution_options(yield_per=BATCH_SIZE)).partitions():
+            ids, employees, days, check_ins, check_outs, statuses, late, early = zip(*batch)
+            batches.append({
+                "id": np.array(ids, dtype=np.int64),
+                "employee_id": _int_column(employees),
+                "day": _int_column(days).astype(np.int32),
+                "check_in": _int_column(check_ins).astype(np.int16),
+                "check_out": _int_column(check_outs).astype(np.int16),
+                "status": self.statuses.encode(statuses),
+                "late": np.array(late, dtype=bool),
+                "early": np.array(early, dtype=bool),
+            })
+
+        if batches:
+            columns = {name: np.concatenate([batch[name] for batch in batches]) for name in batches[0]}
+        else:
+            columns = {
+                "id": np.zeros(0, dtype=np.int64), "employee_id": np.zeros(0, dtype=np.int64),
+                "day": np.zeros(0, dtype=np.int32), "check_in": np.zeros(0, dtype=np.int16),
+                "check_out": np.zeros(0, dtype=np.int16), "status": np.zeros(0, dtype=np.int32),
+                "late": np.zeros(0, dtype=bool), "early": np.zeros(0, dtype=bool),
+            }
+        order = np.argsort(columns["id"], kind="stable")
+        return {name: column[order] for name, column in columns.items()}
+
+    def query(self, group_by: List[str], metric_names: List[str], start_date: Optional[date] = None,
+              end_date: Optional[date] = None, departments: Optional[List[str]] = None,
+              positions: Optional[List[str]] = None, locations: Optional[List[str]] = None,
+              statuses: Optional[List[str]] = None, employee_ids: Optional[List[int]] = None) -> List[Dict]:
+        """Aggregate ``metric_names`` over the records matching the filters, per group."""
+        attendance, users = self.attendance, self.users
+        user_row = attendance["user_row"]
+
+        def user_column(name: str) -> np.ndarray:
+            # Records of unknown employees get code 0 (NULL)
+            return np.where(user_row >= 0, users[name][np.maximum(user_row, 0)] if len(users["id"]) else 0, 0)
+
+        mask = np.ones(len(attendance["id"]), dtype=bool)
+        if start_date is not None:
+            mask &= attendance["day"] >= (start_date - models.EPOCH).days
+        if end_date is not None:
+            mask &= attendance["day"] <= (end_date - models.EPOCH).days
+        for values, name, vocabulary in (
+            (departments, "department", self.departments),
+            (positions, "position", self.positions),
+            (locations, "location", self.locations),
+        ):
+            if values is not None:
+                mask &= np.isin(user_column(name), vocabulary.lookup(values))
+        if statuses is not None:
+            mask &= np.isin(attendance["status"], self.statuses.lookup(statuses))
+        if employee_ids is not None:
+            mask &= np.isin(attendance["employee_id"], np.array(employee_ids, dtype=np.int64))
+
+        rows = np.flatnonzero(mask)
+        day = attendance["day"][rows].astype(np.int64)
+        check_in = attendance["check_in"][rows].astype(np.int64)
+        check_out = attendance["check_out"][rows].astype(np.int64)
+        closed = (check_in >= 0) & (check_out >= 0)
+        worked_minutes = np.where(closed, (check_out - check_in) % MINUTES_PER_DAY, 0)
+
+        # Integer code and label decoder of every grouping dimension
+        dimensions = {
+            "department": (lambda: user_column("department")[rows], lambda code: self.departments.labels[code]),
+            "position": (lambda: user_column("position")[rows], lambda code: self.positions.labels[code]),
+            "location": (lambda: user_column("location")[rows], lambda code: self.locations.labels[code]),
+            "employee_id": (lambda: attendance["employee_id"][rows], int),
+            "status": (lambda: attendance["status"][rows], lambda code: self.statuses.labels[code]),
+            "date": (lambda: day, lambda code: models.EPOCH + timedelta(days=int(code))),
+            # 1970-01-01 was a Thursday
+            "week": (lambda: day - (day + 3) % 7, lambda code: models.EPOCH + timedelta(days=int(code))),
+            "month": (
+                lambda: day.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64),
+                lambda code: str(np.datetime64(int(code), "M"))
+            ),
+            "weekday": (lambda: (day + 3) % 7, lambda code: WEEKDAYS[code]),
+            "hours_bucket": (
+                lambda: np.where(closed, worked_minutes // 60, -1),
+                lambda code: f"{code}-{code + 1}h" if code >= 0 else None
+            ),
+        }
+
+        if len(rows) == 0:
+            return []
+
+        # Dense group number per row, built up one dimension at a time
+        group = np.zeros(len(rows), dtype=np.int64)
+        codes = []
+        for name in group_by:
+            dimension_codes = dimensions[name][0]()
+            codes.append(dimension_codes)
+            _, dimension_group = np.unique(dimension_codes, return_inverse=True)
+            _, group = np.unique(group * (dimension_group.max() + 1) + dimension_group, return_inverse=True)
+        _, first_rows = np.unique(group, return_index=True)
+        n_groups = len(first_rows)
+
+        records = np.bincount(group, minlength=n_groups)
+        absent_code = self.statuses.lookup(["absent"])
+        absent = np.bincount(group, weights=np.isin(attendance["status"][rows], absent_code), minlength=n_groups)
+        late = np.bincount(group, weights=attendance["late"][rows], minlength=n_groups)
+        early = np.bincount(group, weights=attendance["early"][rows], minlength=n_groups)
+        hours = np.bincount(group, weights=worked_minutes, minlength=n_groups) / 60
+        closed_records = np.bincount(group, weights=closed, minlength=n_groups)
+        values = {
+            "records": records,
+            "present": records - absent,
+            "absent": absent,
+            "absence_rate": absent / records,
+            "late_entries": late,
+            "late_rate": late / records,
+            "early_exits": early,
+            "early_exit_rate": early / records,
+            "worked_hours": hours,
+            "avg_worked_hours": np.divide(hours, closed_records, out=np.zeros(n_groups), where=closed_records > 0),
+        }
+        if "employees" in metric_names:
+            pairs = np.unique(np.stack([group, attendance["employee_id"][rows]]), axis=1)
+            values["employees"] = np.bincount(pairs[0], minlength=n_groups)
+
+        result = []
+        for index in range(n_groups):
+            row = {name: dimensions[name][1](dimension_codes[first_rows[index]]) for name, dimension_codes in zip(group_by, codes)}
+            for name in metric_names:
+                value = values[name][index]
+                row[name] = int(value) if name in ("records", "employees", "present", "absent", "late_entries", "early_exits") else round(float(value), 4)
+            result.append(row)
+        return result
+
+_snapshots: "OrderedDict[Optional[str], AttendanceSnapshot]" = OrderedDict()
+_snapshots_lock = threading.Lock()
+
+def get_snapshot() -> AttendanceSnapshot:
+    """Snapshot of the current tenant, loaded on first use and refreshed in the background."""
+    tenant = current_tenant.get()
+    with _snapshots_lock:
+        snapshot = _snapshots.get(tenant)
+        if snapshot is None:
+            snapshot = _snapshots[tenant] = AttendanceSnapshot(tenant)
+            if len(_snapshots) > MAX_ANALYTICS_SNAPSHOTS:
+                _snapshots.popitem(last=False)
+        else:
+            _snapshots.move_to_end(tenant)
+
+    if snapshot.attendance is None:
+        _refresh(snapshot)
+    elif snapshot.is_stale and not snapshot._lock.locked():
+        # Only the tenant travels to the thread, not the request's budget or profile
+        context = contextvars.Context()
+        context.run(current_tenant.set, tenant)
+        thread = threading.Thread(
+            target=context.run, args=(_refresh, snapshot),
+            name="analytics-refresh", daemon=True
+        )
+        thread.start()
+    return snapshot
+
+def _refresh(snapshot: AttendanceSnapshot):
+    db = SessionLocal()
+    try:
+        snapshot.refresh(db)
+    except Exception as e:
+        logger.error(f"Error refreshing attendance analytics: {str(e)}", exc_info=True)
+        if snapshot.attendance is None:
+            raise
+    finally:
+        db.close()
@@ -0,0 +1,113 @@
+"""Per-year archival of attendance history.
+
+Closed years are moved out of ``attendance`` into ``attendance_archive_<year>`` tables with
+the same columns, registered in ``attendance_archives``. The hot table then only holds the
+recent years, and range reads go through :func:`attendance_source`, which unions in an
+archive table only when the requested range reaches into its year.
+
+Archiving moves rows with connection-level statements, so the change log does not report
+archived rows as deleted.
+"""
+from datetime import date, datetime
+from typing import Dict, List
+import logging
+
+from sqlalchemy import Column, Index, MetaData, Table, delete, insert, select, union_all
+from sqlalchemy.orm import Session
+
+from .. import models
+
+logger = logging.getLogger(__name__)
+
+# Years kept in the hot table: the current year and the previous one, so year-end payroll
+# and corrections still work on hot data
+HOT_YEARS = 2
+
+archive_metadata = MetaData()
+_archive_tables: Dict[int, Table] = {}
+
+def archive_table(year: int) -> Table:
+    """Table object of a year's archive; the table itself is created when archiving."""
+    table = _archive_tables.get(year)
+    if table is None:
+        name = f"attendance_archive_{year}"
+        table = Table(
+            name,
+            archive_metadata,
+            *(Column(column.name, column.type, primary_key=column.primary_key) for column in models.Attendance.__table__.columns),
+            Index(f"ix_{name}_employee_date", "employee_id", "date")
+        )
+        _archive_tables[year] = table
+    return table
+
+def archived_years(db: Session, start_date: date, end_date: date) -> List[int]:
+    return [
+        row.year for row in db.query(models.AttendanceArchive.year).filter(
+            models.AttendanceArchive.year >= start_date.year,
+            models.AttendanceArchive.year <= end_date.year
+        ).order_by(models.AttendanceArchive.year)
+    ]
+
+def attendance_source(db: Session, start_date: date, end_date: date):
+    """Selectable with the attendance columns covering ``start_date`` to ``end_date``.
+
+    This is the hot table itself unless part of the range has been archived, in which case
+    it is a UNION ALL of the hot table and the archives of the affected years, restricted
+    to the range.
+    """
+    years = archived_years(db, start_date, end_date)
+    if not years:
+        return models.Attendance.__table__
+    parts = [
+        select(*table.c).where(table.c.date >= start_date, table.c.date <= end_date)
+        for table in [models.Attendance.__table__] + [archive_table(year) for year in years]
+    ]
+    return union_all(*parts).subquery("attendance")
+
+def archive_year(db: Session, year: int) -> int:
+    """Move one closed year of attendance into its archive table; returns the rows moved.
+
+    Running it again for an archived year moves any rows added since, e.g. late corrections.
+    """
+    if year >= date.today().year:
+        raise ValueError("Only closed years can be archived")
+
+    start_date, end_date = date(year, 1, 1), date(year, 12, 31)
+    hot = models.Attendance.__table__
+    table = archive_table(year)
+    connection = db.connection()
+    table.create(bind=connection, checkfirst=True)
+
+    in_year = (hot.c.date >= start_date) & (hot.c.date <= end_date)
+    moved = connection.execute(
+        insert(table).from_select([column.name for column in hot.c], select(*hot.c).where(in_year))
+    ).rowcount
+    connection.execute(delete(hot).where(in_year))
+
+    registry = db.get(models.AttendanceArchive, year)
+    if registry is None:
+        registry = models.AttendanceArchive(year=year, table_name=table.name, row_count=0)
+        db.add(registry)
+    registry.row_count += moved
+    registry.archived_at = datetime.utcnow()
+    db.commit()
+    logger.info(f"Archived {moved} attendance records of {year} into {table.name}")
+    return moved
+
+def archive_closed_years(db: Session) -> int:
+    """Nightly job: archive every year older than the hot window that still has hot rows."""
+    cutoff = date(date.today().year - HOT_YEARS + 1, 1, 1)
+    oldest = db.query(models.Attendance.date).filter(
+        models.Attendance.date < cutoff
+    ).order_by(models.Attendance.date).first()
+    if oldest is None:
+        return 0
+    return sum(archive_year(db, year) for year in range(oldest.date.year, cutoff.year))
+
+def delete_archived_rows(db: Session, condition_for) -> Dict[str, int]:
+    """Delete archived rows matching ``condition_for(table)`` in every archive table."""
+    deleted = {}
+    for registry in db.query(models.AttendanceArchive).all():
+        table = archive_table(registry.year)
+        deleted[table.name] = db.connection().execute(delete(table).where(condition_for(table))).rowcount
+    return deleted
@@ -0,0 +1,152 @@
+"""In-process LRU caches kept coherent across workers by generation counters.
+
+Every cached entry records the generations of the tables it was built from. A generation
+is a counter per (tenant, table) in a small memory-mapped file shared by all workers on the
+host; a commit that changed a table bumps its counter, and a cached entry whose recorded
+generations no longer match is treated as a miss. Checking costs a few 8-byte reads from
+shared memory, so caches can be consulted on every request.
+
+Writes are noticed through the change-capture hooks of :mod:`.change_log`, which collect
+the tables a transaction changed; the counters are bumped after the commit, so a worker
+can never cache data older than the generation it recorded. Writes that bypass the ORM
+session call :func:`invalidate` after committing.
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Iterable, Optional, Tuple
+import logging
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from ..database import BASE_DIR, current_tenant
+from ..metrics import metrics
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single worker, so a thread lock is enough
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+GENERATIONS_FILE = os.getenv("HRMS_CACHE_GENERATIONS_FILE", os.path.join(BASE_DIR, "cache_generations.bin"))
+# Counter slots; (tenant, table) pairs sharing a slot only cause extra misses
+GENERATION_SLOTS = 4096
+
+# Session.info key of the tables changed in the current transaction
+CHANGED_TABLES = "changed_tables"
+
+_COUNTER = struct.Struct("<Q")
+
+class GenerationCounters:
+    """Per-table counters in a memory-mapped file shared by the workers of one host."""
+
+    def __init__(self, path: str = GENERATIONS_FILE, slots: int = GENERATION_SLOTS):
+        self.path = path
+        self.slots = slots
+        self._map: Optional[mmap.mmap] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def _mapping(self) -> mmap.mmap:
+        if self._map is None:
+            with self._lock:
+                if self._map is None:
+                    size = self.slots * _COUNTER.size
+                    self._file = open(self.path, "a+b")
+                    if os.fstat(self._file.fileno()).st_size < size:
+                        self._file.truncate(size)
+                    self._map = mmap.mmap(self._file.fileno(), size)
+        return self._map
+
+    def _offset(self, tenant: Optional[str], table: str) -> int:
+        # crc32 rather than hash(): every worker process must pick the same slot
+        return zlib.crc32(f"{tenant or ''}:{table}".encode()) % self.slots * _COUNTER.size
+
+    def current(self, tables: Iterable[str], tenant: Optional[str] = None) -> Tuple[int, ...]:
+        mapping = self._mapping()
+        return tuple(_COUNTER.unpack_from(mapping, self._offset(tenant, table))[0] for table in tables)
+
+    def bump(self, tables: Iterable[str], tenant: Optional[str] = None):
+        mapping = self._mapping()
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            try:
+                for table in set(tables):
+                    offset = self._offset(tenant, table)
+                    _COUNTER.pack_into(mapping, offset, _COUNTER.unpack_from(mapping, offset)[0] + 1)
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+
+generations = GenerationCounters()
+
+class GenerationalCache:
+    """Bounded LRU whose entries expire when one of ``tables`` changes in any worker.
+
+    Values are shared between requests and must not be mutated by callers.
+    """
+
+    def __init__(self, name: str, tables: Tuple[str, ...], max_entries: int = 1024):
+        self.name = name
+        self.tables = tables
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Tuple[int, ...], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        tenant = current_tenant.get()
+        key = (tenant, key)
+        current = generations.current(self.tables, tenant)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == current:
+                self._entries.move_to_end(key)
+                metrics.increment("cache_requests_total", cache=self.name, outcome="hit")
+                return entry[1]
+
+        metrics.increment("cache_requests_total", cache=self.name, outcome="stale" if entry is not None else "miss")
+        # Generations are read before loading: a change committed meanwhile makes the entry stale
+        value = loader()
+        with self._lock:
+            self._entries[key] = (current, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.increment("cache_evictions_total", cache=self.name)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def mark_changed(session: Session, table_name: str):
+    """Remember that the session's transaction changed ``table_name``."""
+    session.info.setdefault(CHANGED_TABLES, set()).add(table_name)
+
+def invalidate(*tables: str):
+    """Expire cached data of ``tables`` in every worker, for writes made outside a session."""
+    generations.bump(tables, current_tenant.get())
+
+def _bump_committed(session: Session):
+    tables = session.info.pop(CHANGED_TABLES, None)
+    if tables:
+        try:
+            generations.bump(tables, current_tenant.get())
+        except OSError as e:
+            # Never fail a committed transaction; other workers may serve stale entries
+            logger.error(f"Could not bump cache generations of {sorted(tables)}: {str(e)}")
+
+def _discard_changes(session: Session):
+    session.info.pop(CHANGED_TABLES, None)
+
+def register_cache_invalidation():
+    """Bump generations after commits; safe to call more than once."""
+    if not event.contains(Session, "after_commit", _bump_committed):
+        event.listen(Session, "after_commit", _bump_committed)
+        event.listen(Session, "after_rollback", _discard_changes)
@@ -0,0 +1,126 @@
+"""Change-data capture into the ``change_log`` outbox.
+
+Every insert, update and delete of a synced table appends ``(table, row id, operation)``
+to ``change_log`` in the same transaction as the change itself, so the log can never
+disagree with the data. Two session hooks cover the whole code base:
+
+* ``after_flush`` records ORM unit-of-work changes;
+* ``do_orm_execute`` records set-based statements: for UPDATE and DELETE the ids matching
+  the statement's WHERE clause are copied into the log with one ``INSERT ... SELECT``
+  before it runs, and for INSERT the ids above the previous maximum are copied after it.
+
+Statements the hooks cannot see through (executemany UPDATEs and upserts that update
+existing rows) call :func:`record_changes` explicitly. Every changed table is also marked
+on the session, so :mod:`.cache` can expire cached data once the transaction commits.
+"""
+from datetime import datetime, timedelta
+import logging
+
+from sqlalchemy import delete, event, func, insert, literal, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .cache import mark_changed
+
+logger = logging.getLogger(__name__)
+
+# Tables exposed through the sync API
+SYNC_MODELS = {
+    "users": models.User,
+    "attendance": models.Attendance,
+    "leave_requests": models.LeaveRequest,
+    "leave_balance": models.LeaveBalance,
+    "assets": models.Asset,
+    "holidays": models.Holiday,
+    "policies": models.Policy,
+}
+
+# Columns never sent to sync consumers
+EXCLUDED_COLUMNS = {"hashed_password"}
+
+# Consumers have to sync at least this often; older entries are purged
+CHANGE_LOG_RETENTION_DAYS = 30
+
+_CHANGE_COLUMNS = ["table_name", "row_id", "operation", "changed_at"]
+
+def record_changes(db: Session, model, condition, operation: str) -> int:
+    """Log ``operation`` for every row of ``model`` matching ``condition``."""
+    table = model.__table__
+    mark_changed(db, table.name)
+    rows = select(
+        literal(table.name),
+        table.c.id,
+        literal(operation),
+        literal(datetime.utcnow(), models.ChangeLog.changed_at.type)
+    ).where(condition)
+    return db.connection().execute(
+        insert(models.ChangeLog.__table__).from_select(_CHANGE_COLUMNS, rows)
+    ).rowcount
+
+def _capture_flush(session: Session, flush_context):
+    now = datetime.utcnow()
+    changes = []
+    for operation, objects in (("insert", session.new), ("update", session.dirty), ("delete", session.deleted)):
+        for obj in objects:
+            table_name = getattr(obj, "__tablename__", None)
+            if table_name not in SYNC_MODELS:
+                continue
+            if operation == "update" and not session.is_modified(obj, include_collections=False):
+                continue
+            mark_changed(session, table_name)
+            changes.append({"table_name": table_name, "row_id": obj.id, "operation": operation, "changed_at": now})
+    if changes:
+        session.connection().execute(insert(models.ChangeLog.__table__), changes)
+
+def _capture_statement(state):
+    if not (state.is_insert or state.is_update or state.is_delete):
+        return None
+    table = getattr(state.statement, "table", None)
+    if table is None or table.name not in SYNC_MODELS:
+        return None
+    model = SYNC_MODELS[table.name]
+    session = state.session
+    mark_changed(session, table.name)
+
+    if state.is_insert:
+        previous_max = session.connection().execute(select(func.max(table.c.id))).scalar() or 0
+        result = state.invoke_statement()
+        if len(state.statement.exported_columns):
+            # Buffer RETURNING rows before the connection runs the next statement
+            frozen = result.freeze()
+            record_changes(session, model, table.c.id > previous_max, "insert")
+            return frozen()
+        getattr(result, "rowcount", None)  # memoized, so it survives the next statement
+        record_changes(session, model, table.c.id > previous_max, "insert")
+        return result
+
+    if state.is_executemany:
+        # Per-row parameters cannot be replayed into one INSERT ... SELECT; callers record these
+        return None
+    condition = state.statement.whereclause
+    rows = select(
+        literal(table.name),
+        table.c.id,
+        literal("update" if state.is_update else "delete"),
+        literal(datetime.utcnow(), models.ChangeLog.changed_at.type)
+    )
+    if condition is not None:
+        rows = rows.where(condition)
+    session.connection().execute(
+        insert(models.ChangeLog.__table__).from_select(_CHANGE_COLUMNS, rows),
+        state.parameters or {}
+    )
+    return None
+
+def register_change_capture():
+    """Install the session hooks; safe to call more than once."""
+    if not event.contains(Session, "after_flush", _capture_flush):
+        event.listen(Session, "after_flush", _capture_flush)
+        event.listen(Session, "do_orm_execute", _capture_statement)
+
+def purge_change_log(db: Session) -> int:
+    """Scheduled job: drop entries older than the retention window."""
+    cutoff = datetime.utcnow() - timedelta(days=CHANGE_LOG_RETENTION_DAYS)
+    result = db.execute(delete(models.ChangeLog).where(models.ChangeLog.changed_at < cutoff))
+    db.commit()
+    return result.rowcount
@@ -0,0 +1,58 @@
+"""Year-end leave accrual and carry-over.
+
+Each balance is rolled over with one set-based UPDATE per chunk: the unused days of every
+leave type are capped at its carry-over limit and the yearly grant is added on top. Rows
+record the year they were accrued for, so running the same year again touches nothing and
+an interrupted run simply picks up the rows that are left.
+"""
+from datetime import date, datetime
+from typing import Dict, Optional
+import logging
+
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.orm import Session
+
+from .. import models
+from .nightly_jobs import update_in_chunks
+
+logger = logging.getLogger(__name__)
+
+# Days granted per year and the most unused days carried into the next year, per leave type
+DEFAULT_ACCRUAL_POLICY = {
+    "annual_leave": {"accrual": 20.0, "carry_over": 5.0},
+    "sick_leave": {"accrual": 10.0, "carry_over": 0.0},
+    "casual_leave": {"accrual": 10.0, "carry_over": 0.0}
+}
+
+def accrue_leave(db: Session, year: int, policy: Optional[Dict[str, Dict[str, float]]] = None) -> int:
+    """Roll every leave balance of an active employee not yet accrued for ``year`` over into it.
+
+    ``policy`` overrides the accrual and carry-over caps of individual leave types. Returns
+    the number of balances updated.
+    """
+    rules = {leave_type: dict(rule) for leave_type, rule in DEFAULT_ACCRUAL_POLICY.items()}
+    for leave_type, rule in (policy or {}).items():
+        rules[leave_type].update({key: value for key, value in rule.items() if value is not None})
+
+    values = {"accrual_year": year, "updated_at": datetime.utcnow()}
+    for leave_type, rule in rules.items():
+        remaining = func.coalesce(getattr(models.LeaveBalance, leave_type), 0)
+        carried = case((remaining > rule["carry_over"], rule["carry_over"]), else_=remaining)
+        values[leave_type] = carried + rule["accrual"]
+
+    active_employees = select(models.User.id).where(models.User.archived_at.is_(None))
+    updated = update_in_chunks(
+        db,
+        models.LeaveBalance,
+        and_(
+            or_(models.LeaveBalance.accrual_year.is_(None), models.LeaveBalance.accrual_year < year),
+            models.LeaveBalance.employee_id.in_(active_employees)
+        ),
+        values
+    )
+    logger.info(f"Accrued {year} leave for {updated} balances")
+    return updated
+
+def accrue_current_year(db: Session) -> int:
+    """Nightly job: a no-op except on the first run of a new year."""
+    return accrue_leave(db, date.today().year)
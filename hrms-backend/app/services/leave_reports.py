@@ -0,0 +1,296 @@
+"""Leave utilization reports built in a background thread and reused while data is unchanged.
+
+A report is a :class:`models.BackgroundJob` of kind ``leave_utilization``. Its
+``params_hash`` covers the parameters and the data version, i.e. the latest ``change_log``
+entry of each table the report reads, so submitting the same parameters again returns
+the existing job until a leave request, balance or user changes.
+
+Aggregation is set-based: leave requests overlapping the year are grouped in SQL by
+(department, location, type, start, end), and business days per month are counted for
+those groups with one vectorized call per month and calendar.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+import contextvars
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import threading
+import uuid
+
+import numpy as np
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal, current_tenant
+from .business_days import count_business_days_bulk
+
+logger = logging.getLogger(__name__)
+
+REPORT_KIND = "leave_utilization"
+REPORT_WORKERS = int(os.getenv("HRMS_REPORT_WORKERS", "2"))
+
+# Tables whose changes invalidate a finished report; holidays change business-day counts
+REPORT_TABLES = ("leave_requests", "leave_balance", "users", "holidays")
+
+# A queued or running report not updated for this long was lost with its worker
+STALE_REPORT_SECONDS = int(os.getenv("HRMS_STALE_REPORT_SECONDS", "900"))
+
+# Remaining-balance column of each leave type
+BALANCE_COLUMNS = {
+    "annual": models.LeaveBalance.annual_leave,
+    "sick": models.LeaveBalance.sick_leave,
+    "casual": models.LeaveBalance.casual_leave,
+}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix="report")
+        return _executor
+
+def shutdown_report_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+def data_version(db: Session) -> Dict[str, int]:
+    """Latest change_log id of every table the report reads."""
+    return {
+        table_name: db.query(func.max(models.ChangeLog.id)).filter(models.ChangeLog.table_name == table_name).scalar() or 0
+        for table_name in REPORT_TABLES
+    }
+
+def report_hash(params: dict, version: Dict[str, int]) -> str:
+    document = json.dumps({"kind": REPORT_KIND, "params": params, "version": version}, sort_keys=True)
+    return hashlib.sha256(document.encode()).hexdigest()
+
+def submit_report(db: Session, params: dict, user_id: int) -> Tuple[models.BackgroundJob, bool]:
+    """Queue a report, or return the job already built for the same parameters and data.
+
+    Returns the job and whether it was reused. Unfinished jobs are only reused while their
+    worker is still updating them.
+    """
+    params_hash = report_hash(params, data_version(db))
+    stale_before = datetime.utcnow() - timedelta(seconds=STALE_REPORT_SECONDS)
+    existing = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.kind == REPORT_KIND,
+        models.BackgroundJob.params_hash == params_hash,
+        or_(
+            models.BackgroundJob.status == "completed",
+            and_(
+                models.BackgroundJob.status.in_(("queued", "running")),
+                models.BackgroundJob.updated_at >= stale_before
+            )
+        )
+    ).order_by(models.BackgroundJob.created_at.desc()).first()
+    if existing is not None:
+        return existing, True
+
+    now = datetime.utcnow()
+    job = models.BackgroundJob(
+        id=uuid.uuid4().hex,
+        kind=REPORT_KIND,
+        status="queued",
+        total=0,
+        processed=0,
+        params_hash=params_hash,
+        created_by=user_id,
+        created_at=now,
+        updated_at=now
+    )
+    db.add(job)
+    db.commit()
+
+    # Only the tenant travels to the worker thread, not the request's budget or profile
+    context = contextvars.Context()
+    context.run(current_tenant.set, current_tenant.get())
+    _get_executor().submit(context.run, _run_report, job.id, params)
+    logger.info(f"Queued leave utilization report {job.id}")
+    return job, False
+
+def _run_report(job_id: str, params: dict):
+    db = SessionLocal()
+    try:
+        job = db.get(models.BackgroundJob, job_id)
+        if job is None or job.status != "queued":
+            # Given up on as stale while it waited in the queue
+            return
+        job.status = "running"
+        db.commit()
+
+        def progress(processed: int, total: int):
+            job.processed, job.total = processed, total
+            db.commit()
+
+        result = build_utilization_report(db, progress=progress, **params)
+        job.result = json.dumps(result)
+        job.status = "completed"
+        db.commit()
+        logger.info(f"Completed leave utilization report {job_id}")
+    except Exception as e:
+        logger.error(f"Leave utilization report {job_id} failed: {str(e)}", exc_info=True)
+        db.rollback()
+        job = db.get(models.BackgroundJob, job_id)
+        if job is not None:
+            job.status = "failed"
+            job.error = str(e)
+            db.commit()
+    finally:
+        db.close()
+
+def fail_stale_reports(db: Session) -> int:
+    """Fail queued or running reports whose worker stopped, e.g. on a restart.
+
+    Runs at startup and as a scheduled job; jobs of live workers are updated more often
+    than ``STALE_REPORT_SECONDS`` and are left alone.
+    """
+    now = datetime.utcnow()
+    failed = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.kind == REPORT_KIND,
+        models.BackgroundJob.status.in_(("queued", "running")),
+        models.BackgroundJob.updated_at < now - timedelta(seconds=STALE_REPORT_SECONDS)
+    ).update(
+        {"status": "failed", "error": "Report was interrupted; request it again", "updated_at": now},
+        synchronize_session=False
+    )
+    db.commit()
+    if failed:
+        logger.warning(f"Failed {failed} interrupted leave utilization reports")
+    return failed
+
+def build_utilization_report(
+    db: Session,
+    year: int,
+    departments: Optional[List[str]] = None,
+    leave_types: Optional[List[str]] = None,
+    statuses: Optional[List[str]] = None,
+    progress=None
+) -> dict:
+    """Leave days per department, type and month of ``year``, and utilization of balances.
+
+    A request's days are the business days of its range falling in each month, per the
+    employee's department and location calendar. Utilization is the days taken over the
+    days taken plus the remaining balance of the department's employees.
+    """
+    year_start, year_end = date(year, 1, 1), date(year, 12, 31)
+    statuses = statuses or ["approved"]
+    leave_type = func.lower(models.LeaveRequest.leave_type)
+
+    query = db.query(
+        models.User.department,
+        models.User.location,
+        leave_type.label("leave_type"),
+        models.LeaveRequest.start_date,
+        models.LeaveRequest.end_date,
+        func.count(models.LeaveRequest.id).label("requests")
+    ).join(
+        models.User, models.User.id == models.LeaveRequest.employee_id
+    ).filter(
+        models.LeaveRequest.start_date <= year_end,
+        models.LeaveRequest.end_date >= year_start,
+        models.LeaveRequest.status.in_(statuses)
+    )
+    if departments:
+        query = query.filter(models.User.department.in_(departments))
+    if leave_types:
+        query = query.filter(leave_type.in_([value.lower() for value in leave_types]))
+    groups = query.group_by(
+        models.User.department, models.User.location, leave_type,
+        models.LeaveRequest.start_date, models.LeaveRequest.end_date
+    ).all()
+
+    total_steps = 13
+    starts = np.array([group.start_date for group in groups], dtype="datetime64[D]")
+    ends = np.array([group.end_date for group in groups], dtype="datetime64[D]")
+    requests = np.array([group.requests for group in groups], dtype=np.int64)
+    group_departments = [group.department for group in groups]
+    group_locations = [group.location for group in groups]
+
+    # Aggregation keys: (department, leave type) per group
+    keys = sorted({(group.department, group.leave_type) for group in groups}, key=lambda key: (key[0] or "", key[1] or ""))
+    key_index = {key: position for position, key in enumerate(keys)}
+    group_keys = np.array([key_index[(group.department, group.leave_type)] for group in groups], dtype=np.int64)
+
+    monthly = []
+    days_by_key = np.zeros(len(keys))
+    for month in range(1, 13):
+        month_start = np.datetime64(date(year, month, 1), "D")
+        month_end = (np.datetime64(f"{year}-{month:02d}", "M") + 1).astype("datetime64[D]") - 1
+        clipped_starts = np.maximum(starts, month_start)
+        clipped_ends = np.minimum(ends, month_end)
+        days = count_business_days_bulk(db, clipped_starts, clipped_ends, group_departments, group_locations) * requests
+        in_month = (clipped_starts <= clipped_ends) & (days > 0)
+        month_days = np.bincount(group_keys, weights=days, minlength=len(keys))
+        month_requests = np.bincount(group_keys[in_month], weights=requests[in_month], minlength=len(keys))
+        days_by_key += month_days
+        for position, (department, type_name) in enumerate(keys):
+            if month_requests[position]:
+                monthly.append({
+                    "department": department,
+                    "leave_type": type_name,
+                    "month": f"{year}-{month:02d}",
+                    "requests": int(month_requests[position]),
+                    "days": int(month_days[position])
+                })
+        if progress:
+            progress(month, total_steps)
+
+    # Remaining balances per department, one grouped query
+    balance_query = db.query(
+        models.User.department,
+        *(func.coalesce(func.sum(column), 0).label(name) for name, column in BALANCE_COLUMNS.items())
+    ).join(
+        models.User, models.User.id == models.LeaveBalance.employee_id
+    )
+    if departments:
+        balance_query = balance_query.filter(models.User.department.in_(departments))
+    balances = {row.department: row for row in balance_query.group_by(models.User.department)}
+
+    utilization = []
+    for position, (department, type_name) in enumerate(keys):
+        balance = balances.get(department)
+        remaining = float(getattr(balance, type_name)) if balance is not None and type_name in BALANCE_COLUMNS else None
+        taken = float(days_by_key[position])
+        utilization.append({
+            "department": department,
+            "leave_type": type_name,
+            "days_taken": taken,
+            "balance_remaining": remaining,
+            "utilization": round(taken / (taken + remaining), 4) if remaining is not None and taken + remaining > 0 else None
+        })
+    if progress:
+        progress(total_steps, total_steps)
+
+    return {
+        "year": year,
+        "statuses": statuses,
+        "generated_at": datetime.utcnow().isoformat(),
+        "monthly": monthly,
+        "utilization": utilization
+    }
+
+def report_csv(result: dict) -> str:
+    """The monthly rows of a report as CSV, joined with the department utilization."""
+    utilization = {(row["department"], row["leave_type"]): row for row in result["utilization"]}
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(["department", "leave_type", "month", "requests", "days", "days_taken", "balance_remaining", "utilization"])
+    for row in result["monthly"]:
+        totals = utilization.get((row["department"], row["leave_type"]), {})
+        writer.writerow([
+            row["department"], row["leave_type"], row["month"], row["requests"], row["days"],
+            totals.get("days_taken"), totals.get("balance_remaining"), totals.get("utilization")
+        ])
+    return output.getvalue()
@@ -0,0 +1,136 @@
+"""Nightly maintenance jobs run by the in-process scheduler.
+
+Each job is a set-based UPDATE or INSERT ... SELECT executed in chunks, committing after
+every chunk so the SQLite write lock is only held briefly.
+"""
+from datetime import date, datetime, time, timedelta
+import logging
+
+import numpy as np
+from sqlalchemy import and_, exists, false, func, insert, literal, or_, select, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .attendance_archive import archive_closed_years
+from .business_days import WEEKMASK
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+
+# Open records are closed once they are this many days old, leaving room for
+# overnight shifts that check out the next morning
+AUTO_CLOSE_AFTER_DAYS = 2
+
+NIGHTLY_RUN_AT = time(1, 0)
+
+def update_in_chunks(db: Session, model, condition, values) -> int:
+    """Apply ``values`` to rows matching ``condition``, at most CHUNK_SIZE rows per statement."""
+    total = 0
+    while True:
+        chunk = select(model.id).where(condition).limit(CHUNK_SIZE)
+        result = db.execute(
+            update(model).where(model.id.in_(chunk)).values(**values).execution_options(synchronize_session=False)
+        )
+        db.commit()
+        total += result.rowcount
+        if result.rowcount < CHUNK_SIZE:
+            return total
+
+def close_stale_attendance(db: Session) -> int:
+    """Close check-ins that never got a check-out with a zero-length, ``auto_closed`` record."""
+    cutoff = date.today() - timedelta(days=AUTO_CLOSE_AFTER_DAYS)
+    return update_in_chunks(
+        db,
+        models.Attendance,
+        and_(
+            models.Attendance.date <= cutoff,
+            models.Attendance.check_in.isnot(None),
+            models.Attendance.check_out.is_(None)
+        ),
+        {
+            "check_out": models.Attendance.check_in,
+            "status": "auto_closed",
+            "updated_at": datetime.utcnow()
+        }
+    )
+
+def mark_absentees(db: Session, day: date = None) -> int:
+    """Insert ``absent`` rows for employees with no attendance on a working day.
+
+    Defaults to yesterday. Weekends, holidays of the employee's calendar, approved leave
+    and days before the hire date are skipped, as are archived employees.
+    """
+    day = day or date.today() - timedelta(days=1)
+    if not np.is_busday(np.datetime64(day, "D"), weekmask=WEEKMASK):
+        return 0
+
+    now = datetime.utcnow()
+    has_attendance = exists().where(
+        models.Attendance.employee_id == models.User.id,
+        models.Attendance.date == day
+    )
+    on_leave = exists().where(
+        models.LeaveRequest.employee_id == models.User.id,
+        models.LeaveRequest.status == "approved",
+        models.LeaveRequest.start_date <= day,
+        models.LeaveRequest.end_date >= day
+    )
+    on_holiday = exists().where(
+        models.Holiday.date == day,
+        or_(models.Holiday.department.is_(None), models.Holiday.department == models.User.department),
+        or_(models.Holiday.location.is_(None), models.Holiday.location == models.User.location)
+    )
+
+    max_user_id = db.query(func.max(models.User.id)).scalar() or 0
+    total = 0
+    for first_id in range(1, max_user_id + 1, CHUNK_SIZE):
+        absentees = select(
+            models.User.id,
+            literal(day, models.Attendance.date.type),
+            literal("absent"),
+            false(),
+            false(),
+            literal(now, models.Attendance.created_at.type),
+            literal(now, models.Attendance.updated_at.type)
+        ).where(
+            models.User.id.between(first_id, first_id + CHUNK_SIZE - 1),
+            models.User.archived_at.is_(None),
+            or_(models.User.hire_date.is_(None), models.User.hire_date <= day),
+            ~has_attendance,
+            ~on_leave,
+            ~on_holiday
+        )
+        result = db.execute(
+            insert(models.Attendance).from_select(
+                ["employee_id", "date", "status", "late_entry", "early_exit", "created_at", "updated_at"],
+                absentees
+            )
+        )
+        db.commit()
+        total += result.rowcount
+    return total
+
+def flag_due_assets(db: Session) -> int:
+    """Flag assets whose warranty has expired or whose scheduled maintenance has passed."""
+    today = date.today()
+    now = datetime.utcnow()
+    warranty = update_in_chunks(
+        db,
+        models.Asset,
+        and_(models.Asset.warranty_expiry < today, models.Asset.warranty_expired.isnot(True)),
+        {"warranty_expired": True, "updated_at": now}
+    )
+    maintenance = update_in_chunks(
+        db,
+        models.Asset,
+        and_(models.Asset.maintenance_schedule < today, models.Asset.maintenance_overdue.isnot(True)),
+        {"maintenance_overdue": True, "updated_at": now}
+    )
+    return warranty + maintenance
+
+def register_nightly_jobs(scheduler):
+    scheduler.add_job("close_stale_attendance", close_stale_attendance, run_at=NIGHTLY_RUN_AT)
+    scheduler.add_job("mark_absentees", mark_absentees, run_at=NIGHTLY_RUN_AT)
+    scheduler.add_job("flag_due_assets", flag_due_assets, run_at=NIGHTLY_RUN_AT)
+    scheduler.add_job("archive_attendance", archive_closed_years, run_at=NIGHTLY_RUN_AT)
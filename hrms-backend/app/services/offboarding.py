@@ -0,0 +1,80 @@
+"""Set-based offboarding of users and their dependent rows.
+
+Every statement is a DELETE / UPDATE over a chunk of user ids, so memory use does not
+depend on how much attendance or leave history the users have. The caller owns the
+transaction and commits once for the whole batch.
+"""
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List
+import logging
+
+from sqlalchemy import delete, update
+from sqlalchemy.orm import Session
+
+from .. import models
+from .attendance_archive import delete_archived_rows
+
+logger = logging.getLogger(__name__)
+
+# User ids per IN (...) list, well below SQLite's bound-parameter limit
+CHUNK_SIZE = 500
+
+# Rows removed together with a user in delete mode, as (label, model, owning column)
+DEPENDENT_ROWS = (
+    ("attendance", models.Attendance, models.Attendance.employee_id),
+    ("leave_requests", models.LeaveRequest, models.LeaveRequest.employee_id),
+    ("leave_balance", models.LeaveBalance, models.LeaveBalance.employee_id),
+    ("payroll_metrics", models.PayrollPeriodMetric, models.PayrollPeriodMetric.employee_id),
+    ("assets", models.Asset, models.Asset.user_id),
+    ("policies", models.Policy, models.Policy.created_by),
+)
+
+def _execute(db: Session, statement) -> int:
+    return db.execute(statement.execution_options(synchronize_session=False)).rowcount
+
+def offboard_users(db: Session, user_ids: List[int], mode: str, custodian_id: int) -> Dict:
+    """Archive or delete users in bulk.
+
+    Assets still assigned to the users are handed back to ``custodian_id``, because
+    ``assets.assigned_to`` cannot be NULL. ``archive`` keeps all history and only marks the
+    users as archived; ``delete`` removes the users and every dependent row.
+    """
+    now = datetime.utcnow()
+    deleted = defaultdict(int)
+    offboarded, assets_returned, found = 0, 0, set()
+    user_ids = sorted(set(user_ids))
+
+    for start in range(0, len(user_ids), CHUNK_SIZE):
+        chunk = user_ids[start:start + CHUNK_SIZE]
+        found.update(row.id for row in db.query(models.User.id).filter(models.User.id.in_(chunk)))
+
+        if mode == "delete":
+            for label, model, column in DEPENDENT_ROWS:
+                deleted[label] += _execute(db, delete(model).where(column.in_(chunk)))
+            archived = delete_archived_rows(db, lambda table: table.c.employee_id.in_(chunk))
+            deleted["attendance_archive"] += sum(archived.values())
+            _execute(db, update(models.BackgroundJob).where(
+                models.BackgroundJob.created_by.in_(chunk)
+            ).values(created_by=None))
+
+        assets_returned += _execute(db, update(models.Asset).where(
+            models.Asset.assigned_to.in_(chunk)
+        ).values(assigned_to=custodian_id, updated_at=now))
+
+        if mode == "delete":
+            offboarded += _execute(db, delete(models.User).where(models.User.id.in_(chunk)))
+        else:
+            offboarded += _execute(db, update(models.User).where(
+                models.User.id.in_(chunk),
+                models.User.archived_at.is_(None)
+            ).values(archived_at=now, updated_at=now))
+
+    logger.info(f"Offboarded {offboarded} users in {mode} mode")
+    return {
+        "mode": mode,
+        "users": offboarded,
+        "not_found": [user_id for user_id in user_ids if user_id not in found],
+        "assets_returned": assets_returned,
+        "deleted": dict(deleted)
+    }
@@ -0,0 +1,177 @@
+"""Per-employee attendance metrics for a pay period.
+
+Attendance rows for the period are streamed in column batches and folded into dense
+NumPy arrays indexed by (employee, day), so the cost is a handful of vectorized
+operations per batch rather than Python arithmetic per row. Results are persisted per
+period and served from ``payroll_period_metrics`` on later reads.
+"""
+from datetime import date, datetime, timedelta
+from typing import Optional
+import logging
+
+import numpy as np
+from sqlalchemy import Integer, insert, select, type_coerce
+from sqlalchemy.orm import Session
+
+from .. import models
+from .attendance_archive import attendance_source
+from .business_days import get_calendar
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched from the attendance table per batch
+BATCH_SIZE = 50_000
+
+STANDARD_DAY_HOURS = 8.0
+
+MINUTES_PER_DAY = 24 * 60
+
+def _int_column(values) -> np.ndarray:
+    """Integer column as an array, -1 where the value is missing."""
+    return np.fromiter(
+        (value if value is not None else -1 for value in values),
+        dtype=np.int64,
+        count=len(values)
+    )
+
+def compute_period(db: Session, start_date: date, end_date: date, standard_hours: float = STANDARD_DAY_HOURS) -> models.PayrollPeriod:
+    """Compute and persist attendance metrics for every employee over a period.
+
+    Worked time is ``(check_out - check_in) mod 24h`` so shifts crossing midnight count
+    correctly. Overtime is the time worked beyond ``standard_hours`` on each day. Absent
+    days are business days (per the employee's holiday calendar, from the hire date and
+    up to today, excluding approved leave) with no attendance other than an ``absent`` mark.
+    Archived employees are left out.
+    """
+    users = db.query(
+        models.User.id, models.User.department, models.User.location, models.User.hire_date
+    ).filter(models.User.archived_at.is_(None)).order_by(models.User.id).all()
+    user_ids = np.array([user.id for user in users], dtype=np.int64)
+    n_users = len(users)
+    n_days = (end_date - start_date).days + 1
+    period_start = np.datetime64(start_date, "D")
+    first_day_number = (start_date - models.EPOCH).days
+
+    day_minutes = np.zeros(n_users * n_days, dtype=np.float64)
+    present = np.zeros(n_users * n_days, dtype=bool)
+    late_entries = np.zeros(n_users, dtype=np.int64)
+    early_exits = np.zeros(n_users, dtype=np.int64)
+
+    source = attendance_source(db, start_date, end_date)
+    result = db.execute(
+        select(
+            source.c.employee_id,
+            # Raw day numbers and minutes of the day, skipping date/time conversion
+            type_coerce(source.c.date, Integer),
+            type_coerce(source.c.check_in, Integer),
+            type_coerce(source.c.check_out, Integer),
+            source.c.status,
+            source.c.late_entry,
+            source.c.early_exit
+        ).where(
+            source.c.date >= start_date,
+            source.c.date <= end_date
+        ).execution_options(yield_per=BATCH_SIZE)
+    )
+    for batch in result.partitions():
+        employee_col, date_col, check_in_col, check_out_col, status_col, late_col, early_col = zip(*batch)
+
+        employee_ids = np.array(employee_col, dtype=np.int64)
+        positions = np.minimum(np.searchsorted(user_ids, employee_ids), max(n_users - 1, 0))
+        known = (user_ids[positions] == employee_ids) if n_users else np.zeros(len(batch), dtype=bool)
+        offsets = np.array(date_col, dtype=np.int64) - first_day_number
+        keys = positions * n_days + offsets
+
+        check_in = _int_column(check_in_col)
+        check_out = _int_column(check_out_col)
+        closed = (check_in >= 0) & (check_out >= 0)
+        worked = np.where(closed, (check_out - check_in) % MINUTES_PER_DAY, 0)
+        attended = known & (np.array(status_col, dtype=object) != "absent")
+
+        day_minutes += np.bincount(keys[known], weights=worked[known], minlength=n_users * n_days)
+        present |= np.bincount(keys[attended], minlength=n_users * n_days) > 0
+        late_entries += np.bincount(positions[known & np.array(late_col, dtype=bool)], minlength=n_users)
+        early_exits += np.bincount(positions[known & np.array(early_col, dtype=bool)], minlength=n_users)
+
+    day_hours = day_minutes.reshape(n_users, n_days) / 60
+    present = present.reshape(n_users, n_days)
+
+    # Business days each employee was expected to attend
+    days = period_start + np.arange(n_days)
+    day_masks = {}
+    expected = np.zeros((n_users, n_days), dtype=bool)
+    last_expected_offset = min(n_days - 1, (date.today() - start_date).days)
+    for row, user in enumerate(users):
+        scope = (user.department, user.location)
+        if scope not in day_masks:
+            day_masks[scope] = np.is_busday(days, busdaycal=get_calendar(db, *scope))
+        first_offset = max(0, (user.hire_date - start_date).days) if user.hire_date else 0
+        if first_offset <= last_expected_offset:
+            expected[row, first_offset:last_expected_offset + 1] = day_masks[scope][first_offset:last_expected_offset + 1]
+
+    # Approved leave is neither expected attendance nor an absence
+    expected &= ~_leave_mask(db, user_ids, start_date, n_days)
+
+    worked_hours = day_hours.sum(axis=1)
+    overtime_hours = np.clip(day_hours - standard_hours, 0, None).sum(axis=1)
+    days_present = present.sum(axis=1)
+    expected_days = expected.sum(axis=1)
+    absent_days = (expected & ~present).sum(axis=1)
+
+    period = get_period(db, start_date, end_date)
+    if period:
+        db.query(models.PayrollPeriodMetric).filter(models.PayrollPeriodMetric.period_id == period.id).delete()
+    else:
+        period = models.PayrollPeriod(start_date=start_date, end_date=end_date)
+        db.add(period)
+    period.standard_hours = standard_hours
+    period.employee_count = n_users
+    period.computed_at = datetime.utcnow()
+    db.flush()
+
+    if n_users:
+        db.execute(insert(models.PayrollPeriodMetric), [
+            {
+                "period_id": period.id,
+                "employee_id": int(user_ids[row]),
+                "worked_hours": round(float(worked_hours[row]), 2),
+                "overtime_hours": round(float(overtime_hours[row]), 2),
+                "days_present": int(days_present[row]),
+                "expected_days": int(expected_days[row]),
+                "absent_days": int(absent_days[row]),
+                "late_entries": int(late_entries[row]),
+                "early_exits": int(early_exits[row])
+            }
+            for row in range(n_users)
+        ])
+    db.commit()
+    logger.info(f"Computed payroll period {start_date} - {end_date} for {n_users} employees")
+    return period
+
+def _leave_mask(db: Session, user_ids: np.ndarray, start_date: date, n_days: int) -> np.ndarray:
+    """(employee, day) mask of approved leave, by a cumulative sum over interval endpoints."""
+    end_date = start_date + timedelta(days=n_days - 1)
+    leaves = db.query(
+        models.LeaveRequest.employee_id, models.LeaveRequest.start_date, models.LeaveRequest.end_date
+    ).filter(
+        models.LeaveRequest.status == "approved",
+        models.LeaveRequest.start_date <= end_date,
+        models.LeaveRequest.end_date >= start_date
+    ).all()
+    # One spare column absorbs the end markers of leave running past the period
+    edges = np.zeros((len(user_ids), n_days + 1), dtype=np.int64)
+    if leaves and len(user_ids):
+        employee_ids = np.array([leave.employee_id for leave in leaves], dtype=np.int64)
+        rows = np.minimum(np.searchsorted(user_ids, employee_ids), len(user_ids) - 1)
+        known = user_ids[rows] == employee_ids
+        starts = np.array([max((leave.start_date - start_date).days, 0) for leave in leaves], dtype=np.int64)
+        ends = np.array([min((leave.end_date - start_date).days, n_days - 1) for leave in leaves], dtype=np.int64)
+        np.add.at(edges, (rows[known], starts[known]), 1)
+        np.add.at(edges, (rows[known], ends[known] + 1), -1)
+    return np.cumsum(edges, axis=1)[:, :n_days] > 0
+
+def get_period(db: Session, start_date: date, end_date: date) -> Optional[models.PayrollPeriod]:
+    return db.query(models.PayrollPeriod).filter(
+        models.PayrollPeriod.start_date == start_date,
+        models.PayrollPeriod.end_date == end_date
+    ).first()
@@ -0,0 +1,246 @@
+"""Statistical per-request profiles in speedscope format.
+
+While a request is profiled, a sampler thread records the Python stacks of the threads
+working on it every ``PROFILE_INTERVAL_MS``: the event loop thread, and every worker thread
+from the moment it runs the request's first SQL statement (sync routes run in a thread
+pool, and a statement is the first point where the request's context is visible in a
+thread). Statements are recorded as a timeline per thread. Other requests sharing the
+event loop can appear in its samples.
+
+Profiles are written to ``PROFILE_DIR`` as speedscope files (https://www.speedscope.app)
+with a small metadata file next to each; only the newest ``MAX_PROFILES`` are kept.
+"""
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, List, Optional
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from ..database import BASE_DIR
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv("HRMS_PROFILE_DIR", os.path.join(BASE_DIR, "profiles"))
+PROFILE_INTERVAL_MS = float(os.getenv("HRMS_PROFILE_INTERVAL_MS", "5"))
+MAX_PROFILES = int(os.getenv("HRMS_MAX_PROFILES", "100"))
+# Profiled requests at once per worker; further requests run unprofiled
+MAX_CONCURRENT_PROFILES = 2
+
+# Longest recorded profile; sampling stops after this many samples
+MAX_SAMPLES = 20_000
+MAX_STACK_DEPTH = 200
+# Characters of a SQL statement kept as its timeline label
+MAX_STATEMENT_LENGTH = 300
+
+PROFILE_ID_PATTERN = re.compile(r"^[0-9]{8}T[0-9]{6}-[0-9a-f]{8}$")
+
+# Profile of the current request, if it is being profiled
+current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+_active_profiles = threading.BoundedSemaphore(MAX_CONCURRENT_PROFILES)
+
+class RequestProfile:
+    def __init__(self, method: str, path: str, tenant: Optional[str]):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.method = method
+        self.path = path
+        self.tenant = tenant
+        self.status_code: Optional[int] = None
+        self.created_at = datetime.utcnow()
+        self._started = time.perf_counter()
+        self._finished: Optional[float] = None
+        self._threads = {threading.get_ident(): "event loop"}
+        self._lock = threading.Lock()
+        self._frames: List[dict] = []
+        self._frame_ids: Dict[tuple, int] = {}
+        # Per thread: [(offset ms, stack)] and [(start ms, end ms, frame id)]
+        self._samples: Dict[int, list] = {}
+        self._statements: Dict[int, list] = {}
+        self._open_statements: Dict[int, tuple] = {}
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample_loop, name=f"profiler-{self.id}", daemon=True)
+
+    def _now_ms(self) -> float:
+        return (time.perf_counter() - self._started) * 1000
+
+    def _frame_id(self, key: tuple) -> int:
+        frame_id = self._frame_ids.get(key)
+        if frame_id is None:
+            # Stack frames come from the sampler, statements from the request's threads
+            with self._lock:
+                frame_id = self._frame_ids.get(key)
+                if frame_id is None:
+                    frame_id = self._frame_ids[key] = len(self._frames)
+                    name, file, line = key
+                    self._frames.append({"name": name, "file": file, "line": line} if file else {"name": name})
+        return frame_id
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self, status_code: Optional[int]):
+        self.status_code = status_code
+        self._finished = self._now_ms()
+        self._stop.set()
+        self._sampler.join()
+
+    def _sample_loop(self):
+        interval = PROFILE_INTERVAL_MS / 1000
+        samples = 0
+        while not self._stop.wait(interval) and samples < MAX_SAMPLES:
+            at = self._now_ms()
+            frames = sys._current_frames()
+            with self._lock:
+                thread_ids = list(self._threads)
+            for thread_id in thread_ids:
+                frame = frames.get(thread_id)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    stack.append(self._frame_id((getattr(code, "co_qualname", code.co_name), code.co_filename, code.co_firstlineno)))
+                    frame = frame.f_back
+                stack.reverse()
+                self._samples.setdefault(thread_id, []).append((at, stack))
+                samples += 1
+
+    def statement_started(self, statement: str):
+        thread_id = threading.get_ident()
+        if thread_id not in self._threads:
+            with self._lock:
+                self._threads[thread_id] = f"worker {len(self._threads)}"
+        self._open_statements[thread_id] = (self._now_ms(), " ".join(statement.split())[:MAX_STATEMENT_LENGTH])
+
+    def statement_finished(self):
+        thread_id = threading.get_ident()
+        opened = self._open_statements.pop(thread_id, None)
+        if opened is not None:
+            started, statement = opened
+            self._statements.setdefault(thread_id, []).append((started, self._now_ms(), self._frame_id((statement, None, None))))
+
+    def to_speedscope(self) -> dict:
+        end = self._finished if self._finished is not None else self._now_ms()
+        profiles = []
+        for thread_id, thread_name in self._threads.items():
+            samples = self._samples.get(thread_id, [])
+            if samples:
+                offsets = [at for at, _ in samples]
+                profiles.append({
+                    "type": "sampled",
+                    "name": f"{thread_name} (samples)",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": end,
+                    "samples": [stack for _, stack in samples],
+                    # Each sample stands for the time since the previous one
+                    "weights": [at - previous for at, previous in zip(offsets, [0] + offsets[:-1])]
+                })
+            statements = self._statements.get(thread_id, [])
+            if statements:
+                events = []
+                for started, finished, frame_id in statements:
+                    events.append({"type": "O", "frame": frame_id, "at": started})
+                    events.append({"type": "C", "frame": frame_id, "at": finished})
+                profiles.append({
+                    "type": "evented",
+                    "name": f"{thread_name} (SQL)",
+                    "unit": "milliseconds",
+                    "startValue": 0,
+                    "endValue": end,
+                    "events": events
+                })
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "name": f"{self.method} {self.path}",
+            "exporter": "hrms-backend",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self._frames},
+            "profiles": profiles
+        }
+
+    def summary(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "tenant": self.tenant,
+            "status_code": self.status_code,
+            "duration_ms": round(self._finished or 0, 3),
+            "samples": sum(len(samples) for samples in self._samples.values()),
+            "statements": sum(len(statements) for statements in self._statements.values()),
+            "created_at": self.created_at.isoformat()
+        }
+
+def start_profile(method: str, path: str, tenant: Optional[str]) -> Optional[RequestProfile]:
+    """Start profiling the current request; None if enough requests are profiled already."""
+    if not _active_profiles.acquire(blocking=False):
+        return None
+    profile = RequestProfile(method, path, tenant)
+    profile.start()
+    return profile
+
+def save_profile(profile: RequestProfile):
+    """Write a stopped profile and drop the oldest ones beyond ``MAX_PROFILES``."""
+    try:
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        with open(profile_path(profile.id), "w") as f:
+            json.dump(profile.to_speedscope(), f)
+        with open(os.path.join(PROFILE_DIR, f"{profile.id}.meta.json"), "w") as f:
+            json.dump(profile.summary(), f)
+        for profile_id in [summary["id"] for summary in list_profiles()][MAX_PROFILES:]:
+            for path in (profile_path(profile_id), os.path.join(PROFILE_DIR, f"{profile_id}.meta.json")):
+                if os.path.exists(path):
+                    os.remove(path)
+        logger.info(f"Saved profile {profile.id} of {profile.method} {profile.path}")
+    finally:
+        _active_profiles.release()
+
+def profile_path(profile_id: str) -> str:
+    return os.path.join(PROFILE_DIR, f"{profile_id}.speedscope.json")
+
+def list_profiles() -> List[dict]:
+    """Metadata of the stored profiles, newest first."""
+    summaries = []
+    for path in glob.glob(os.path.join(PROFILE_DIR, "*.meta.json")):
+        try:
+            with open(path) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            # Being written or removed by another worker
+            continue
+        summaries.append(summary)
+    summaries.sort(key=lambda summary: summary["id"], reverse=True)
+    return summaries
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.statement_started(statement)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.statement_finished()
+
+def _handle_error(context):
+    profile = current_profile.get()
+    if profile is not None:
+        profile.statement_finished()
+
+def register_profiler_hooks():
+    """Record the SQL timeline of profiled requests; safe to call more than once."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,140 @@
+"""Per-route time budgets for SQL statements.
+
+A route's budget is set by the :func:`query_budget` dependency and applies to every
+statement the request runs, including fetching its rows. A statement still running when
+its budget is spent is cancelled by the database itself: through SQLite's progress
+handler, which aborts the statement with ``interrupted``, or through ``statement_timeout``
+on PostgreSQL. The request then fails with :class:`QueryBudgetExceeded` (503) instead of
+holding the connection and blocking writers. On SQLite the busy timeout is capped by the
+budget too, so a request does not wait longer for a lock than it may run.
+
+Work outside requests, such as scheduled jobs and background tasks, has no budget.
+"""
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+import logging
+import os
+import sqlite3
+import time
+
+from fastapi import HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import Pool
+
+from ..database import SQLITE_BUSY_TIMEOUT
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds any single statement of a request may take, unless the route sets its own budget
+DEFAULT_QUERY_BUDGET_SECONDS = float(os.getenv("HRMS_QUERY_BUDGET_SECONDS", "5"))
+# Budget of routes that process whole tables or large batches
+BULK_QUERY_BUDGET_SECONDS = float(os.getenv("HRMS_BULK_QUERY_BUDGET_SECONDS", "60"))
+
+# SQLite virtual machine instructions between two deadline checks
+PROGRESS_INSTRUCTIONS = 10_000
+
+# PostgreSQL SQLSTATE of a statement cancelled by statement_timeout
+QUERY_CANCELED = "57014"
+
+@dataclass
+class QueryBudget:
+    seconds: float
+    route: str
+    exceeded: bool = False
+
+current_query_budget: ContextVar[Optional[QueryBudget]] = ContextVar("current_query_budget", default=None)
+
+class QueryBudgetExceeded(HTTPException):
+    def __init__(self, budget: QueryBudget):
+        super().__init__(
+            status_code=503,
+            detail=f"Query exceeded the {budget.seconds:g}s time budget of this request and was cancelled"
+        )
+
+def query_budget(seconds: Optional[float] = DEFAULT_QUERY_BUDGET_SECONDS):
+    """Dependency setting the statement time budget of a route; None or 0 disables it.
+
+    Applied app-wide with the default budget; a route overrides it by declaring its own,
+    e.g. ``dependencies=[Depends(query_budget(BULK_QUERY_BUDGET_SECONDS))]``.
+    """
+    async def apply_query_budget(request: Request):
+        route = request.scope.get("route")
+        budget = QueryBudget(seconds, getattr(route, "path", request.url.path)) if seconds else None
+        current_query_budget.set(budget)
+        try:
+            yield budget
+        except HTTPException as e:
+            # Routes turn unexpected errors into 500s; report the cancellation instead
+            if budget is not None and budget.exceeded and e.status_code == 500:
+                raise QueryBudgetExceeded(budget) from e
+            raise
+        finally:
+            # Background tasks run after the response and are not bound by the request
+            current_query_budget.set(None)
+    return apply_query_budget
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    budget = current_query_budget.get()
+    info = conn.info
+    if conn.dialect.name == "sqlite":
+        if "progress_handler" not in info:
+            _install_progress_handler(conn.connection.dbapi_connection, info)
+        info["query_deadline"] = time.monotonic() + budget.seconds if budget else None
+        busy_timeout_ms = int(min(budget.seconds, SQLITE_BUSY_TIMEOUT) * 1000) if budget else SQLITE_BUSY_TIMEOUT * 1000
+        if info.get("busy_timeout_ms") != busy_timeout_ms:
+            cursor.execute(f"PRAGMA busy_timeout = {busy_timeout_ms}")
+            info["busy_timeout_ms"] = busy_timeout_ms
+    elif conn.dialect.name == "postgresql":
+        statement_timeout_ms = int(budget.seconds * 1000) if budget else 0
+        if info.get("statement_timeout_ms", 0) != statement_timeout_ms:
+            cursor.execute(f"SET statement_timeout = {statement_timeout_ms}")
+            info["statement_timeout_ms"] = statement_timeout_ms
+
+def _install_progress_handler(dbapi_connection, info):
+    def check_deadline():
+        deadline = info.get("query_deadline")
+        # A non-zero return aborts the running statement
+        return 1 if deadline is not None and time.monotonic() > deadline else 0
+    dbapi_connection.set_progress_handler(check_deadline, PROGRESS_INSTRUCTIONS)
+    info["progress_handler"] = check_deadline
+
+def _end_of_transaction(conn):
+    # COMMIT and ROLLBACK must never be interrupted by the last statement's deadline
+    conn.info["query_deadline"] = None
+
+def _rollback(conn):
+    _end_of_transaction(conn)
+    # A rollback also undoes SET statement_timeout issued in the transaction
+    conn.info.pop("statement_timeout_ms", None)
+
+def _reset_connection(dbapi_connection, connection_record, reset_state):
+    connection_record.info["query_deadline"] = None
+    # The pool's reset is a rollback
+    connection_record.info.pop("statement_timeout_ms", None)
+
+def _handle_error(context):
+    budget = current_query_budget.get()
+    if budget is None:
+        return
+    error = context.original_exception
+    cancelled = (
+        (isinstance(error, sqlite3.OperationalError) and "interrupted" in str(error))
+        or getattr(error, "pgcode", None) == QUERY_CANCELED
+    )
+    if cancelled:
+        budget.exceeded = True
+        metrics.increment("query_budget_exceeded_total", route=budget.route)
+        logger.warning(f"Cancelled a statement of {budget.route} after its {budget.seconds:g}s budget: {context.statement}")
+        raise QueryBudgetExceeded(budget) from error
+
+def register_query_budgets():
+    """Enforce budgets on every engine, including tenant engines; safe to call more than once."""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "commit", _end_of_transaction)
+        event.listen(Engine, "rollback", _rollback)
+        event.listen(Engine, "handle_error", _handle_error)
+        event.listen(Pool, "reset", _reset_connection)
@@ -0,0 +1,253 @@
+"""In-process asyncio scheduler for periodic maintenance jobs.
+
+Every worker runs the scheduler loop, but jobs only execute in the worker holding the
+``job_leases`` row, so a multi-worker deployment still runs each job once. The lease is
+renewed on every tick and by a heartbeat while jobs run, and taken over by another worker
+once it expires. A worker that loses the lease stops before its next job or tenant.
+
+When each job is due next is stored in ``job_schedules``, so a worker taking over the
+lease continues the schedule instead of re-running jobs its predecessor already ran.
+
+A job is a plain function ``job(db) -> rows_touched``; it runs in a thread with its own
+session, and its duration and row count are recorded in ``job_runs``. Scheduled runs
+repeat the job for the default database and every tenant database; the lease always
+lives in the default database.
+"""
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from typing import Callable, Dict, Optional
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time as timer
+import uuid
+
+from sqlalchemy import insert, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .. import models
+from ..database import SessionLocal, current_tenant, tenant_engines
+
+logger = logging.getLogger(__name__)
+
+SCHEDULER_ENABLED = os.getenv("HRMS_SCHEDULER_ENABLED", "true").lower() == "true"
+TICK_SECONDS = 30
+LEASE_SECONDS = 90
+LEASE_NAME = "scheduler"
+
+@dataclass
+class ScheduledJob:
+    name: str
+    func: Callable[[Session], int]
+    interval: Optional[timedelta] = None
+    run_at: Optional[time] = None  # local time of day for daily jobs
+    next_run: Optional[datetime] = None
+
+    def schedule_next(self, now: datetime):
+        if self.run_at is not None:
+            candidate = datetime.combine(now.date(), self.run_at)
+            self.next_run = candidate if candidate > now else candidate + timedelta(days=1)
+        else:
+            self.next_run = now + self.interval
+
+class JobScheduler:
+    def __init__(self, session_factory=SessionLocal, tick_seconds: int = TICK_SECONDS, lease_seconds: int = LEASE_SECONDS):
+        self.session_factory = session_factory
+        self.tick_seconds = tick_seconds
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.jobs: Dict[str, ScheduledJob] = {}
+        self._job_locks: Dict[str, threading.Lock] = {}
+        self._task: Optional[asyncio.Task] = None
+        # Thread running the due jobs of the current tick
+        self._running: Optional[asyncio.Future] = None
+        # Set when the lease could not be renewed, or on shutdown: no further job or tenant starts
+        self._abort = threading.Event()
+
+    def add_job(self, name: str, func: Callable[[Session], int], interval: Optional[timedelta] = None, run_at: Optional[time] = None):
+        if (interval is None) == (run_at is None):
+            raise ValueError("A job needs exactly one of interval or run_at")
+        job = ScheduledJob(name=name, func=func, interval=interval, run_at=run_at)
+        job.schedule_next(datetime.now())
+        self.jobs[name] = job
+        self._job_locks[name] = threading.Lock()
+
+    async def start(self):
+        if self._task is None:
+            logger.info(f"Starting job scheduler as {self.owner}")
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._abort.set()
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            if self._running is not None:
+                # The job thread cannot be cancelled; keep the lease until it has finished
+                await self._with_heartbeat(self._running)
+                self._running = None
+            await asyncio.to_thread(self._release_lease)
+
+    async def _loop(self):
+        while True:
+            try:
+                if await asyncio.to_thread(self._acquire_lease):
+                    self._abort.clear()
+                    self._running = asyncio.ensure_future(asyncio.to_thread(self._run_due_jobs))
+                    await self._with_heartbeat(asyncio.shield(self._running))
+                    self._running = None
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._running = None
+                logger.error(f"Scheduler tick failed: {str(e)}", exc_info=True)
+            await asyncio.sleep(self.tick_seconds)
+
+    async def _with_heartbeat(self, awaitable):
+        """Await ``awaitable`` while renewing the lease; a failed renewal aborts further jobs."""
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(max(1, self.lease_seconds // 3))
+                try:
+                    renewed = await asyncio.to_thread(self._acquire_lease)
+                except Exception as e:
+                    logger.error(f"Scheduler lease renewal failed: {str(e)}")
+                    renewed = False
+                if not renewed:
+                    logger.warning(f"Scheduler lease lost by {self.owner}; stopping after the running job")
+                    self._abort.set()
+                    return
+        renewer = asyncio.create_task(heartbeat())
+        try:
+            return await awaitable
+        finally:
+            renewer.cancel()
+
+    def _run_due_jobs(self):
+        now = datetime.now()
+        for job in list(self.jobs.values()):
+            if self._abort.is_set():
+                return
+            if self._claim_due_run(job, now):
+                self.run_job_for_all_tenants(job.name)
+
+    def _claim_due_run(self, job: ScheduledJob, now: datetime) -> bool:
+        """Advance a due job's stored ``next_run``; True if this worker should run it now."""
+        db = self.session_factory(bind=tenant_engines.get(None))
+        try:
+            schedule = db.get(models.JobSchedule, job.name)
+            if schedule is None:
+                job.schedule_next(now)
+                db.add(models.JobSchedule(name=job.name, next_run=job.next_run))
+                try:
+                    db.commit()
+                except IntegrityError:
+                    db.rollback()
+                return False
+            if schedule.next_run > now:
+                job.next_run = schedule.next_run
+                return False
+            job.schedule_next(now)
+            # Conditional on the value read, so the same due run is never claimed twice
+            claimed = db.execute(
+                update(models.JobSchedule).where(
+                    models.JobSchedule.name == job.name,
+                    models.JobSchedule.next_run == schedule.next_run
+                ).values(next_run=job.next_run, last_run_at=now)
+            ).rowcount
+            db.commit()
+            return claimed == 1
+        finally:
+            db.close()
+
+    def _acquire_lease(self) -> bool:
+        """Take or renew the scheduler lease; True while this worker holds it."""
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.lease_seconds)
+        db = self.session_factory(bind=tenant_engines.get(None))
+        try:
+            result = db.execute(
+                update(models.JobLease).where(
+                    models.JobLease.name == LEASE_NAME,
+                    or_(models.JobLease.owner == self.owner, models.JobLease.expires_at < now)
+                ).values(owner=self.owner, expires_at=expires_at)
+            )
+            if result.rowcount == 0:
+                try:
+                    db.execute(insert(models.JobLease).values(name=LEASE_NAME, owner=self.owner, expires_at=expires_at))
+                except IntegrityError:
+                    db.rollback()
+                    return False
+            db.commit()
+            return True
+        finally:
+            db.close()
+
+    def _release_lease(self):
+        db = self.session_factory(bind=tenant_engines.get(None))
+        try:
+            db.query(models.JobLease).filter(
+                models.JobLease.name == LEASE_NAME,
+                models.JobLease.owner == self.owner
+            ).delete()
+            db.commit()
+        finally:
+            db.close()
+
+    def run_job_for_all_tenants(self, name: str):
+        for tenant in tenant_engines.known_tenants():
+            if self._abort.is_set():
+                logger.warning(f"Job {name} stopped before tenant {tenant}: scheduler lease lost or shutting down")
+                return
+            token = current_tenant.set(tenant)
+            try:
+                self.run_job(name)
+            except Exception as e:
+                logger.error(f"Job {name} could not run for tenant {tenant}: {str(e)}", exc_info=True)
+            finally:
+                current_tenant.reset(token)
+
+    def run_job(self, name: str) -> models.JobRun:
+        """Run a job now for the current tenant in the calling thread and record the outcome."""
+        job = self.jobs[name]
+        with self._job_locks[name]:
+            started_at = datetime.utcnow()
+            start = timer.perf_counter()
+            rows_touched, error = 0, None
+            db = self.session_factory()
+            try:
+                rows_touched = job.func(db) or 0
+            except Exception as e:
+                db.rollback()
+                error = str(e)
+                logger.error(f"Job {name} failed: {error}", exc_info=True)
+            finally:
+                db.close()
+            duration_ms = (timer.perf_counter() - start) * 1000
+            logger.info(f"Job {name} finished in {duration_ms:.1f} ms, {rows_touched} rows touched")
+
+            db = self.session_factory()
+            try:
+                run = models.JobRun(
+                    job_name=name,
+                    started_at=started_at,
+                    duration_ms=round(duration_ms, 2),
+                    rows_touched=rows_touched,
+                    status="failed" if error else "success",
+                    error=error
+                )
+                db.add(run)
+                db.commit()
+                db.refresh(run)
+                return run
+            finally:
+                db.close()
+
+scheduler = JobScheduler()
@@ -0,0 +1,78 @@
+"""Coalescing of identical concurrent reads.
+
+``dashboard_flight.do(key, func)`` runs ``func`` once for all callers asking for the same
+key at the same time: the first caller computes, the others block until it finishes and
+receive the same result (or exception). With ``ttl`` the result is also kept for that many
+seconds, so a burst of dashboard refreshes costs one query set instead of one per viewer.
+
+Keys must include everything the result depends on, including the caller's authorization
+scope. Results are shared between callers and must not be mutated.
+"""
+from typing import Any, Callable, Dict, Hashable, Tuple
+import logging
+import os
+import threading
+import time
+
+from ..database import current_tenant
+from ..metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Seconds a dashboard result is reused after it was computed; 0 only coalesces in-flight calls
+DASHBOARD_CACHE_SECONDS = float(os.getenv("HRMS_DASHBOARD_CACHE_SECONDS", "1"))
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._cache: Dict[Hashable, Tuple[float, Any]] = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any], ttl: float = 0) -> Any:
+        # Tenants never share results
+        key = (current_tenant.get(), key)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                metrics.increment("singleflight_calls_total", flight=self.name, outcome="cached")
+                return cached[1]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            metrics.increment("singleflight_calls_total", flight=self.name, outcome="shared")
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        metrics.increment("singleflight_calls_total", flight=self.name, outcome="computed")
+        try:
+            call.result = func()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and ttl > 0:
+                    self._cache[key] = (time.monotonic() + ttl, call.result)
+                    self._evict_expired()
+            call.done.set()
+        return call.result
+
+    def _evict_expired(self):
+        now = time.monotonic()
+        for key in [key for key, (expires, _) in self._cache.items() if expires <= now]:
+            del self._cache[key]
+
+dashboard_flight = SingleFlight("dashboard")
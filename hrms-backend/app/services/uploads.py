@@ -0,0 +1,43 @@
+"""Streaming readers for CSV / NDJSON uploads used by the bulk import endpoints."""
+from typing import Iterator, Optional, Tuple
+import codecs
+import csv
+import json
+
+from fastapi import UploadFile
+
+def upload_format(upload: UploadFile, requested: Optional[str] = None) -> str:
+    """``requested`` if given, otherwise "ndjson" for .ndjson / .jsonl files and "csv" for the rest."""
+    if requested:
+        return requested
+    return "ndjson" if (upload.filename or "").lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+def iter_upload_rows(upload: UploadFile, file_format: str) -> Iterator[Tuple[int, Optional[dict], Optional[str]]]:
+    """Yield ``(row_number, values, error)`` from a CSV or NDJSON upload, decoding it as a stream.
+
+    Empty CSV cells become None. Row numbers are 1-based and skip the CSV header and blank
+    NDJSON lines.
+    """
+    lines = codecs.iterdecode(upload.file, "utf-8-sig")
+    if file_format == "csv":
+        for row_number, row in enumerate(csv.DictReader(lines), 1):
+            yield row_number, {key: value or None for key, value in row.items() if key is not None}, None
+    else:
+        row_number = 0
+        for line in lines:
+            if not line.strip():
+                continue
+            row_number += 1
+            try:
+                values = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield row_number, None, f"Invalid JSON: {e.msg}"
+                continue
+            if not isinstance(values, dict):
+                yield row_number, None, "Expected a JSON object"
+                continue
+            yield row_number, values, None
+
+def validation_message(error) -> str:
+    """One-line summary of a pydantic ValidationError."""
+    return "; ".join(f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in error.errors())
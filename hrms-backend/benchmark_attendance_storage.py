@@ -0,0 +1,116 @@
+"""Compare text and integer storage of attendance dates and times in SQLite.
+
+Builds two temporary databases with the same synthetic attendance history, one with the
+previous ISO text columns and one with the day-number / minute-of-day encoding used by
+``app.models.Attendance``, then times a date-range scan and a worked-hours aggregation and
+reports the file sizes.
+
+    python benchmark_attendance_storage.py --rows 1000000
+"""
+from datetime import date, timedelta
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+EPOCH = date(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE attendance (
+    id INTEGER PRIMARY KEY,
+    employee_id INTEGER,
+    date {date_type},
+    check_in {time_type},
+    check_out {time_type},
+    status VARCHAR
+);
+CREATE UNIQUE INDEX uq_attendance_employee_date ON attendance (employee_id, date);
+"""
+
+QUERIES = {
+    "text": {
+        "range_scan": "SELECT count(*) FROM attendance WHERE date >= ? AND date <= ?",
+        "worked_hours": (
+            "SELECT sum((strftime('%s', '2000-01-01 ' || check_out) - strftime('%s', '2000-01-01 ' || check_in)) / 3600.0) "
+            "FROM attendance WHERE date >= ? AND date <= ?"
+        ),
+    },
+    "integer": {
+        "range_scan": "SELECT count(*) FROM attendance WHERE date >= ? AND date <= ?",
+        "worked_hours": "SELECT sum((check_out - check_in) / 60.0) FROM attendance WHERE date >= ? AND date <= ?",
+    },
+}
+
+def generate_rows(count: int, employees: int, seed: int = 7):
+    rng = random.Random(seed)
+    days = -(-count // employees)
+    start = date.today() - timedelta(days=days)
+    for row_id in range(count):
+        employee_id, day = row_id % employees, row_id // employees
+        check_in = 8 * 60 + rng.randrange(120)
+        yield row_id + 1, employee_id + 1, start + timedelta(days=day), check_in, check_in + 8 * 60 + rng.randrange(90)
+
+def build(path: str, encoding: str, count: int, employees: int):
+    connection = sqlite3.connect(path)
+    if encoding == "text":
+        connection.executescript(SCHEMA.format(date_type="DATE", time_type="TIME"))
+        rows = (
+            (row_id, employee_id, day.isoformat(), f"{check_in // 60:02d}:{check_in % 60:02d}:00.000000",
+             f"{check_out // 60:02d}:{check_out % 60:02d}:00.000000", "present")
+            for row_id, employee_id, day, check_in, check_out in generate_rows(count, employees)
+        )
+    else:
+        connection.executescript(SCHEMA.format(date_type="INTEGER", time_type="INTEGER"))
+        rows = (
+            (row_id, employee_id, (day - EPOCH).days, check_in, check_out, "present")
+            for row_id, employee_id, day, check_in, check_out in generate_rows(count, employees)
+        )
+    connection.executemany("INSERT INTO attendance VALUES (?, ?, ?, ?, ?, ?)", rows)
+    connection.commit()
+    connection.execute("VACUUM")
+    return connection
+
+def timed(connection, sql: str, params, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        connection.execute(sql, params).fetchall()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--employees", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    range_end = date.today()
+    range_start = range_end - timedelta(days=90)
+    with tempfile.TemporaryDirectory() as directory:
+        results = {}
+        for encoding in ("text", "integer"):
+            path = os.path.join(directory, f"{encoding}.db")
+            connection = build(path, encoding, args.rows, args.employees)
+            if encoding == "text":
+                params = (range_start.isoformat(), range_end.isoformat())
+            else:
+                params = ((range_start - EPOCH).days, (range_end - EPOCH).days)
+            results[encoding] = {
+                "size_mb": os.path.getsize(path) / 1024 / 1024,
+                **{name: timed(connection, sql, params, args.repeat) * 1000 for name, sql in QUERIES[encoding].items()},
+            }
+            connection.close()
+
+    print(f"{args.rows} rows, {args.employees} employees, best of {args.repeat}")
+    print(f"{'':10}{'file size':>12}{'range scan':>14}{'worked hours':>16}")
+    for encoding, result in results.items():
+        print(
+            f"{encoding:10}{result['size_mb']:>10.1f}MB{result['range_scan']:>12.1f}ms"
+            f"{result['worked_hours']:>14.1f}ms"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,30 @@
 from fastapi import FastAPI, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers.users import router as users_router, authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES
+from app.routers.users import router as users_router, authenticate_user, create_access_token, ACCESS_TOKEN_EXPIRE_MINUTES, shutdown_hash_pool, shutdown_onboarding_executor
 from app.routers.attendance import router as attendance_router
 from app.routers.leave import router as leave_router
 from app.routers.assets import router as assets_router
 from app.routers.policies import router as policies_router
+from app.routers.holidays import router as holidays_router
+from app.routers.payroll import router as payroll_router
+from app.routers.jobs import router as jobs_router
+from app.routers.metrics import router as metrics_router
+from app.routers.sync import router as sync_router
+from app.routers.analytics import router as analytics_router
+from app.routers.profiles import router as profiles_router
+from app.services.scheduler import scheduler, SCHEDULER_ENABLED
+from app.services.nightly_jobs import register_nightly_jobs, NIGHTLY_RUN_AT
+from app.services.leave_accrual import accrue_current_year
+from app.services.leave_reports import fail_stale_reports, shutdown_report_executor
+from app.services.change_log import register_change_capture, purge_change_log
+from app.services.query_budget import register_query_budgets, query_budget
+from app.services.profiler import register_profiler_hooks
+from app.services.cache import register_cache_invalidation
+from app.middleware import AdmissionMiddleware, IdempotencyMiddleware, ProfilingMiddleware, TenantMiddleware, purge_expired_idempotency_keys
 from setup_database import setup_database
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
-from app.database import get_db
+from app.database import get_db, current_tenant, tenant_engines
 from datetime import timedelta
 import logging
 import osin
@@ -24,11 +40,25 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Log every change of a synced table to the change_log outbox
+register_change_capture()
+
+# Cancel statements that run past their route's time budget
+register_query_budgets()
+
+# Attach the SQL timeline to profiled requests
+register_profiler_hooks()
+
+# Expire cached users and policies in every worker when a commit changes them
+register_cache_invalidation()
+
 # Create FastAPI app
 app = FastAPI(
     title="HRMS API",
     description="Human Resource Management System API",
-    version="1.0.0"
+    version="1.0.0",
+    # Default statement time budget; bulk routes declare a larger one
+    dependencies=[Depends(query_budget())]
 )
 
 # Add error handling middleware
@@ -43,6 +73,18 @@ async def log_requests(request, call_next):
         logger.error(f"Request failed: {str(e)}", exc_info=True)
         raise
 
+# Profile requests asked for with X-Profile or picked by the sample rate
+app.add_middleware(ProfilingMiddleware)
+
+# Replay responses of write requests retried with the same Idempotency-Key
+app.add_middleware(IdempotencyMiddleware)
+
+# Shed load with 429/503 and Retry-After before requests queue up on the database
+app.add_middleware(AdmissionMiddleware)
+
+# Route each request to its tenant's database
+app.add_middleware(TenantMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -68,8 +110,11 @@ async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(
             headers={"WWW-Authenticate": "Bearer"},
         )
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    token_data = {"sub": user.email, "role": user.role}
+    if current_tenant.get() is not None:
+        token_data["tenant"] = current_tenant.get()
     access_token = create_access_token(
-        data={"sub": user.email, "role": user.role}, expires_delta=access_token_expires
+        data=token_data, expires_delta=access_token_expires
     )
     logger.info(f"Successful login for user: {user.email}")
     return {
@@ -85,6 +130,13 @@ app.include_router(attendance_router, tags=["attendance"], prefix="/api")
 app.include_router(leave_router, tags=["leave"], prefix="/api")
 app.include_router(assets_router, tags=["assets"], prefix="/api")
 app.include_router(policies_router, tags=["policies"], prefix="/api")
+app.include_router(holidays_router, tags=["holidays"], prefix="/api")
+app.include_router(payroll_router, tags=["payroll"], prefix="/api")
+app.include_router(jobs_router, tags=["jobs"], prefix="/api")
+app.include_router(metrics_router, tags=["metrics"], prefix="/api")
+app.include_router(sync_router, tags=["sync"], prefix="/api")
+app.include_router(analytics_router, tags=["analytics"], prefix="/api")
+app.include_router(profiles_router, tags=["profiles"], prefix="/api")
 
 @app.on_event("startup")
 async def startup_event():
@@ -92,11 +144,31 @@ async def startup_event():
     try:
         logger.info("Setting up database...")
         setup_database()
+        tenant_engines.initializer = setup_database
         logger.info("Database setup completed successfully!")
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}", exc_info=True)
         raise  # Re-raise the exception to prevent the application from starting with a broken database
 
+    register_nightly_jobs(scheduler)
+    scheduler.add_job("leave_accrual", accrue_current_year, run_at=NIGHTLY_RUN_AT)
+    scheduler.add_job("purge_idempotency_keys", purge_expired_idempotency_keys, interval=timedelta(hours=1))
+    scheduler.add_job("purge_change_log", purge_change_log, run_at=NIGHTLY_RUN_AT)
+    scheduler.add_job("fail_stale_reports", fail_stale_reports, interval=timedelta(minutes=15))
+    # Reports lost with a previous worker would otherwise stay queued until the next run
+    scheduler.run_job("fail_stale_reports")
+    if SCHEDULER_ENABLED:
+        await scheduler.start()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background jobs and hand the scheduler lease to another worker."""
+    await scheduler.stop()
+    shutdown_onboarding_executor()
+    shutdown_hash_pool()
+    shutdown_report_executor()
+    tenant_engines.dispose_all()
+
 @app.get("/")
 async def root():
     return {"message": "Welcome to HRMS API"}
@@ -12,6 +12,7 @@ setup(
         "pydantic",
         "passlib[bcrypt]",
         "python-multipart",
-        "email-validator"
+        "email-validator",
+        "numpy"
     ],
 ) 
\ No newline at end of file
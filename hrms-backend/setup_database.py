@@ -1,8 +1,8 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, literal, text
 from datetime import date, timedelta
 from sqlalchemy.orm import sessionmaker
 from app.database import Base
-from app.models import User, LeaveBalance, LeaveRequest, Asset, Attendance, Policy
+from app.models import User, LeaveBalance, LeaveRequest, Asset, Attendance, Policy, ChangeLog
 from app.routers.users import get_password_hash
 import logging
 from datetime import datetime
@@ -22,14 +22,145 @@ engine = create_engine(
 # Create SessionLocal
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
-def setup_database():
+def ensure_columns(bind=engine):
+    """Add columns declared on the models that an older database file is missing."""
+    inspector = inspect(bind)
+    with bind.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {column["name"] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=bind.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, column.type).compile(
+                        dialect=bind.dialect, compile_kwargs={"literal_binds": True}
+                    )
+                    ddl += f" DEFAULT {default}"
+                logger.info(f"Adding column {table.name}.{column.name}")
+                conn.execute(text(ddl))
+
+def backfill_accrual_year(bind=engine):
+    """Mark leave balances of older databases as accrued for the current year.
+
+    ``accrual_year`` is added without a default, and the nightly accrual rolls over every
+    balance without one; this has to run before the scheduler starts.
+    """
+    with bind.begin() as conn:
+        updated = conn.execute(
+            text("UPDATE leave_balance SET accrual_year = :year WHERE accrual_year IS NULL"),
+            {"year": date.today().year}
+        ).rowcount
+    if updated:
+        logger.info(f"Set accrual year of {updated} leave balances to {date.today().year}")
+
+def rebuild_change_log(bind=engine):
+    """Recreate a change_log table created without AUTOINCREMENT by older versions.
+
+    Without it SQLite reuses the ids of purged entries. The ids of entries purged before
+    the rebuild cannot be recovered, so the sequence continues from the highest one left.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    table = ChangeLog.__table__
+    with bind.begin() as conn:
+        sql = conn.execute(
+            text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"), {"name": table.name}
+        ).scalar()
+        if sql is None or "AUTOINCREMENT" in sql.upper():
+            return
+        logger.info("Rebuilding change_log with AUTOINCREMENT ids")
+        columns = ", ".join(column.name for column in table.columns)
+        for index in table.indexes:
+            conn.execute(text(f"DROP INDEX IF EXISTS {index.name}"))
+        conn.execute(text(f"ALTER TABLE {table.name} RENAME TO {table.name}_old"))
+        table.create(bind=conn)
+        conn.execute(text(f"INSERT INTO {table.name} ({columns}) SELECT {columns} FROM {table.name}_old"))
+        conn.execute(text(f"DROP TABLE {table.name}_old"))
+
+def encode_attendance_columns(bind=engine):
+    """Convert attendance dates and times stored as text by older versions to integers.
+
+    Dates become days since 1970-01-01 and times minutes of the day, matching the DayNumber
+    and MinuteOfDay column types. Only text values are touched, so the conversion is
+    idempotent and resumes after an interruption. Archive tables are converted as well,
+    and the file is vacuumed afterwards to reclaim the space.
+    """
+    if bind.dialect.name != "sqlite":
+        return
+    tables = [name for name in inspect(bind).get_table_names() if name == "attendance" or name.startswith("attendance_archive_")]
+    converted = 0
+    with bind.begin() as conn:
+        for table in tables:
+            converted += conn.execute(text(
+                f"UPDATE {table} SET date = CAST(julianday(date) - 2440587.5 AS INTEGER) WHERE typeof(date) = 'text'"
+            )).rowcount
+            for column in ("check_in", "check_out"):
+                converted += conn.execute(text(
+                    f"UPDATE {table} SET {column} = CAST(substr({column}, 1, 2) AS INTEGER) * 60 + CAST(substr({column}, 4, 2) AS INTEGER) "
+                    f"WHERE typeof({column}) = 'text'"
+                )).rowcount
+    if converted:
+        logger.info(f"Converted {converted} attendance values to integer encoding")
+        with bind.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+def dedupe_attendance(bind=engine):
+    """Merge duplicate attendance records of an employee and day into the oldest one.
+
+    Older databases allowed several check-ins per day; they have to be collapsed before the
+    unique (employee_id, date) index can be created.
+    """
+    with bind.begin() as conn:
+        duplicates = conn.execute(text(
+            "SELECT count(*) FROM (SELECT 1 FROM attendance WHERE employee_id IS NOT NULL AND date IS NOT NULL "
+            "GROUP BY employee_id, date HAVING count(*) > 1)"
+        )).scalar()
+        if not duplicates:
+            return
+        logger.info(f"Merging duplicate attendance records for {duplicates} employee days")
+        conn.execute(text(
+            "UPDATE attendance SET "
+            "check_in = (SELECT min(a.check_in) FROM attendance a WHERE a.employee_id = attendance.employee_id AND a.date = attendance.date), "
+            "check_out = (SELECT max(a.check_out) FROM attendance a WHERE a.employee_id = attendance.employee_id AND a.date = attendance.date) "
+            "WHERE id IN (SELECT min(id) FROM attendance WHERE employee_id IS NOT NULL AND date IS NOT NULL "
+            "GROUP BY employee_id, date HAVING count(*) > 1)"
+        ))
+        conn.execute(text(
+            "DELETE FROM attendance WHERE employee_id IS NOT NULL AND date IS NOT NULL AND id NOT IN "
+            "(SELECT min(id) FROM attendance WHERE employee_id IS NOT NULL AND date IS NOT NULL GROUP BY employee_id, date)"
+        ))
+
+def ensure_indexes(bind=engine):
+    """Create indexes declared on the models that an older database file is missing.
+
+    create_all() only emits indexes together with a new table, so indexes added to
+    existing tables have to be created separately.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=bind, checkfirst=True)
+
+def setup_database(bind=engine):
+    """Create or migrate the schema of a database and seed its default users and policies.
+
+    Runs for the default database on startup and for each tenant database when it is first
+    opened.
+    """
+    db = None
     try:
         # Create all tables
         logger.info("Creating database tables...")
-        Base.metadata.create_all(bind=engine)
+        Base.metadata.create_all(bind=bind)
+        ensure_columns(bind)
+        backfill_accrual_year(bind)
+        rebuild_change_log(bind)
+        encode_attendance_columns(bind)
+        dedupe_attendance(bind)
+        ensure_indexes(bind)
         
         # Create a session
-        db = SessionLocal()
+        db = SessionLocal(bind=bind)
         
         # Check if HR user exists
         hr_user = db.query(User).filter(User.email == "hr@example.com").first()
@@ -141,7 +272,8 @@ def setup_database():
         logger.error(f"Error setting up database: {str(e)}")
         raise
     finally:
-        db.close()
+        if db is not None:
+            db.close()
 
 if __name__ == "__main__":
     setup_database()
\ No newline at end of file
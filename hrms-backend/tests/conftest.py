@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the backend as ``app``, like run.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(autouse=True)
+def cache_generations(tmp_path, monkeypatch):
+    """Cache generation counters of each test in its own file, never the shared one."""
+    from app.services import cache
+    counters = cache.GenerationCounters(path=str(tmp_path / "cache_generations.bin"))
+    monkeypatch.setattr(cache, "generations", counters)
+    return counters
@@ -0,0 +1,104 @@
+"""Cached principals expire on committed user changes, and only on those."""
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base, current_tenant
+from app.routers.users import get_active_user_by_email, principal_cache
+from app.services.cache import GenerationalCache, register_cache_invalidation
+from app.services.change_log import register_change_capture
+from app.services.offboarding import offboard_users
+
+EMAIL = "employee@example.com"
+
+@pytest.fixture
+def session_factory(tmp_path):
+    register_change_capture()
+    register_cache_invalidation()
+    principal_cache.clear()
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    db = Session()
+    db.add_all([
+        models.User(email=EMAIL, hashed_password="x", role="employee", department="IT"),
+        models.User(email="hr@example.com", hashed_password="x", role="hr", department="HR"),
+    ])
+    db.commit()
+    db.close()
+    yield Session
+    principal_cache.clear()
+    engine.dispose()
+
+def _principal(Session):
+    # A fresh session per lookup, like one request each
+    db = Session()
+    try:
+        user = get_active_user_by_email(db, EMAIL)
+        return None if user is None else (user.department, user.archived_at)
+    finally:
+        db.close()
+
+def _write_behind_the_cache(Session, department):
+    # A raw connection bypasses the session hooks, so cached values only change on a bump
+    with Session().get_bind().begin() as connection:
+        connection.execute(update(models.User).where(models.User.email == EMAIL).values(department=department))
+
+def test_core_update_evicts_the_cached_principal(session_factory):
+    assert _principal(session_factory) == ("IT", None)
+    _write_behind_the_cache(session_factory, "Unseen")
+    assert _principal(session_factory) == ("IT", None)
+
+    db = session_factory()
+    db.execute(update(models.User).where(models.User.email == EMAIL).values(department="Finance"))
+    db.commit()
+    db.close()
+    assert _principal(session_factory) == ("Finance", None)
+
+def test_offboarding_archive_evicts_the_cached_principal(session_factory):
+    assert _principal(session_factory) is not None
+    db = session_factory()
+    hr_id, user_id = (
+        db.query(models.User.id).filter(models.User.email == email).scalar() for email in ("hr@example.com", EMAIL)
+    )
+    offboard_users(db, [user_id], "archive", hr_id)
+    db.commit()
+    db.close()
+    assert _principal(session_factory) is None
+
+def test_rollback_does_not_bump_the_generation(session_factory, cache_generations):
+    assert _principal(session_factory) == ("IT", None)
+    before = cache_generations.current(("users",))
+
+    db = session_factory()
+    db.execute(update(models.User).where(models.User.email == EMAIL).values(department="Finance"))
+    db.rollback()
+    db.close()
+
+    assert cache_generations.current(("users",)) == before
+    # Still served from the cache: the write made behind it stays unseen
+    _write_behind_the_cache(session_factory, "Unseen")
+    assert _principal(session_factory) == ("IT", None)
+
+def test_tenants_do_not_share_entries(cache_generations):
+    cache = GenerationalCache("test", ("users",))
+    loads = []
+
+    def load_as(tenant, value):
+        token = current_tenant.set(tenant)
+        try:
+            return cache.get_or_load(EMAIL, lambda: loads.append(tenant) or value)
+        finally:
+            current_tenant.reset(token)
+
+    assert load_as(None, "default user") == "default user"
+    assert load_as("acme", "acme user") == "acme user"
+    assert load_as(None, "reloaded") == "default user"
+    assert loads == [None, "acme"]
+
+    # A change in one tenant only expires that tenant's entries
+    cache_generations.bump(["users"], "acme")
+    assert load_as(None, "reloaded") == "default user"
+    assert load_as("acme", "acme reloaded") == "acme reloaded"
+    assert loads == [None, "acme", "acme"]
@@ -0,0 +1,133 @@
+"""Change capture into change_log and the sync feed built from it."""
+from datetime import date
+
+import pytest
+from sqlalchemy import create_engine, delete, insert, update
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base
+from app.routers.sync import read_changes
+from app.services.change_log import register_change_capture
+
+@pytest.fixture
+def session_factory(tmp_path):
+    register_change_capture()
+    engine = create_engine(f"sqlite:///{tmp_path / 'change_log.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    engine.dispose()
+
+def _users(db, count):
+    users = [
+        models.User(email=f"user{n}@example.com", hashed_password="x", role="employee", department="IT")
+        for n in range(count)
+    ]
+    db.add_all(users)
+    db.commit()
+    return [user.id for user in users]
+
+def _log(db, after=0):
+    return [
+        (entry.table_name, entry.row_id, entry.operation)
+        for entry in db.query(models.ChangeLog).filter(models.ChangeLog.id > after).order_by(models.ChangeLog.id)
+    ]
+
+def _last_cursor(db):
+    return db.query(models.ChangeLog.id).order_by(models.ChangeLog.id.desc()).limit(1).scalar() or 0
+
+def _changes(db, after=0, limit=1000, tables=None):
+    return read_changes(after=after, limit=limit, tables=tables, current_user=None, db=db)
+
+def test_orm_changes_are_logged_in_the_same_transaction(session_factory):
+    db = session_factory()
+    ids = _users(db, 2)
+    assert _log(db) == [("users", ids[0], "insert"), ("users", ids[1], "insert")]
+
+    cursor = _last_cursor(db)
+    user = db.get(models.User, ids[0])
+    user.department = "HR"
+    db.delete(db.get(models.User, ids[1]))
+    db.commit()
+    assert sorted(_log(db, cursor)) == [("users", ids[0], "update"), ("users", ids[1], "delete")]
+
+    # A rolled back change leaves no trace in the log
+    cursor = _last_cursor(db)
+    user.department = "Finance"
+    db.flush()
+    db.rollback()
+    assert _log(db, cursor) == []
+    db.close()
+
+def test_set_based_statements_log_every_matched_row(session_factory):
+    db = session_factory()
+    ids = _users(db, 3)
+
+    cursor = _last_cursor(db)
+    db.execute(update(models.User).where(models.User.id.in_(ids[:2])).values(department="HR"))
+    db.query(models.User).filter(models.User.id == ids[2]).update({"position": "Lead"}, synchronize_session=False)
+    db.commit()
+    assert sorted(_log(db, cursor)) == [("users", user_id, "update") for user_id in ids]
+
+    cursor = _last_cursor(db)
+    db.execute(insert(models.Attendance), [
+        {"employee_id": ids[0], "date": date(2030, 1, day), "status": "present"} for day in (7, 8)
+    ])
+    db.commit()
+    attendance_ids = [row.id for row in db.query(models.Attendance.id).order_by(models.Attendance.id)]
+    assert _log(db, cursor) == [("attendance", row_id, "insert") for row_id in attendance_ids]
+
+    cursor = _last_cursor(db)
+    db.execute(delete(models.Attendance).where(models.Attendance.employee_id == ids[0]))
+    db.commit()
+    assert sorted(_log(db, cursor)) == [("attendance", row_id, "delete") for row_id in attendance_ids]
+
+    # Statements that match nothing log nothing
+    cursor = _last_cursor(db)
+    db.execute(update(models.User).where(models.User.id == -1).values(department="HR"))
+    db.commit()
+    assert _log(db, cursor) == []
+    db.close()
+
+def test_deleted_rows_come_back_as_tombstones(session_factory):
+    db = session_factory()
+    kept, removed = _users(db, 2)
+    db.query(models.User).filter(models.User.id == kept).update({"department": "HR"}, synchronize_session=False)
+    db.execute(delete(models.User).where(models.User.id == removed))
+    db.commit()
+
+    batch = _changes(db)
+    assert not batch["has_more"]
+    assert batch["next_cursor"] == _last_cursor(db)
+    # Every row appears once, with its latest change
+    by_id = {change["id"]: change for change in batch["changes"]}
+    assert len(batch["changes"]) == 2
+    assert by_id[kept]["operation"] == "upsert"
+    assert by_id[kept]["data"]["department"] == "HR"
+    assert "hashed_password" not in by_id[kept]["data"]
+    assert by_id[removed]["operation"] == "delete"
+    assert by_id[removed]["data"] is None
+    db.close()
+
+def test_batches_resume_from_the_cursor(session_factory):
+    db = session_factory()
+    ids = _users(db, 5)
+
+    seen, cursor = [], 0
+    while True:
+        batch = _changes(db, after=cursor, limit=2, tables="users")
+        seen += [change["id"] for change in batch["changes"]]
+        assert all(change["cursor"] > cursor for change in batch["changes"])
+        cursor = batch["next_cursor"]
+        if not batch["has_more"]:
+            break
+    assert seen == ids
+
+    # Purging the log never hands out a cursor a consumer has already passed
+    db.query(models.ChangeLog).delete()
+    db.commit()
+    late = models.User(email="late@example.com", hashed_password="x", role="employee")
+    db.add(late)
+    db.commit()
+    assert [change["id"] for change in _changes(db, after=cursor)["changes"]] == [late.id]
+    db.close()
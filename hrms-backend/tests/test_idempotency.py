@@ -0,0 +1,104 @@
+"""Idempotency-Key replay, conflicts and scoping."""
+from datetime import datetime, timedelta
+import threading
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.middleware.idempotency import IdempotencyMiddleware
+from app.routers.users import SECRET_KEY, ALGORITHM
+
+def _token(email: str, minutes: int = 30, **claims) -> dict:
+    payload = {"sub": email, "role": "employee", "exp": datetime.utcnow() + timedelta(minutes=minutes), **claims}
+    return {"Authorization": f"Bearer {jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)}"}
+
+@pytest.fixture
+def app_and_calls(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'idempotency.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    calls = []
+    entered, release = threading.Event(), threading.Event()
+    release.set()
+    app = FastAPI()
+
+    @app.post("/items")
+    async def create_item(request: Request):
+        calls.append(await request.json())
+        return {"id": len(calls)}
+
+    @app.post("/slow")
+    def slow():
+        entered.set()
+        release.wait(5)
+        calls.append("slow")
+        return {"id": len(calls)}
+
+    @app.post("/broken")
+    def broken():
+        calls.append("broken")
+        return JSONResponse({"detail": "boom"}, status_code=500)
+
+    app.add_middleware(IdempotencyMiddleware, session_factory=sessionmaker(bind=engine))
+    yield app, calls, (entered, release)
+    engine.dispose()
+
+def test_retry_is_replayed_even_with_a_refreshed_token(app_and_calls):
+    app, calls, _ = app_and_calls
+    client = TestClient(app)
+    first = client.post("/items", json={"name": "a"}, headers={**_token("a@example.com"), "Idempotency-Key": "k1"})
+    # The client logged in again before retrying: a different token for the same user
+    retry = client.post("/items", json={"name": "a"}, headers={**_token("a@example.com", minutes=29), "Idempotency-Key": "k1"})
+    assert first.status_code == retry.status_code == 200
+    assert retry.json() == first.json()
+    assert retry.headers["idempotent-replayed"] == "true"
+    assert len(calls) == 1
+
+def test_key_reused_for_a_different_request_is_rejected(app_and_calls):
+    app, calls, _ = app_and_calls
+    client = TestClient(app)
+    headers = {**_token("a@example.com"), "Idempotency-Key": "k2"}
+    assert client.post("/items", json={"name": "a"}, headers=headers).status_code == 200
+    assert client.post("/items", json={"name": "b"}, headers=headers).status_code == 422
+    assert len(calls) == 1
+
+def test_keys_are_scoped_per_user_and_tenant(app_and_calls):
+    app, calls, _ = app_and_calls
+    client = TestClient(app)
+    for headers in (_token("a@example.com"), _token("b@example.com"), _token("a@example.com", tenant="acme")):
+        response = client.post("/items", json={"name": "a"}, headers={**headers, "Idempotency-Key": "shared"})
+        assert response.status_code == 200
+        assert "idempotent-replayed" not in response.headers
+    assert len(calls) == 3
+
+def test_retry_while_the_first_request_runs_gets_409(app_and_calls):
+    app, calls, (entered, release) = app_and_calls
+    release.clear()
+    client = TestClient(app)
+    headers = {**_token("a@example.com"), "Idempotency-Key": "k3"}
+    results = {}
+    first = threading.Thread(target=lambda: results.setdefault("first", client.post("/slow", headers=headers)))
+    first.start()
+    try:
+        assert entered.wait(5)
+        retry = client.post("/slow", headers=headers)
+        assert retry.status_code == 409
+        assert retry.headers["retry-after"] == "1"
+    finally:
+        release.set()
+        first.join()
+    assert results["first"].status_code == 200
+    assert calls == ["slow"]
+
+def test_server_errors_release_the_key(app_and_calls):
+    app, calls, _ = app_and_calls
+    client = TestClient(app)
+    headers = {**_token("a@example.com"), "Idempotency-Key": "k4"}
+    assert client.post("/broken", headers=headers).status_code == 500
+    assert client.post("/broken", headers=headers).status_code == 500
+    assert calls == ["broken", "broken"]
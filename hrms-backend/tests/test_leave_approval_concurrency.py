@@ -0,0 +1,101 @@
+"""Parallel leave approvals against a real SQLite file must not lose or overdraw deductions."""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+import threading
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models
+from app.database import Base, SQLITE_BUSY_TIMEOUT
+from app.routers.leave import approve_leave_request
+
+# Monday; every request is one Monday-Friday week, i.e. five business days
+FIRST_WEEK = date(2030, 1, 7)
+BALANCE_DAYS = 15.0
+REQUESTS_PER_EMPLOYEE = 8
+APPROVALS_PER_REQUEST = 2
+
+@pytest.fixture
+def session_factory(tmp_path):
+    engine = create_engine(
+        f"sqlite:///{tmp_path / 'approvals.db'}",
+        connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT}
+    )
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
+    engine.dispose()
+
+def _seed(Session):
+    db = Session()
+    employees = [
+        models.User(email=f"employee{n}@example.com", hashed_password="x", role="employee", department="IT")
+        for n in range(2)
+    ]
+    db.add_all(employees)
+    db.flush()
+    requests = []
+    for employee in employees:
+        db.add(models.LeaveBalance(employee_id=employee.id, annual_leave=BALANCE_DAYS, sick_leave=10.0, casual_leave=10.0))
+        for week in range(REQUESTS_PER_EMPLOYEE):
+            start = FIRST_WEEK + timedelta(weeks=week)
+            requests.append(models.LeaveRequest(
+                employee_id=employee.id, leave_type="Annual", start_date=start,
+                end_date=start + timedelta(days=4), reason="holiday", status="pending"
+            ))
+    db.add_all(requests)
+    db.commit()
+    ids = [employee.id for employee in employees], [request.id for request in requests]
+    db.close()
+    return ids
+
+def test_parallel_approvals_never_overdraw_or_lose_deductions(session_factory):
+    employee_ids, request_ids = _seed(session_factory)
+    hr = models.User(id=0, email="hr@example.com", role="hr")
+    calls = [leave_id for leave_id in request_ids for _ in range(APPROVALS_PER_REQUEST)]
+    barrier = threading.Barrier(len(calls))
+
+    def approve(leave_id):
+        db = session_factory()
+        try:
+            barrier.wait()
+            return approve_leave_request(leave_id, db, hr)["days_deducted"]
+        except HTTPException as e:
+            return e.status_code
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=len(calls)) as pool:
+        outcomes = list(pool.map(approve, calls))
+
+    # Only conflicts (409) and insufficient balance (400); never a failed statement (500)
+    assert set(outcomes) <= {5, 400, 409}
+
+    db = session_factory()
+    try:
+        for employee_id in employee_ids:
+            balance = db.query(models.LeaveBalance).filter(models.LeaveBalance.employee_id == employee_id).one()
+            approved = db.query(models.LeaveRequest).filter(
+                models.LeaveRequest.employee_id == employee_id,
+                models.LeaveRequest.status == "approved"
+            ).count()
+            assert approved == int(BALANCE_DAYS // 5)
+            assert balance.annual_leave == BALANCE_DAYS - 5 * approved
+        # Each approval that succeeded deducted exactly once
+        assert outcomes.count(5) == sum(int(BALANCE_DAYS // 5) for _ in employee_ids)
+    finally:
+        db.close()
+
+def test_approving_leave_without_a_type_is_a_client_error(session_factory):
+    employee_ids, request_ids = _seed(session_factory)
+    db = session_factory()
+    try:
+        db.query(models.LeaveRequest).filter(models.LeaveRequest.id == request_ids[0]).update({"leave_type": None})
+        db.commit()
+        with pytest.raises(HTTPException) as error:
+            approve_leave_request(request_ids[0], db, models.User(id=0, email="hr@example.com", role="hr"))
+        assert error.value.status_code == 400
+    finally:
+        db.close()
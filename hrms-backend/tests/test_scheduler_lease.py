@@ -0,0 +1,121 @@
+"""Scheduler lease takeover: jobs run once across workers, and a lost lease stops the loser."""
+from datetime import datetime, timedelta
+import asyncio
+import threading
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models
+from app.database import Base
+from app.services.scheduler import JobScheduler, LEASE_NAME
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    engine = create_engine(f"sqlite:///{tmp_path / 'scheduler.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(engine)
+    # The lease and schedule always live in the default database
+    monkeypatch.setattr(database, "engine", engine)
+    yield sessionmaker(bind=engine, expire_on_commit=False)
+    engine.dispose()
+
+def _make_due(Session, *names):
+    db = Session()
+    for name in names:
+        db.merge(models.JobSchedule(name=name, next_run=datetime.now() - timedelta(minutes=1)))
+    db.commit()
+    db.close()
+
+def _expire_lease(Session):
+    db = Session()
+    db.query(models.JobLease).filter(models.JobLease.name == LEASE_NAME).update(
+        {"expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    )
+    db.commit()
+    db.close()
+
+def _scheduler(Session, runs, name="nightly", **kwargs):
+    scheduler = JobScheduler(session_factory=Session, **kwargs)
+    scheduler.add_job(name, lambda db: runs.append((scheduler.owner, name)) or 0, interval=timedelta(hours=1))
+    return scheduler
+
+def test_only_the_lease_holder_runs_and_a_successor_continues_the_schedule(session_factory):
+    runs = []
+    first, second = _scheduler(session_factory, runs), _scheduler(session_factory, runs)
+    _make_due(session_factory, "nightly")
+
+    assert first._acquire_lease()
+    assert not second._acquire_lease()
+    first._run_due_jobs()
+    assert runs == [(first.owner, "nightly")]
+
+    # The first worker dies; its successor must not repeat the run it already made
+    _expire_lease(session_factory)
+    assert second._acquire_lease()
+    assert not first._acquire_lease()
+    second._run_due_jobs()
+    assert runs == [(first.owner, "nightly")]
+
+    db = session_factory()
+    schedule = db.get(models.JobSchedule, "nightly")
+    assert schedule.next_run > datetime.now() + timedelta(minutes=59)
+    assert db.query(models.JobRun).count() == 1
+    db.close()
+
+def test_losing_the_lease_mid_run_stops_before_the_next_job(session_factory):
+    runs = []
+    scheduler = JobScheduler(session_factory=session_factory, tick_seconds=60, lease_seconds=3)
+    thief = JobScheduler(session_factory=session_factory)
+    stolen = threading.Event()
+
+    def slow_job(db):
+        # Another worker takes over while this job is still running
+        _expire_lease(session_factory)
+        assert thief._acquire_lease()
+        stolen.set()
+        time.sleep(2.5)
+        runs.append("slow")
+        return 0
+
+    scheduler.add_job("slow", slow_job, interval=timedelta(hours=1))
+    scheduler.add_job("after", lambda db: runs.append("after") or 0, interval=timedelta(hours=1))
+    _make_due(session_factory, "slow", "after")
+
+    async def tick():
+        assert await asyncio.to_thread(scheduler._acquire_lease)
+        await scheduler._with_heartbeat(asyncio.to_thread(scheduler._run_due_jobs))
+
+    asyncio.run(tick())
+    assert stolen.is_set()
+    assert runs == ["slow"]
+    assert scheduler._abort.is_set()
+
+def test_stop_waits_for_the_running_job_before_releasing_the_lease(session_factory):
+    events = []
+    scheduler = JobScheduler(session_factory=session_factory, tick_seconds=60, lease_seconds=30)
+
+    def job(db):
+        events.append("started")
+        time.sleep(1)
+        db_check = session_factory()
+        events.append(("lease held at end", db_check.get(models.JobLease, LEASE_NAME) is not None))
+        db_check.close()
+        return 0
+
+    scheduler.add_job("job", job, interval=timedelta(hours=1))
+    _make_due(session_factory, "job")
+
+    async def run_and_stop():
+        await scheduler.start()
+        while "started" not in events:
+            await asyncio.sleep(0.05)
+        await scheduler.stop()
+
+    asyncio.run(run_and_stop())
+    assert events == ["started", ("lease held at end", True)]
+    db = session_factory()
+    assert db.get(models.JobLease, LEASE_NAME) is None
+    assert db.query(models.JobRun).count() == 1
+    db.close()